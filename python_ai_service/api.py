@@ -1,24 +1,27 @@
 # واجهة برمجة التطبيقات للخدمة
 # API Interface for the AI Service
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from typing import List, Dict, Any, Optional
 import logging
 import asyncio
 from datetime import datetime
 import uuid
 import json
+import zipfile
+import shutil
 from pathlib import Path
 import aiofiles
 
 from models import (
     AnalysisRequest, AnalysisResponse, AnalysisResult, AnalysisStatus,
-    BuildingType, ErrorResponse, ProjectInfo
+    BatchAnalysisResponse, BuildingType, ErrorResponse, ProjectInfo
 )
 from main_analyzer import MainImageAnalyzer
-from config import API_CONFIG, UPLOAD_DIR, OUTPUT_DIR
+from event_stream import AnalysisEventStream
+from config import API_CONFIG, UPLOAD_DIR, OUTPUT_DIR, IMAGE_PROCESSING, BATCH_CONFIG
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +47,15 @@ analyzer = MainImageAnalyzer()
 # تخزين مؤقت للطلبات قيد المعالجة
 active_analyses: Dict[str, Dict[str, Any]] = {}
 
+# مهام التحليل الجارية (لإمكانية الإلغاء)
+analysis_tasks: Dict[str, asyncio.Task] = {}
+
+# قنوات أحداث التحليل (SSE)
+event_streams: Dict[str, AnalysisEventStream] = {}
+
+# الدفعات قيد المعالجة
+batch_analyses: Dict[str, Dict[str, Any]] = {}
+
 @app.on_event("startup")
 async def startup_event():
     """حدث بدء التطبيق"""
@@ -57,6 +69,11 @@ async def startup_event():
 async def shutdown_event():
     """حدث إيقاف التطبيق"""
     logger.info("إيقاف خدمة تحليل الصور بالذكاء الاصطناعي")
+    
+    # إلغاء التحليلات الجارية وإيقاف مجمع العمال
+    for request_id in list(analysis_tasks):
+        cancel_analysis_task(request_id)
+    analyzer.shutdown()
 
 @app.get("/")
 async def root():
@@ -77,7 +94,10 @@ async def health_check():
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
             "statistics": stats,
-            "active_analyses": len(active_analyses)
+            "active_analyses": len(active_analyses),
+            "worker_pool": analyzer.worker_pool.get_status(),
+            "memory_budget": analyzer.memory_budget.get_status(),
+            "shared_frames": analyzer.frame_store.get_status()
         }
     except Exception as e:
         logger.error(f"خطأ في فحص الصحة: {str(e)}")
@@ -92,18 +112,25 @@ async def health_check():
 
 @app.post("/analyze", response_model=AnalysisResponse)
 async def analyze_image(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     building_type: BuildingType = BuildingType.COMMERCIAL,
     project_title: Optional[str] = None,
     project_location: Optional[str] = None,
-    project_purpose: Optional[str] = None
+    project_purpose: Optional[str] = None,
+    analysis_mode: str = "full"
 ):
-    """تحليل صورة جديدة"""
+    """تحليل صورة جديدة
+    
+    analysis_mode="triage" يُنتج نتيجة أولية سريعة تظهر في حالة الطلب، ثم
+    تحل محلها نتيجة التحليل الكامل عند اكتماله.
+    """
     try:
         # إنشاء معرف فريد للطلب
         request_id = str(uuid.uuid4())
         
+        if analysis_mode not in ("full", "triage"):
+            raise HTTPException(status_code=400, detail="وضع التحليل غير مدعوم. الأوضاع المسموحة: full, triage")
+        
         # التحقق من تنسيق الملف
         if not file.filename:
             raise HTTPException(status_code=400, detail="اسم الملف مطلوب")
@@ -124,6 +151,15 @@ async def analyze_image(
             content = await file.read()
             await f.write(content)
         
+        # فحص رأس الصورة قبل بدء التحليل: الملف التالف أو الضخم يُرفض دون فك ترميزه
+        if file_extension != ".pdf":
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, analyzer.image_processor.inspect_image, str(file_path))
+            except ValueError as e:
+                file_path.unlink(missing_ok=True)
+                raise HTTPException(status_code=400, detail=str(e))
+        
         # إنشاء معلومات المشروع
         project_info = ProjectInfo(
             title=project_title or "مشروع غير محدد",
@@ -139,16 +175,16 @@ async def analyze_image(
             "start_time": datetime.now(),
             "file_name": file.filename,
             "building_type": building_type,
-            "project_info": project_info
+            "project_info": project_info,
+            "analysis_options": {"mode": analysis_mode}
         }
+        event_streams[request_id] = AnalysisEventStream()
         
-        # بدء التحليل في الخلفية
-        background_tasks.add_task(
-            process_analysis,
+        # بدء التحليل في الخلفية (مع الاحتفاظ بالمهمة لإمكانية إلغائها)
+        start_analysis_task(
             request_id,
-            str(file_path),
-            building_type,
-            project_info
+            process_analysis(request_id, str(file_path), building_type, project_info,
+                             active_analyses[request_id]["analysis_options"])
         )
         
         return AnalysisResponse(
@@ -165,7 +201,346 @@ async def analyze_image(
         logger.error(f"خطأ في بدء التحليل: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ داخلي: {str(e)}")
 
-async def process_analysis(request_id: str, file_path: str, building_type: BuildingType, project_info: ProjectInfo):
+@app.post("/analyze/batch", response_model=BatchAnalysisResponse)
+async def analyze_batch(
+    files: List[UploadFile] = File(...),
+    building_type: BuildingType = BuildingType.COMMERCIAL,
+    project_title: Optional[str] = None,
+    project_location: Optional[str] = None,
+    project_purpose: Optional[str] = None
+):
+    """تحليل مجموعة رسومات لمشروع واحد (ملفات متعددة أو أرشيف zip) تحت معرف دفعة واحد"""
+    try:
+        batch_id = str(uuid.uuid4())
+        allowed_extensions = IMAGE_PROCESSING["allowed_formats"]
+        
+        # حفظ الملفات وفك الأرشيفات
+        saved_files: List[tuple] = []  # (اسم الملف الأصلي، المسار المحفوظ)
+        try:
+            for upload in files:
+                if not upload.filename:
+                    raise HTTPException(status_code=400, detail="اسم الملف مطلوب")
+                
+                file_extension = Path(upload.filename).suffix.lower()
+                if file_extension == ".zip":
+                    archive_path = UPLOAD_DIR / f"{batch_id}_{len(saved_files)}.zip"
+                    async with aiofiles.open(archive_path, 'wb') as f:
+                        await f.write(await upload.read())
+                    
+                    loop = asyncio.get_running_loop()
+                    try:
+                        extracted = await loop.run_in_executor(
+                            None, _extract_archive, archive_path, batch_id, len(saved_files)
+                        )
+                    finally:
+                        archive_path.unlink(missing_ok=True)
+                    saved_files.extend(extracted)
+                elif file_extension in allowed_extensions:
+                    file_path = UPLOAD_DIR / f"{batch_id}_{len(saved_files)}{file_extension}"
+                    async with aiofiles.open(file_path, 'wb') as f:
+                        await f.write(await upload.read())
+                    saved_files.append((upload.filename, file_path))
+                else:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"تنسيق الملف غير مدعوم: {upload.filename}. التنسيقات المسموحة: {allowed_extensions + ['.zip']}"
+                    )
+                
+                if len(saved_files) > BATCH_CONFIG["max_files"]:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"عدد الملفات يتجاوز الحد المسموح ({BATCH_CONFIG['max_files']})"
+                    )
+            
+            if not saved_files:
+                raise HTTPException(status_code=400, detail="لا توجد ملفات صالحة للتحليل")
+            
+            # فحص رأس كل صورة قبل بدء أي تحليل: ملف تالف أو ضخم يرفض الدفعة باسمه
+            loop = asyncio.get_running_loop()
+            for file_name, file_path in saved_files:
+                if file_path.suffix.lower() == ".pdf":
+                    continue
+                try:
+                    await loop.run_in_executor(None, analyzer.image_processor.inspect_image, str(file_path))
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=f"{file_name}: {str(e)}")
+        except Exception:
+            # الدفعة المرفوضة لا تترك ملفات في مجلد الرفع
+            for _, file_path in saved_files:
+                file_path.unlink(missing_ok=True)
+            raise
+        
+        project_info = ProjectInfo(
+            title=project_title or "مشروع غير محدد",
+            location=project_location or "موقع غير محدد",
+            purpose=project_purpose or "غير محدد",
+            building_type=building_type
+        )
+        
+        # كل ملف يحصل على طلب خاص به لمتابعة حالته ونتيجته بشكل مستقل
+        request_ids = []
+        for file_name, file_path in saved_files:
+            request_id = str(uuid.uuid4())
+            active_analyses[request_id] = {
+                "status": AnalysisStatus.PENDING,
+                "progress": 0.0,
+                "start_time": datetime.now(),
+                "file_name": file_name,
+                "file_path": str(file_path),
+                "building_type": building_type,
+                "project_info": project_info,
+                "batch_id": batch_id
+            }
+            event_streams[request_id] = AnalysisEventStream()
+            request_ids.append(request_id)
+        
+        batch_analyses[batch_id] = {
+            "status": AnalysisStatus.PROCESSING,
+            "start_time": datetime.now(),
+            "building_type": building_type,
+            "project_info": project_info,
+            "request_ids": request_ids
+        }
+        
+        start_analysis_task(batch_id, process_batch(batch_id))
+        
+        return _create_batch_response(batch_id, "تم بدء تحليل الدفعة بنجاح")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"خطأ في بدء التحليل الدفعي: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"خطأ داخلي: {str(e)}")
+
+def _extract_archive(archive_path: Path, batch_id: str, start_index: int) -> List[tuple]:
+    """فك أرشيف zip وحفظ الرسومات المدعومة فقط"""
+    allowed_extensions = IMAGE_PROCESSING["allowed_formats"]
+    max_file_size = IMAGE_PROCESSING["max_file_size"]
+    extracted = []
+    
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                file_extension = Path(member.filename).suffix.lower()
+                if member.is_dir() or file_extension not in allowed_extensions:
+                    continue
+                if member.file_size > max_file_size:
+                    raise HTTPException(status_code=400, detail=f"الملف كبير جداً داخل الأرشيف: {member.filename}")
+                if start_index + len(extracted) >= BATCH_CONFIG["max_files"]:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"عدد الملفات يتجاوز الحد المسموح ({BATCH_CONFIG['max_files']})"
+                    )
+                
+                # أسماء الملفات المحفوظة مولدة، فلا تؤثر المسارات داخل الأرشيف على موقع الحفظ
+                file_path = UPLOAD_DIR / f"{batch_id}_{start_index + len(extracted)}{file_extension}"
+                extracted.append((Path(member.filename).name, file_path))
+                # يُنسخ العضو كاملاً على دفعات؛ zipfile لا يقرأ أكثر من الحجم المعلن ويتحقق من
+                # CRC في نهايته، فالحجم المعلن المفحوص أعلاه يحد ما يُكتب على القرص
+                with archive.open(member) as source, open(file_path, 'wb') as target:
+                    shutil.copyfileobj(source, target)
+    except Exception as e:
+        # لا تبقى ملفات الأرشيف المرفوض في مجلد الرفع
+        for _, file_path in extracted:
+            file_path.unlink(missing_ok=True)
+        if isinstance(e, HTTPException):
+            raise
+        if isinstance(e, (zipfile.BadZipFile, NotImplementedError, RuntimeError)):
+            raise HTTPException(status_code=400, detail=f"أرشيف zip غير صالح: {str(e)}")
+        raise
+    
+    return extracted
+
+async def process_batch(batch_id: str):
+    """معالجة الدفعة في الخلفية"""
+    batch_info = batch_analyses[batch_id]
+    request_ids = batch_info["request_ids"]
+    
+    try:
+        logger.info(f"بدء معالجة الدفعة {batch_id}: {len(request_ids)} ملف")
+        
+        for request_id in request_ids:
+            active_analyses[request_id]["status"] = AnalysisStatus.PROCESSING
+        
+        async def store_result(index: int, result: AnalysisResult, succeeded: bool):
+            request_id = request_ids[index]
+            if request_id not in active_analyses:
+                return
+            
+            result_path = OUTPUT_DIR / f"{request_id}_result.json"
+            async with aiofiles.open(result_path, 'w', encoding='utf-8') as f:
+                await f.write(json.dumps(result.dict(), ensure_ascii=False, indent=2, default=str))
+            
+            active_analyses[request_id].update({
+                "status": AnalysisStatus.COMPLETED if succeeded else AnalysisStatus.FAILED,
+                "progress": 100.0,
+                "end_time": datetime.now(),
+                "result": result,
+                "result_path": str(result_path)
+            })
+            if succeeded:
+                close_event_stream(
+                    request_id, "completed",
+                    compliance_score=result.compliance_score,
+                    overall_status=result.overall_status,
+                    summary=result.summary
+                )
+            else:
+                active_analyses[request_id]["error"] = result.overall_status_message
+                close_event_stream(request_id, "failed", error=result.overall_status_message)
+        
+        file_paths = [active_analyses[request_id]["file_path"] for request_id in request_ids]
+        await analyzer.analyze_batch(file_paths, batch_info["building_type"], batch_info["project_info"],
+                                     on_result=store_result)
+        
+        batch_info.update({
+            "status": AnalysisStatus.COMPLETED,
+            "end_time": datetime.now()
+        })
+        logger.info(f"تم إكمال الدفعة بنجاح: {batch_id}")
+        
+    except asyncio.CancelledError:
+        logger.info(f"تم إلغاء الدفعة: {batch_id}")
+        _finish_pending_batch_requests(request_ids, AnalysisStatus.CANCELLED)
+        batch_info.update({"status": AnalysisStatus.CANCELLED, "end_time": datetime.now()})
+        raise
+        
+    except Exception as e:
+        logger.error(f"خطأ في معالجة الدفعة {batch_id}: {str(e)}")
+        _finish_pending_batch_requests(request_ids, AnalysisStatus.FAILED, str(e))
+        batch_info.update({"status": AnalysisStatus.FAILED, "error": str(e), "end_time": datetime.now()})
+
+def _finish_pending_batch_requests(request_ids: List[str], status: AnalysisStatus, error: Optional[str] = None):
+    """تحديث حالة طلبات الدفعة التي لم تكتمل وإرسال الحدث النهائي لكل منها"""
+    for request_id in request_ids:
+        analysis_info = active_analyses.get(request_id)
+        if analysis_info and analysis_info["status"] in (AnalysisStatus.PENDING, AnalysisStatus.PROCESSING):
+            analysis_info.update({"status": status, "end_time": datetime.now()})
+            if error:
+                analysis_info["error"] = error
+                close_event_stream(request_id, status.value, error=error)
+            else:
+                close_event_stream(request_id, status.value)
+
+def _create_batch_response(batch_id: str, message: str) -> BatchAnalysisResponse:
+    """إنشاء استجابة حالة الدفعة"""
+    batch_info = batch_analyses[batch_id]
+    statuses = [active_analyses[r]["status"] for r in batch_info["request_ids"] if r in active_analyses]
+    completed = statuses.count(AnalysisStatus.COMPLETED)
+    failed = statuses.count(AnalysisStatus.FAILED)
+    total = len(batch_info["request_ids"])
+    
+    return BatchAnalysisResponse(
+        batch_id=batch_id,
+        status=batch_info["status"],
+        message=message,
+        total_files=total,
+        completed_files=completed,
+        failed_files=failed,
+        progress=round(100.0 * (completed + failed) / total, 1) if total else 0.0,
+        request_ids=batch_info["request_ids"]
+    )
+
+@app.get("/analyze/batch/{batch_id}", response_model=BatchAnalysisResponse)
+async def get_batch_status(batch_id: str):
+    """الحصول على حالة الدفعة وتقدمها"""
+    if batch_id not in batch_analyses:
+        raise HTTPException(status_code=404, detail="الدفعة غير موجودة")
+    
+    return _create_batch_response(batch_id, _get_status_message(batch_analyses[batch_id]["status"]))
+
+@app.get("/analyze/batch/{batch_id}/report")
+async def get_batch_report(batch_id: str):
+    """التقرير المجمّع للمشروع بعد اكتمال الدفعة"""
+    try:
+        if batch_id not in batch_analyses:
+            raise HTTPException(status_code=404, detail="الدفعة غير موجودة")
+        
+        batch_info = batch_analyses[batch_id]
+        if batch_info["status"] != AnalysisStatus.COMPLETED:
+            raise HTTPException(status_code=400, detail="الدفعة لم تكتمل بعد")
+        
+        return create_batch_report(batch_id, batch_info)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"خطأ في إنشاء تقرير الدفعة: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"خطأ داخلي: {str(e)}")
+
+def start_analysis_task(request_id: str, coroutine) -> asyncio.Task:
+    """تشغيل التحليل كمهمة مستقلة وتسجيلها"""
+    task = asyncio.create_task(coroutine)
+    analysis_tasks[request_id] = task
+    task.add_done_callback(lambda _: analysis_tasks.pop(request_id, None))
+    return task
+
+def cancel_analysis_task(request_id: str) -> bool:
+    """إلغاء مهمة تحليل جارية"""
+    task = analysis_tasks.get(request_id)
+    if task is None or task.done():
+        return False
+    
+    task.cancel()
+    if request_id in batch_analyses:
+        # الحالة النهائية تظهر فوراً، قبل أن يصل الإلغاء إلى المرحلة الجارية
+        _finish_pending_batch_requests(batch_analyses[request_id]["request_ids"], AnalysisStatus.CANCELLED)
+        batch_analyses[request_id].update({"status": AnalysisStatus.CANCELLED, "end_time": datetime.now()})
+    elif request_id in active_analyses:
+        active_analyses[request_id].update({
+            "status": AnalysisStatus.CANCELLED,
+            "end_time": datetime.now()
+        })
+        _withdraw_preliminary_result(active_analyses[request_id])
+        close_event_stream(request_id, "cancelled")
+    return True
+
+def close_event_stream(request_id: str, event: str, **data):
+    """إرسال الحدث النهائي للتحليل وإغلاق قناته"""
+    stream = event_streams.get(request_id)
+    if stream is None or stream.closed:
+        return
+    
+    analysis_info = active_analyses.get(request_id, {})
+    stream.close(event, {
+        "request_id": request_id,
+        "status": analysis_info.get("status", AnalysisStatus.CANCELLED),
+        "progress": analysis_info.get("progress", 0.0),
+        **data
+    })
+    
+    # حذف القناة بعد مهلة تكفي للمشترك المتأخر، فلا تبقى طوال عمر الخدمة
+    asyncio.get_running_loop().call_later(
+        API_CONFIG["event_stream_retention"], _drop_event_stream, request_id, stream
+    )
+
+def _drop_event_stream(request_id: str, stream: AnalysisEventStream):
+    """حذف قناة أحداث مغلقة ما لم تُستبدل"""
+    if event_streams.get(request_id) is stream:
+        del event_streams[request_id]
+
+def _stage_progress(event: Dict[str, Any], analysis_info: Dict[str, Any]) -> float:
+    """تحويل عدد المراحل المكتملة إلى نسبة تقدم الطلب"""
+    analysis_options = analysis_info.get("analysis_options") or {}
+    
+    # صفحات الملف تُحلل بالتوازي، فالتقدم هو متوسط تقدم الصفحات
+    page_progress = analysis_info.setdefault("page_progress", {})
+    page_progress[(event.get("phase"), event.get("page", 1))] = (
+        event["completed_stages"] / max(event["total_stages"], 1)
+    )
+    fraction = sum(
+        value for (phase, _), value in page_progress.items() if phase == event.get("phase")
+    ) / max(event.get("page_count", 1), 1)
+    
+    if event.get("phase") == "triage":
+        return 10.0 + 20.0 * fraction
+    
+    # الحد الأعلى 95 لأن حفظ النتيجة يتم بعد آخر مرحلة
+    start = 30.0 if analysis_options.get("mode") == "triage" else 10.0
+    return start + (95.0 - start) * fraction
+
+async def process_analysis(request_id: str, file_path: str, building_type: BuildingType,
+                           project_info: ProjectInfo, analysis_options: Optional[Dict[str, Any]] = None):
     """معالجة التحليل في الخلفية"""
     try:
         logger.info(f"بدء معالجة التحليل: {request_id}")
@@ -174,8 +549,37 @@ async def process_analysis(request_id: str, file_path: str, building_type: Build
         active_analyses[request_id]["status"] = AnalysisStatus.PROCESSING
         active_analyses[request_id]["progress"] = 10.0
         
+        async def store_preliminary(preliminary: AnalysisResult):
+            # النتيجة الأولية تظهر في حالة الطلب حتى تحل محلها النتيجة الكاملة
+            active_analyses[request_id].update({
+                "progress": 30.0,
+                "result": preliminary,
+                "preliminary": True
+            })
+            logger.info(f"النتيجة الأولية جاهزة: {request_id}")
+        
+        stream = event_streams.get(request_id)
+        
+        def publish_stage_event(event: Dict[str, Any]):
+            analysis_info = active_analyses.get(request_id)
+            if analysis_info is None:
+                return
+            if event["type"] == "stage_completed":
+                analysis_info["progress"] = max(
+                    analysis_info.get("progress", 0.0),
+                    _stage_progress(event, analysis_info)
+                )
+            if stream is not None:
+                stream.publish(event["type"], {
+                    "request_id": request_id,
+                    "progress": analysis_info["progress"],
+                    **{key: value for key, value in event.items() if key != "type"}
+                })
+        
         # تنفيذ التحليل
-        result = await analyzer.analyze_image(file_path, building_type, project_info)
+        result = await analyzer.analyze_image(file_path, building_type, project_info,
+                                              analysis_options, on_preliminary=store_preliminary,
+                                              on_event=publish_stage_event)
         
         # حفظ النتيجة
         result_path = OUTPUT_DIR / f"{request_id}_result.json"
@@ -189,11 +593,31 @@ async def process_analysis(request_id: str, file_path: str, building_type: Build
             "progress": 100.0,
             "end_time": datetime.now(),
             "result": result,
-            "result_path": str(result_path)
+            "result_path": str(result_path),
+            "preliminary": False
         })
         
+        close_event_stream(
+            request_id, "completed",
+            compliance_score=result.compliance_score,
+            overall_status=result.overall_status,
+            summary=result.summary
+        )
+        
         logger.info(f"تم إكمال التحليل بنجاح: {request_id}")
         
+    except asyncio.CancelledError:
+        logger.info(f"تم إلغاء التحليل: {request_id}")
+        
+        if request_id in active_analyses:
+            active_analyses[request_id].update({
+                "status": AnalysisStatus.CANCELLED,
+                "end_time": datetime.now()
+            })
+            _withdraw_preliminary_result(active_analyses[request_id])
+        close_event_stream(request_id, "cancelled")
+        raise
+        
     except Exception as e:
         logger.error(f"خطأ في معالجة التحليل {request_id}: {str(e)}")
         
@@ -203,6 +627,16 @@ async def process_analysis(request_id: str, file_path: str, building_type: Build
             "error": str(e),
             "end_time": datetime.now()
         })
+        _withdraw_preliminary_result(active_analyses[request_id])
+        close_event_stream(request_id, "failed", error=str(e))
+
+def _withdraw_preliminary_result(analysis_info: Dict[str, Any]):
+    """سحب النتيجة الأولية من نتيجة الطلب عند فشل التحليل الكامل أو إلغائه
+    
+    تبقى في preliminary_result للاطلاع، فلا يظنها من يستعلم عن النتيجة نتيجة نهائية.
+    """
+    if analysis_info.pop("preliminary", False) and "result" in analysis_info:
+        analysis_info["preliminary_result"] = analysis_info.pop("result")
 
 @app.get("/analysis/{request_id}", response_model=AnalysisResponse)
 async def get_analysis_status(request_id: str):
@@ -216,7 +650,7 @@ async def get_analysis_status(request_id: str):
         response = AnalysisResponse(
             request_id=request_id,
             status=analysis_info["status"],
-            message=self._get_status_message(analysis_info["status"]),
+            message=_get_status_message(analysis_info["status"], analysis_info.get("result")),
             progress=analysis_info.get("progress", 0.0),
             estimated_completion=analysis_info.get("estimated_completion")
         )
@@ -233,6 +667,25 @@ async def get_analysis_status(request_id: str):
         logger.error(f"خطأ في الحصول على حالة التحليل: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ داخلي: {str(e)}")
 
+@app.get("/analysis/{request_id}/events")
+async def stream_analysis_events(request_id: str):
+    """بث أحداث التحليل (بدء المراحل واكتمالها والنتائج الجزئية) عبر Server-Sent Events"""
+    if request_id not in active_analyses:
+        raise HTTPException(status_code=404, detail="الطلب غير موجود")
+    
+    stream = event_streams.get(request_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="لا توجد أحداث لهذا الطلب")
+    
+    return StreamingResponse(
+        stream.subscribe(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # تعطيل التخزين المؤقت في الوكلاء العكسيين
+        }
+    )
+
 @app.get("/analysis/{request_id}/result")
 async def get_analysis_result(request_id: str):
     """الحصول على نتيجة التحليل"""
@@ -327,7 +780,8 @@ async def list_analyses(limit: int = 10, offset: int = 0):
                 "building_type": analysis_info["building_type"],
                 "start_time": analysis_info["start_time"],
                 "end_time": analysis_info.get("end_time"),
-                "progress": analysis_info.get("progress", 0.0)
+                "progress": analysis_info.get("progress", 0.0),
+                "preliminary": analysis_info.get("preliminary", False)
             })
         
         return {
@@ -341,6 +795,42 @@ async def list_analyses(limit: int = 10, offset: int = 0):
         logger.error(f"خطأ في قائمة التحليلات: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ داخلي: {str(e)}")
 
+@app.post("/analysis/{request_id}/cancel", response_model=AnalysisResponse)
+async def cancel_analysis(request_id: str):
+    """إلغاء تحليل أو دفعة قيد التنفيذ وتحرير مواردهما
+    
+    ملفات الدفعة تُحلل في مهمة واحدة وتشترك في استدعاءات الاكتشاف، فإلغاء أحدها
+    يلغي الدفعة كلها وتُسجل ملفاتها التي لم تكتمل ملغاة.
+    """
+    try:
+        if request_id in batch_analyses:
+            task_id = request_id
+        elif request_id in active_analyses:
+            task_id = active_analyses[request_id].get("batch_id", request_id)
+        else:
+            raise HTTPException(status_code=404, detail="الطلب غير موجود")
+        
+        if not cancel_analysis_task(task_id):
+            raise HTTPException(status_code=409, detail="التحليل ليس قيد التنفيذ")
+        
+        if request_id in batch_analyses:
+            progress = _create_batch_response(request_id, "").progress
+        else:
+            progress = active_analyses[request_id].get("progress", 0.0)
+        
+        return AnalysisResponse(
+            request_id=request_id,
+            status=AnalysisStatus.CANCELLED,
+            message=_get_status_message(AnalysisStatus.CANCELLED),
+            progress=progress
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"خطأ في إلغاء التحليل: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"خطأ داخلي: {str(e)}")
+
 @app.delete("/analysis/{request_id}")
 async def delete_analysis(request_id: str):
     """حذف تحليل"""
@@ -348,6 +838,9 @@ async def delete_analysis(request_id: str):
         if request_id not in active_analyses:
             raise HTTPException(status_code=404, detail="الطلب غير موجود")
         
+        # إيقاف التحليل إذا كان ما زال قيد التنفيذ
+        cancel_analysis_task(request_id)
+        
         # حذف الملفات المرتبطة
         analysis_info = active_analyses[request_id]
         
@@ -358,6 +851,7 @@ async def delete_analysis(request_id: str):
         
         # حذف من القائمة
         del active_analyses[request_id]
+        event_streams.pop(request_id, None)
         
         return {"message": "تم حذف التحليل بنجاح"}
         
@@ -378,7 +872,12 @@ async def get_statistics():
             "active_analyses": len(active_analyses),
             "completed_analyses": len([a for a in active_analyses.values() if a["status"] == AnalysisStatus.COMPLETED]),
             "failed_analyses": len([a for a in active_analyses.values() if a["status"] == AnalysisStatus.FAILED]),
-            "processing_analyses": len([a for a in active_analyses.values() if a["status"] == AnalysisStatus.PROCESSING])
+            "processing_analyses": len([a for a in active_analyses.values() if a["status"] == AnalysisStatus.PROCESSING]),
+            "cancelled_analyses": len([a for a in active_analyses.values() if a["status"] == AnalysisStatus.CANCELLED]),
+            "stage_metrics": analyzer.get_stage_metrics(),
+            "stage_cache": analyzer.get_cache_status(),
+            "near_duplicates": analyzer.get_duplicate_index_status(),
+            "micro_batching": analyzer.get_batching_status()
         })
         
         return stats
@@ -387,14 +886,18 @@ async def get_statistics():
         logger.error(f"خطأ في الحصول على الإحصائيات: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ داخلي: {str(e)}")
 
-def _get_status_message(self, status: AnalysisStatus) -> str:
+def _get_status_message(status: AnalysisStatus, result: Optional[AnalysisResult] = None) -> str:
     """الحصول على رسالة الحالة"""
+    if status == AnalysisStatus.PROCESSING and result is not None and result.is_preliminary:
+        return "النتيجة الأولية متاحة والتحليل الكامل قيد المعالجة"
+    
     messages = {
         AnalysisStatus.PENDING: "في انتظار المعالجة",
         AnalysisStatus.PROCESSING: "قيد المعالجة",
         AnalysisStatus.COMPLETED: "تم إكمال التحليل بنجاح",
         AnalysisStatus.FAILED: "فشل في التحليل",
-        AnalysisStatus.CANCELLED: "تم إلغاء التحليل"
+        AnalysisStatus.CANCELLED: "تم إلغاء التحليل",
+        AnalysisStatus.NEEDS_REVISION: "الرسم يحتاج مراجعة"
     }
     return messages.get(status, "حالة غير معروفة")
 
@@ -448,6 +951,68 @@ def create_analysis_report(result: AnalysisResult, format: str = "json") -> Dict
     
     return report
 
+def create_batch_report(batch_id: str, batch_info: Dict[str, Any]) -> Dict[str, Any]:
+    """إنشاء التقرير المجمّع لجميع رسومات المشروع"""
+    drawings = []
+    element_types: Dict[str, int] = {}
+    issues = {"critical": 0, "major": 0, "minor": 0}
+    scores = []
+    
+    for request_id in batch_info["request_ids"]:
+        analysis_info = active_analyses.get(request_id)
+        if analysis_info is None:
+            continue
+        
+        result = analysis_info.get("result")
+        drawing = {
+            "request_id": request_id,
+            "file_name": analysis_info["file_name"],
+            "status": analysis_info["status"],
+            "error": analysis_info.get("error")
+        }
+        
+        if result is not None and analysis_info["status"] == AnalysisStatus.COMPLETED:
+            scores.append(result.compliance_score)
+            for element in result.detected_elements:
+                element_types[element.type.value] = element_types.get(element.type.value, 0) + 1
+            for issue in result.compliance_issues:
+                if issue.severity.value in issues:
+                    issues[issue.severity.value] += 1
+            drawing.update({
+                "compliance_score": result.compliance_score,
+                "overall_status": result.overall_status,
+                "total_elements": len(result.detected_elements),
+                "total_issues": len(result.compliance_issues)
+            })
+        
+        drawings.append(drawing)
+    
+    return {
+        "report_info": {
+            "batch_id": batch_id,
+            "project_info": batch_info["project_info"].dict(),
+            "start_time": batch_info["start_time"],
+            "end_time": batch_info.get("end_time"),
+            "total_drawings": len(batch_info["request_ids"]),
+            "analyzed_drawings": len(scores),
+            "failed_drawings": len([d for d in drawings if d["status"] == AnalysisStatus.FAILED])
+        },
+        "compliance": {
+            "average_score": round(sum(scores) / len(scores), 1) if scores else 0.0,
+            "min_score": min(scores) if scores else 0.0,
+            "max_score": max(scores) if scores else 0.0
+        },
+        "detected_elements": {
+            "total": sum(element_types.values()),
+            "by_type": element_types
+        },
+        "compliance_issues": {
+            "total": sum(issues.values()),
+            **issues
+        },
+        "drawings": drawings
+    }
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# قياس إنتاجية وزمن انتظار الاستدلال المجمّع مقارنة بالاستدعاء المتسلسل تحت قفل
+# Micro-batching Inference Benchmark
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+# إضافة مجلد الخدمة إلى المسار
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from inference_batcher import MicroBatcher
+
+def synthetic_model(fixed_ms: float, per_image_ms: float):
+    """نموذج وهمي بتكلفة ثابتة لكل استدعاء (نقل ومزامنة) وتكلفة لكل صورة"""
+    def infer(images):
+        time.sleep((fixed_ms + per_image_ms * len(images)) / 1000)
+        return [[] for _ in images]
+    return infer
+
+def yolo_model(model_name: str, input_size: int):
+    """نموذج YOLO الفعلي (يتطلب ultralytics)"""
+    from ultralytics import YOLO
+    model = YOLO(model_name)
+
+    def infer(images):
+        return list(model(images, imgsz=input_size, verbose=False))
+    return infer
+
+def run_callers(call, callers: int, requests: int, image: np.ndarray):
+    """تشغيل callers خيطاً يرسل كل منها requests صورة متتالية، مع زمن كل طلب"""
+    latency = []
+    lock = threading.Lock()
+
+    def caller():
+        for _ in range(requests):
+            start = time.perf_counter()
+            call(image)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latency.append(elapsed)
+
+    threads = [threading.Thread(target=caller) for _ in range(callers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latency
+
+def report(label: str, elapsed: float, latency: list):
+    p50, p95, worst = np.percentile(latency, [50, 95, 100]) * 1000
+    print(f"{label:<12} {len(latency) / elapsed:>10.1f} صورة/ث   "
+          f"p50 {p50:>7.1f} ms   p95 {p95:>7.1f} ms   max {worst:>7.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="قياس الاستدلال المجمّع")
+    parser.add_argument("--callers", type=int, default=8, help="عدد التحليلات المتزامنة")
+    parser.add_argument("--requests", type=int, default=20, help="عدد الصور لكل تحليل")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--wait-ms", type=float, default=10.0)
+    parser.add_argument("--fixed-ms", type=float, default=20.0, help="تكلفة الاستدعاء الثابتة للنموذج الوهمي")
+    parser.add_argument("--per-image-ms", type=float, default=4.0, help="تكلفة كل صورة للنموذج الوهمي")
+    parser.add_argument("--model", help="مسار نموذج YOLO بدلاً من النموذج الوهمي")
+    parser.add_argument("--input-size", type=int, default=640)
+    args = parser.parse_args()
+
+    infer = yolo_model(args.model, args.input_size) if args.model else \
+        synthetic_model(args.fixed_ms, args.per_image_ms)
+    image = np.full((args.input_size, args.input_size, 3), 255, np.uint8)
+
+    # المسار السابق: كل استدعاء صورة واحدة والنموذج مقفل بين الخيوط
+    model_lock = threading.Lock()
+
+    def serial(item):
+        with model_lock:
+            return infer([item])[0]
+
+    print(f"{args.callers} تحليل متزامن × {args.requests} صورة")
+    report("متسلسل", *run_callers(serial, args.callers, args.requests, image))
+
+    batcher = MicroBatcher(infer, args.batch_size, args.wait_ms, name="benchmark")
+    report("مجمّع", *run_callers(batcher.submit, args.callers, args.requests, image))
+    status = batcher.get_status()
+    batcher.close()
+    print(f"الدفعات: {status['batches']}، متوسط الحجم {status['mean_batch_size']}، "
+          f"التوزيع {status['batch_sizes']}")
+
+if __name__ == "__main__":
+    main()
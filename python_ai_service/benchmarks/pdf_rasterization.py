@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# قياس أداء تحويل صفحات PDF إلى مصفوفات
+# PDF Rasterization Micro-Benchmark
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import fitz
+import numpy as np
+from PIL import Image
+
+# إضافة مجلد الخدمة إلى المسار
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from config import IMAGE_PROCESSING
+from image_processor import ImageProcessor
+
+# مقاسات لوحات الرسم المعمارية بالنقاط (1 نقطة = 1/72 بوصة)
+SHEET_SIZES = {
+    "A3": (842, 1191),
+    "A1": (1684, 2384),
+    "A0": (2384, 3370),
+}
+
+def create_sheet(size_name: str) -> fitz.Document:
+    """إنشاء لوحة PDF تشبه المسقط الأفقي (شبكة جدران ونصوص) بالمقاس المطلوب"""
+    width, height = SHEET_SIZES[size_name]
+    doc = fitz.open()
+    page = doc.new_page(width=width, height=height)
+    step = 60
+    for x in range(40, int(width) - 40, step):
+        page.draw_line((x, 40), (x, height - 40), color=(0, 0, 0), width=2)
+    for y in range(40, int(height) - 40, step):
+        page.draw_line((40, y), (width - 40, y), color=(0, 0, 0), width=2)
+    for i in range(0, int(width * height) // (step * step * 4)):
+        x = 50 + (i * 37) % (width - 100)
+        y = 50 + (i * 53) % (height - 100)
+        page.draw_circle((x, y), 6, color=(1, 0, 0), fill=(1, 0, 0))
+        page.insert_text((x + 8, y + 4), f"SD-{i}", fontsize=8)
+    return doc
+
+def png_round_trip(pix) -> np.ndarray:
+    """المسار السابق: ترميز PNG ثم فك الترميز عبر PIL"""
+    pil_image = Image.open(io.BytesIO(pix.tobytes("png")))
+    return cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+
+def measure(func, pix, repeat: int) -> float:
+    """أقل زمن بالميلي ثانية عبر عدة تكرارات"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(pix)
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="مقارنة تحويل صفحات PDF: PNG مقابل القراءة المباشرة")
+    parser.add_argument("--sizes", nargs="+", default=["A1", "A0"], choices=sorted(SHEET_SIZES))
+    parser.add_argument("--dpi", type=int, default=IMAGE_PROCESSING["dpi"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    processor = ImageProcessor()
+    mat = fitz.Matrix(args.dpi / 72, args.dpi / 72)
+
+    print(f"{'sheet':<6}{'pixels':>14}{'png (ms)':>12}{'direct (ms)':>14}{'speedup':>10}")
+    for size_name in args.sizes:
+        with create_sheet(size_name) as doc:
+            pix = doc[0].get_pixmap(matrix=mat, alpha=False)
+
+        expected = png_round_trip(pix)
+        actual = processor._pixmap_to_array(pix)
+        if not np.array_equal(expected, actual):
+            raise SystemExit(f"{size_name}: نتيجة القراءة المباشرة لا تطابق مسار PNG")
+
+        png_ms = measure(png_round_trip, pix, args.repeat)
+        direct_ms = measure(processor._pixmap_to_array, pix, args.repeat)
+        print(f"{size_name:<6}{f'{pix.width}x{pix.height}':>14}{png_ms:>12.1f}"
+              f"{direct_ms:>14.1f}{png_ms / direct_ms:>9.1f}x")
+        del pix, expected, actual
+
+if __name__ == "__main__":
+    main()
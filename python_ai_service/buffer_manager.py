@@ -0,0 +1,122 @@
+# إدارة ذاكرة الصور الوسيطة أثناء التحليل
+# Lifetime-aware Image Buffer Management and Memory Budget
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Set
+
+import numpy as np
+
+from config import PERFORMANCE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+def estimate_nbytes(value: Any) -> int:
+    """تقدير حجم المصفوفات التي تحملها قيمة ما"""
+    if isinstance(value, np.ndarray) or isinstance(getattr(value, "nbytes", None), int):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_nbytes(v) for v in value if isinstance(v, (np.ndarray, dict, list, tuple)))
+    return 0
+
+class BufferManager:
+    """تخزين مخرجات المراحل وتحرير كل مخرج بعد انتهاء آخر مرحلة تستهلكه"""
+
+    def __init__(self, consumers: Dict[str, int], retained: Optional[Iterable[str]] = None):
+        self._consumers = dict(consumers)
+        self._retained: Optional[Set[str]] = set(retained) if retained is not None else None
+        self._buffers: Dict[str, Any] = {}
+        self._sizes: Dict[str, int] = {}
+        self.live_bytes = 0
+        self.peak_bytes = 0
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._buffers
+
+    def __getitem__(self, name: str) -> Any:
+        return self._buffers[name]
+
+    def _is_retained(self, name: str) -> bool:
+        return self._retained is None or name in self._retained
+
+    def put(self, name: str, value: Any):
+        """إضافة مخرج جديد"""
+        if not self._consumers.get(name) and not self._is_retained(name):
+            # لا يوجد من يستهلك هذا المخرج: يُحرر فوراً
+            return
+
+        # استبدال مخرج موجود (مثل مخرج محمّل من الذاكرة المؤقتة أعادت مرحلته إنتاجه)
+        self.live_bytes -= self._sizes.pop(name, 0)
+        size = estimate_nbytes(value)
+        self._buffers[name] = value
+        self._sizes[name] = size
+        self.live_bytes += size
+        self.peak_bytes = max(self.peak_bytes, self.live_bytes)
+
+    def release(self, consumed: Iterable[str]):
+        """إنقاص عدد المستهلكين المتبقين لمدخلات مرحلة انتهت وتحرير ما لم يعد مطلوباً"""
+        for name in consumed:
+            remaining = self._consumers.get(name, 0) - 1
+            self._consumers[name] = remaining
+            if remaining <= 0 and not self._is_retained(name) and name in self._buffers:
+                del self._buffers[name]
+                self.live_bytes -= self._sizes.pop(name, 0)
+
+    def outputs(self) -> Dict[str, Any]:
+        """المخرجات المحتفظ بها بعد انتهاء التشغيل"""
+        return {name: value for name, value in self._buffers.items() if self._is_retained(name)}
+
+class MemoryBudget:
+    """ميزانية ذاكرة عامة تتحكم في قبول التحليلات الجديدة"""
+
+    def __init__(self, limit_bytes: Optional[int] = None):
+        self.limit_bytes = limit_bytes or PERFORMANCE_CONFIG["memory_budget_mb"] * 1024 * 1024
+        self.used_bytes = 0
+        self.waiting = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, nbytes: int) -> int:
+        """حجز جزء من الميزانية مع الانتظار إذا لم تكفِ، ويعيد الحجم المحجوز فعلاً"""
+        # الطلب الأكبر من الميزانية كلها يُقبل وحده حتى لا ينتظر إلى الأبد
+        nbytes = max(0, min(int(nbytes), self.limit_bytes))
+
+        async with self._condition:
+            if self.used_bytes + nbytes > self.limit_bytes:
+                logger.info(f"انتظار توفر الذاكرة: مطلوب {nbytes // 2**20} ميجابايت")
+            self.waiting += 1
+            try:
+                await self._condition.wait_for(lambda: self.used_bytes + nbytes <= self.limit_bytes)
+            finally:
+                self.waiting -= 1
+            self.used_bytes += nbytes
+        return nbytes
+
+    async def release(self, nbytes: int):
+        """إعادة حجز سابق إلى الميزانية"""
+        async with self._condition:
+            self.used_bytes -= nbytes
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int) -> AsyncIterator[int]:
+        """حجز جزء من الميزانية طوال مدة التحليل، مع الانتظار إذا لم تكفِ"""
+        nbytes = await self.acquire(nbytes)
+        try:
+            yield nbytes
+        finally:
+            await self.release(nbytes)
+
+    def release_when_done(self, task: asyncio.Task, nbytes: int):
+        """تحرير حجز تم بواسطة acquire عند انتهاء مهمة، حتى لو أُلغيت قبل أن تبدأ"""
+        task.add_done_callback(lambda _: asyncio.ensure_future(self.release(nbytes)))
+
+    def get_status(self) -> Dict[str, Any]:
+        """حالة الميزانية"""
+        return {
+            "limit_mb": round(self.limit_bytes / 2**20, 1),
+            "used_mb": round(self.used_bytes / 2**20, 1),
+            "waiting_analyses": self.waiting
+        }
@@ -5,6 +5,7 @@ import numpy as np
 from typing import List, Dict, Any, Tuple, Optional
 import logging
 import math
+import re
 from dataclasses import dataclass
 from enum import Enum
 
@@ -12,7 +13,8 @@ from models import (
     DetectedElement, ExtractedText, ComplianceRule, ComplianceIssue, 
     ComplianceStatus, SeverityLevel, ElementType, BoundingBox
 )
-from config import EGYPTIAN_FIRE_CODE_RULES
+from config import COMPLIANCE_CONFIG, EGYPTIAN_FIRE_CODE_RULES, IMAGE_PROCESSING
+from geometry_engine import FloorPlan
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +53,7 @@ class ComplianceChecker:
         self.rules = self._initialize_rules()
         self.image_dimensions = None
         self.scale_factor = None
+        self.floor_plan = None
         
     def _initialize_rules(self) -> List[ComplianceRule]:
         """تهيئة قواعد الكود المصري"""
@@ -148,11 +151,19 @@ class ComplianceChecker:
         return rules
     
     def check_compliance(self, elements: List[DetectedElement], texts: List[ExtractedText], 
-                        image_dimensions: Tuple[int, int], scale_factor: float = None) -> List[ComplianceIssue]:
-        """فحص الامتثال للكود المصري"""
+                        image_dimensions: Tuple[int, int], scale_factor: float = None,
+                        floor_plan: Optional[FloorPlan] = None,
+                        dpi: Optional[float] = None) -> List[ComplianceIssue]:
+        """فحص الامتثال للكود المصري
+        
+        floor_plan: مضلعات الغرف المستخرجة من الجدران، وتُحسب منها المساحة الفعلية إن وُجدت.
+        dpi: دقة الصورة المحللة الفعلية (بعد تحويل الصفحة أو تصغير فك الترميز)، ومنها
+        ومن مقياس الرسم يُحسب طول البكسل بالأمتار ما لم يُمرر scale_factor.
+        """
         try:
             self.image_dimensions = image_dimensions
-            self.scale_factor = scale_factor or self._calculate_scale_factor(texts)
+            self.scale_factor = scale_factor or self._calculate_scale_factor(texts, dpi)
+            self.floor_plan = floor_plan
             
             issues = []
             
@@ -494,7 +505,10 @@ class ComplianceChecker:
         # استخدام الغرف إذا كانت متوفرة
         rooms = [e for e in elements if e.type == ElementType.ROOM]
         
-        if rooms:
+        if self.floor_plan is not None and self.floor_plan.rooms:
+            # المساحة الفعلية لمضلعات الغرف (دون تداخل المربعات المحيطة)
+            total_area_pixels = self.floor_plan.total_area
+        elif rooms:
             total_area_pixels = sum(
                 room.bounding_box.width * room.bounding_box.height 
                 for room in rooms
@@ -510,42 +524,46 @@ class ComplianceChecker:
             # تقدير افتراضي (1 بكسل = 1 سم)
             return total_area_pixels * 0.0001  # تحويل من سم² إلى م²
     
-    def _calculate_scale_factor(self, texts: List[ExtractedText]) -> float:
-        """حساب معامل المقياس من النصوص"""
+    def _calculate_scale_factor(self, texts: List[ExtractedText], dpi: Optional[float] = None) -> float:
+        """طول البكسل بالأمتار في الواقع
+        
+        البكسل على الورق 0.0254 / dpi متر، ويُضرب في مقام مقياس الرسم، فلا تتغير المساحات
+        والمسافات بدقة تحويل الصفحة أو تصغير فك ترميز الصورة.
+        """
+        dpi = dpi or IMAGE_PROCESSING["dpi"]
+        return 0.0254 / dpi * self._find_drawing_scale(texts)
+    
+    def _find_drawing_scale(self, texts: List[ExtractedText]) -> float:
+        """مقام مقياس الرسم المكتوب في النصوص (100 لمقياس 1:100) أو المقياس الافتراضي
+        
+        النسبة المسبوقة بكلمة المقياس تتقدم على النسب المجردة في أي نص. النسب المجردة تُقبل
+        فقط إذا كانت مقياساً شائعاً، فلا تُقرأ الأوقات (11:30) أو الأبعاد كمقياس.
+        """
+        standard_scales = COMPLIANCE_CONFIG["drawing_scales"]
+        # كل نمط مع تحويل مجموعاته إلى المقام، وهل تكفي المسبوقة بكلمة المقياس أن تقع في المدى
+        scale_patterns = [
+            (r'مقياس[:\s]*(\d+)\s*:\s*(\d+)\b', lambda paper, real: real / paper, True),
+            (r'scale[:\s]*(\d+)\s*:\s*(\d+)\b', lambda paper, real: real / paper, True),
+            (r'(?<![\d.:])1\s*:\s*(\d+)\b(?![.:]\d)', lambda real: real, False),
+            (r'(?<![\d.:])(\d+)\s*:\s*1\b(?![.:]\d)', lambda paper: 1 / paper, False)
+        ]
+        
+        def plausible(scale: float, labeled: bool) -> bool:
+            if labeled:
+                return min(standard_scales) <= scale <= max(standard_scales)
+            return any(math.isclose(scale, standard) for standard in standard_scales)
+        
         try:
-            # البحث عن المقياس في النصوص
-            for text in texts:
-                text_lower = text.text.lower()
-                
-                # البحث عن أنماط المقياس
-                import re
-                scale_patterns = [
-                    r'مقياس[:\s]*([0-9]+)\s*:\s*([0-9]+)',
-                    r'scale[:\s]*([0-9]+)\s*:\s*([0-9]+)',
-                    r'1\s*:\s*([0-9]+)',
-                    r'([0-9]+)\s*:\s*1'
-                ]
-                
-                for pattern in scale_patterns:
-                    match = re.search(pattern, text_lower)
-                    if match:
-                        groups = match.groups()
-                        if len(groups) == 2:
-                            scale_ratio = float(groups[0]) / float(groups[1])
-                        else:
-                            scale_ratio = float(groups[0])
-                        
-                        # تحويل إلى متر لكل بكسل
-                        # تقدير: 1:100 يعني 1 متر في الرسم = 100 متر في الواقع
-                        # لكننا نحتاج العكس: 1 بكسل = كم متر
-                        return scale_ratio / 1000  # تقدير افتراضي
-            
-            # إذا لم نجد مقياس، نستخدم تقدير افتراضي
-            return 0.01  # 1 بكسل = 1 سم
-            
+            for pattern, to_scale, labeled in scale_patterns:
+                for text in texts:
+                    for match in re.finditer(pattern, text.text.lower()):
+                        values = [float(group) for group in match.groups()]
+                        if all(value > 0 for value in values) and plausible(to_scale(*values), labeled):
+                            return to_scale(*values)
         except Exception as e:
-            logger.warning(f"خطأ في حساب معامل المقياس: {str(e)}")
-            return 0.01
+            logger.warning(f"خطأ في قراءة مقياس الرسم: {str(e)}")
+        
+        return COMPLIANCE_CONFIG["default_drawing_scale"]
     
     def _calculate_distance(self, bbox1: BoundingBox, bbox2: BoundingBox) -> float:
         """حساب المسافة بين عنصرين"""
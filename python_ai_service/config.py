@@ -23,7 +23,9 @@ API_CONFIG = {
     "version": "1.0.0",
     "host": "0.0.0.0",
     "port": 8000,
-    "debug": True
+    "debug": True,
+    # مدة بقاء قناة أحداث التحليل بعد حدثها النهائي ليستلمه المشترك المتأخر (بالثواني)
+    "event_stream_retention": 300
 }
 
 # إعدادات قاعدة البيانات
@@ -45,7 +47,8 @@ AI_MODELS = {
     "object_detection": {
         "model_name": "yolov8n.pt",
         "confidence_threshold": 0.5,
-        "iou_threshold": 0.45
+        "iou_threshold": 0.45,
+        "input_size": 640  # أبعاد إدخال النموذج (تُختار صورة الاكتشاف من هرم الصور على أساسها)
     },
     "ocr": {
         "primary": "paddleocr",  # paddleocr, tesseract, easyocr
@@ -63,10 +66,91 @@ IMAGE_PROCESSING = {
     "max_file_size": 50 * 1024 * 1024,  # 50MB
     "allowed_formats": [".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".pdf"],
     "max_dimensions": (4096, 4096),
-    "dpi": 300,
+    # الصور الأكبر تُرفض من رأس الملف قبل فك ترميزها (A0 بدقة 300 DPI نحو 140 ميجابكسل)
+    "max_pixels": int(os.getenv("MAX_IMAGE_PIXELS", 300 * 1000 * 1000)),
+    "dpi": 300,  # أقصى دقة لتحويل صفحات PDF
+    "min_dpi": 72,
+    # أقل دقة تحتاجها كل مرحلة من صورة الصفحة؛ تُقدَّم على max_dimensions عند اللوحات الكبيرة
+    "stage_min_dpi": {
+        "detect_elements": 72,  # YOLO يصغّر الصورة إلى 640 بكسل على أي حال
+        "detect_geometric_shapes": 100,
+        "extract_texts": 150  # نص بارتفاع 2.5 مم ≈ 15 بكسل
+    },
+    # المعالجة الأولية على بلاطات متوازية مع هامش تداخل للوحات الكبيرة
+    "tiling": {
+        "min_pixels": 16 * 1024 * 1024,  # الصور الأصغر تُعالج دفعة واحدة
+        "tile_size": 2048,
+        "halo": 8,  # يغطي نصف قطر مرشح الحدة (1) والمرشح الثنائي d=9 (4)
+        # 0: المعالجات مقسومة على عمال المجمع في وضع العمليات (لكل عملية مجمع بلاطاتها)، أو كلها في وضع الخيوط
+        "workers": int(os.getenv("TILE_WORKERS", 0))
+    },
+    # هرم الصور: مستوى كل مرحلة (0 = الدقة الكاملة، وكل مستوى نصف أبعاد السابق)
+    "pyramid": {
+        "min_dimension": 512,  # لا يُصغَّر أي مستوى تحت هذا البعد الأطول
+        "levels": {
+            "skew": 2,
+            "detect_geometric_shapes": 1,
+            "extract_texts": 0
+        }
+    },
+    # دمج قطع الخطوط المتصلة على استقامة واحدة (المسافات بالبكسل بمقياس الصورة الكاملة)
+    "shapes": {
+        "merge_angle_tolerance": 2.0,  # درجات
+        "merge_distance_tolerance": 3.0,  # البعد العمودي بين القطعتين
+        "merge_gap": 10.0  # أقصى فجوة بين نهايتي قطعتين متتاليتين على الخط نفسه
+    },
+    # اقتراح مناطق رموز الحريق الملونة قبل الاكتشاف (الأحمر: طفايات ولوحات، الأخضر: مخارج)
+    # معطل افتراضياً: الرموز المرسومة بالأسود فقط لا تُقترح فتُفقد في اللوحات غير الملونة
+    "color_prefilter": {
+        "enabled": os.getenv("COLOR_PREFILTER", "false").lower() == "true",
+        # نطاقات HSV بمقياس OpenCV (التدرج 0-180)
+        "hsv_ranges": {
+            "red": [((0, 80, 60), (10, 255, 255)), ((170, 80, 60), (180, 255, 255))],
+            "green": [((40, 80, 60), (85, 255, 255))]
+        },
+        "min_pixels": 12,  # أقل عدد بكسلات ملونة في المنطقة (على صورة مستوى الاكتشاف)
+        "padding": 8,  # هامش حول المنطقة يضم أجزاء الرمز المتقاربة
+        "max_coverage": 0.5  # إذا غطت المناطق أكثر من ذلك يُشغل الاكتشاف على الصورة كاملة
+    },
     "quality": 95
 }
 
+# إعدادات استخراج الجدران والغرف (المسافات بالبكسل بمقياس الصورة الكاملة)
+GEOMETRY_CONFIG = {
+    "snap_tolerance": 8.0,  # دمج نهايات الجدران المتقاربة وتمديد النهايات المعلقة
+    "min_wall_length": 20.0,
+    "min_room_area": 40 * 40,
+    "min_room_width": 15.0  # الأضيق من ذلك شريط بين خطي جدار مزدوج
+}
+
+# إعدادات وضع الفرز السريع (نتيجة أولية قبل اكتمال التحليل الكامل)
+TRIAGE_CONFIG = {
+    "max_dimension": 640,  # أقصى بعد للصورة المصغرة المستخدمة في الاكتشاف السريع
+    "confidence_threshold": 0.4
+}
+
+# إعدادات التحليل الدفعي
+BATCH_CONFIG = {
+    "max_files": 200,  # أقصى عدد ملفات في الدفعة الواحدة (بعد فك الأرشيف)
+    "detection_batch_size": 8,  # عدد الصور في كل استدعاء مجمّع لنموذج YOLO
+    # تجميع استدعاءات الاكتشاف من التحليلات المتزامنة في دفعات للنموذج
+    "micro_batching": {
+        "enabled": os.getenv("MICRO_BATCHING", "auto"),  # auto (في وضع الخيوط فقط)، true، false
+        "max_batch_size": int(os.getenv("MICRO_BATCH_SIZE", 8)),
+        "max_wait_ms": float(os.getenv("MICRO_BATCH_WAIT_MS", 10))  # أقصى انتظار لاكتمال الدفعة
+    }
+}
+
+# إعدادات قياس المساحات والمسافات في فحص الامتثال
+COMPLIANCE_CONFIG = {
+    # مقام مقياس الرسم (1:100) إذا لم يُكتب في الرسم؛ البكسل بالأمتار = 0.0254 / DPI × المقام
+    "default_drawing_scale": 100,
+    # المقاييس الشائعة (المقام، والكسور للتكبير 10:1 وما دونه). النسبة غير المسبوقة بكلمة
+    # "مقياس" أو scale لا تُقبل إلا منها، والمسبوقة بها تُقبل ضمن مداها
+    "drawing_scales": [0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 25, 50, 75, 100, 125, 200, 250,
+                       500, 1000, 1250, 2000, 2500, 5000]
+}
+
 # قواعد الكود المصري للحريق
 EGYPTIAN_FIRE_CODE_RULES = {
     "smoke_detector_coverage": {
@@ -137,9 +221,28 @@ REPORT_CONFIG = {
 # إعدادات الأداء
 PERFORMANCE_CONFIG = {
     "max_concurrent_analyses": 5,
-    "analysis_timeout": 300,  # 5 minutes
+    "analysis_timeout": 300,  # 5 minutes (مهلة كل مرحلة افتراضياً)
+    "stage_timeouts": {},  # مهلة خاصة لمراحل بعينها: {"extract_texts": 600}
     "cache_results": True,
-    "cache_duration": 3600  # 1 hour
+    "cache_duration": 3600,  # 1 hour
+    "cache_dir": str(OUTPUT_DIR / "stage_cache"),  # مخرجات المراحل المخزنة بمفاتيح المحتوى
+    "cache_max_size_mb": int(os.getenv("CACHE_MAX_SIZE_MB", 2048)),
+    "executor_type": os.getenv("EXECUTOR_TYPE", "thread"),  # thread, process
+    "memory_budget_mb": int(os.getenv("MEMORY_BUDGET_MB", 4096)),  # ميزانية الصور لجميع التحليلات المتزامنة
+    "frame_copies_estimate": 6,  # عدد النسخ الكاملة للصورة المتوقع في ذروة التحليل الواحد
+    # صور التحليل ومشتقاتها في ملفات مشتركة يفتحها العمال بالاسم دون نسخ عبر الأنابيب
+    "shared_frames": {
+        "enabled": os.getenv("SHARED_FRAMES", "auto"),  # auto (في وضع العمليات فقط)، true، false
+        "directory": str(OUTPUT_DIR / "frames"),
+        "min_bytes": 1024 * 1024  # المصفوفات الأصغر تُرسل بالنسخ المعتاد
+    },
+    # إعادة استخدام اكتشاف ونصوص رسم سابق شبه مطابق (ختم أو حرف مراجعة أو إعادة مسح)
+    "near_duplicates": {
+        "enabled": os.getenv("NEAR_DUPLICATE_REUSE", "false").lower() == "true",
+        "index_path": str(OUTPUT_DIR / "fingerprints.db"),
+        "max_distance": 4,  # أقصى مسافة Hamming بين بصمتي pHash (من 64 بت، بحد أقصى 7)
+        "max_size_difference": 0.02  # أقصى فرق نسبي في أبعاد الصفحة
+    }
 }
 
 # إعدادات السجلات
@@ -0,0 +1,166 @@
+# فهرس البصمات الإدراكية للرسومات شبه المكررة
+# Perceptual-hash Index for Near-duplicate Drawings
+
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List
+
+import cv2
+import numpy as np
+
+from config import PERFORMANCE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# البصمة 64 بت مقسمة إلى 8 شرائح من 8 بتات: البصمتان على مسافة Hamming لا تتجاوز 7
+# تتطابقان في شريحة واحدة على الأقل (مبدأ برج الحمام)، فيكفي البحث بالشرائح المتطابقة
+HASH_BITS = 64
+BAND_COUNT = 8
+BAND_BITS = HASH_BITS // BAND_COUNT
+
+
+def perceptual_hash(image: np.ndarray) -> int:
+    """بصمة pHash من 64 بت لصورة مصغرة
+
+    معاملات DCT منخفضة التردد (8×8) لصورة رمادية 32×32 مقارنة بوسيطها، فلا تتأثر البصمة
+    كثيراً بختم صغير أو حرف مراجعة أو اختلاف إضاءة المسح وضغطه.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if len(image.shape) == 3 else image
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].ravel()
+    # المعامل الثابت (متوسط الإضاءة) لا يدخل في حساب الوسيط
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _bands(value: int) -> List[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (index * BAND_BITS)) & mask for index in range(BAND_COUNT)]
+
+
+@dataclass
+class DuplicateMatch:
+    """صفحة سابقة شبه مطابقة"""
+    file_key: str  # مفتاح محتوى الملف في الذاكرة المؤقتة للمراحل
+    page_number: int
+    width: int
+    height: int
+    distance: int
+
+
+class DuplicateIndex:
+    """فهرس SQLite لبصمات الصفحات المحللة مع بحث بمسافة Hamming
+
+    تُخزن لكل صفحة بصمتها وأبعادها، وشرائح البصمة في جدول مفهرس بـ (الشريحة، القيمة)،
+    فيُقرأ المرشحون الذين يشاركون البصمة المطلوبة شريحة واحدة على الأقل ثم تُحسب المسافة
+    الدقيقة لهم فقط. الصفحة تُعاد بأبعادها لأن مخرجاتها بإحداثيات صورتها.
+    البصمة الأقدم من ttl (مدة صلاحية الذاكرة المؤقتة للمراحل) لا تُعاد لأن مخرجاتها انتهت،
+    وتُحذف صفوفها عند كل إضافة فلا يكبر الملف بلا حد.
+    """
+
+    def __init__(self, path: str = None, max_distance: int = None, max_size_difference: float = None,
+                 ttl: float = None):
+        config = PERFORMANCE_CONFIG["near_duplicates"]
+        self.path = Path(path or config["index_path"])
+        self.ttl = ttl or PERFORMANCE_CONFIG["cache_duration"]
+        self.max_distance = min(config["max_distance"] if max_distance is None else max_distance,
+                                BAND_COUNT - 1)
+        self.max_size_difference = (config["max_size_difference"]
+                                    if max_size_difference is None else max_size_difference)
+        self.lookups = 0
+        self.matches = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    file_key TEXT NOT NULL,
+                    page_number INTEGER NOT NULL,
+                    hash TEXT NOT NULL,
+                    width INTEGER NOT NULL,
+                    height INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    PRIMARY KEY (file_key, page_number)
+                );
+                CREATE TABLE IF NOT EXISTS bands (
+                    band INTEGER NOT NULL,
+                    value INTEGER NOT NULL,
+                    file_key TEXT NOT NULL,
+                    page_number INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS bands_lookup ON bands (band, value);
+            """)
+
+    def add(self, file_key: str, page_number: int, fingerprint: int, width: int, height: int):
+        """تسجيل بصمة صفحة (تُستبدل بصمة الصفحة نفسها إن وُجدت) وحذف البصمات المنتهية"""
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM bands WHERE (file_key, page_number) IN "
+                "(SELECT file_key, page_number FROM fingerprints WHERE created < ?)"
+                " OR (file_key = ? AND page_number = ?)",
+                (now - self.ttl, file_key, page_number))
+            self._connection.execute("DELETE FROM fingerprints WHERE created < ?", (now - self.ttl,))
+            self._connection.execute(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?)",
+                (file_key, page_number, format(fingerprint, "016x"), width, height, now)
+            )
+            self._connection.executemany(
+                "INSERT INTO bands VALUES (?, ?, ?, ?)",
+                [(band, value, file_key, page_number) for band, value in enumerate(_bands(fingerprint))]
+            )
+
+    def find(self, fingerprint: int, width: int, height: int, exclude_key: str = None) -> List[DuplicateMatch]:
+        """الصفحات السابقة شبه المطابقة بأبعاد متقاربة، الأقرب أولاً"""
+        conditions = " OR ".join(["(b.band = ? AND b.value = ?)"] * BAND_COUNT)
+        parameters = [part for band, value in enumerate(_bands(fingerprint)) for part in (band, value)]
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT DISTINCT f.file_key, f.page_number, f.hash, f.width, f.height "
+                f"FROM bands b JOIN fingerprints f "
+                f"ON f.file_key = b.file_key AND f.page_number = b.page_number "
+                f"WHERE f.created >= ? AND ({conditions})",
+                [time.time() - self.ttl] + parameters
+            ).fetchall()
+
+        matches = []
+        for file_key, page_number, value, match_width, match_height in rows:
+            if file_key == exclude_key:
+                continue
+            distance = hamming_distance(fingerprint, int(value, 16))
+            if distance > self.max_distance:
+                continue
+            if (abs(match_width - width) > self.max_size_difference * width
+                    or abs(match_height - height) > self.max_size_difference * height):
+                continue
+            matches.append(DuplicateMatch(file_key, page_number, match_width, match_height, distance))
+
+        self.lookups += 1
+        if matches:
+            self.matches += 1
+        return sorted(matches, key=lambda match: match.distance)
+
+    def get_status(self) -> Dict[str, Any]:
+        """حالة الفهرس للمراقبة"""
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+        return {
+            "entries": entries,
+            "max_distance": self.max_distance,
+            "lookups": self.lookups,
+            "matches": self.matches
+        }
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
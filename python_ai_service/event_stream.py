@@ -0,0 +1,76 @@
+# بث أحداث التحليل للعملاء (Server-Sent Events)
+# Analysis Event Streams for Server-Sent Events
+
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# مهلة إرسال نبضة إبقاء الاتصال عند عدم وجود أحداث (بالثواني)
+KEEPALIVE_INTERVAL = 15.0
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """تنسيق حدث وفق بروتوكول Server-Sent Events"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+class AnalysisEventStream:
+    """قناة أحداث تحليل واحد يشترك فيها أي عدد من العملاء
+
+    تحتفظ القناة بسجل الأحداث ليستلمه المشترك المتأخر كاملاً قبل الأحداث
+    الجديدة، وتُغلق بحدث نهائي (اكتمال أو فشل أو إلغاء) لا يبقى في السجل غيره.
+    """
+
+    def __init__(self):
+        self.history: List[Dict[str, Any]] = []
+        self.closed = False
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def publish(self, event: str, data: Dict[str, Any]):
+        """نشر حدث لجميع المشتركين"""
+        if self.closed:
+            return
+        message = {"event": event, "data": data}
+        self.history.append(message)
+        for queue in self._subscribers:
+            queue.put_nowait(message)
+
+    def close(self, event: str, data: Dict[str, Any]):
+        """نشر الحدث النهائي وإغلاق القناة"""
+        if self.closed:
+            return
+        self.publish(event, data)
+        self.closed = True
+        # النتائج الجزئية لم تعد لازمة بعد الحدث النهائي الذي يحمل حالة التحليل
+        self.history = self.history[-1:]
+        for queue in self._subscribers:
+            queue.put_nowait(None)
+
+    async def subscribe(self, keepalive: Optional[float] = KEEPALIVE_INTERVAL) -> AsyncIterator[str]:
+        """الاشتراك في الأحداث بصيغة SSE حتى إغلاق القناة"""
+        queue: asyncio.Queue = asyncio.Queue()
+        backlog = list(self.history)
+        closed = self.closed
+        if not closed:
+            self._subscribers.add(queue)
+
+        try:
+            for message in backlog:
+                yield format_sse(message["event"], message["data"])
+            if closed:
+                return
+
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    # تعليق SSE يمنع الوسطاء من إغلاق الاتصال الخامل
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield format_sse(message["event"], message["data"])
+        finally:
+            self._subscribers.discard(queue)
@@ -0,0 +1,166 @@
+# الأشكال الهندسية المكتشفة بصيغة عمودية
+# Columnar Geometric Shapes and Collinear Segment Merging
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+@dataclass
+class GeometricShapes:
+    """الأشكال المكتشفة في صورة كمصفوفات NumPy بدلاً من قاموس لكل شكل
+
+    الإحداثيات بمقياس الصورة الكاملة. رؤوس المضلعات متتالية في polygon_points،
+    ورؤوس المضلع i هي polygon_points[polygon_offsets[i]:polygon_offsets[i + 1]].
+    """
+    segments: np.ndarray  # (N, 4): x1, y1, x2, y2
+    lengths: np.ndarray  # (N,)
+    circle_centers: np.ndarray  # (M, 2)
+    circle_radii: np.ndarray  # (M,)
+    polygon_points: np.ndarray  # (K, 2)
+    polygon_offsets: np.ndarray  # (P + 1,)
+
+    @classmethod
+    def create(cls, segments: Optional[np.ndarray] = None,
+               circles: Optional[np.ndarray] = None,
+               polygons: Sequence[np.ndarray] = ()) -> "GeometricShapes":
+        """إنشاء النتيجة من القطع (N, 4) والدوائر (M, 3: x, y, r) وقائمة رؤوس المضلعات"""
+        segments = np.zeros((0, 4), np.float32) if segments is None else \
+            np.asarray(segments, np.float32).reshape(-1, 4)
+        circles = np.zeros((0, 3), np.float32) if circles is None else \
+            np.asarray(circles, np.float32).reshape(-1, 3)
+        polygons = [np.asarray(polygon, np.float32).reshape(-1, 2) for polygon in polygons]
+
+        offsets = np.zeros(len(polygons) + 1, np.int64)
+        if polygons:
+            np.cumsum([len(polygon) for polygon in polygons], out=offsets[1:])
+        points = np.concatenate(polygons) if polygons else np.zeros((0, 2), np.float32)
+
+        return cls(
+            segments=segments,
+            lengths=np.hypot(segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1]),
+            circle_centers=circles[:, :2],
+            circle_radii=circles[:, 2],
+            polygon_points=points,
+            polygon_offsets=offsets
+        )
+
+    @property
+    def polygon_count(self) -> int:
+        return len(self.polygon_offsets) - 1
+
+    def polygon(self, index: int) -> np.ndarray:
+        """رؤوس المضلع index"""
+        return self.polygon_points[self.polygon_offsets[index]:self.polygon_offsets[index + 1]]
+
+    def __len__(self) -> int:
+        return len(self.segments) + len(self.circle_radii) + self.polygon_count
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """الصيغة السابقة: قاموس لكل شكل بإحداثيات صحيحة"""
+        shapes = []
+
+        lines = np.round(self.segments).astype(int)
+        lengths = np.hypot(lines[:, 2] - lines[:, 0], lines[:, 3] - lines[:, 1])
+        for (x1, y1, x2, y2), length in zip(lines.tolist(), lengths.tolist()):
+            shapes.append({
+                "type": "line",
+                "coordinates": [(x1, y1), (x2, y2)],
+                "length": length
+            })
+
+        centers = np.round(self.circle_centers).astype(int).tolist()
+        radii = np.round(self.circle_radii).astype(int).tolist()
+        for (x, y), r in zip(centers, radii):
+            shapes.append({
+                "type": "circle",
+                "center": (x, y),
+                "radius": r
+            })
+
+        points = np.round(self.polygon_points).astype(int)
+        for start, end in zip(self.polygon_offsets[:-1].tolist(), self.polygon_offsets[1:].tolist()):
+            shapes.append({
+                "type": "rectangle" if end - start == 4 else "polygon",
+                "corners": points[start:end].tolist()
+            })
+
+        return shapes
+
+
+def merge_collinear_segments(segments: np.ndarray, angle_tolerance: float = 2.0,
+                             distance_tolerance: float = 3.0, gap: float = 10.0) -> np.ndarray:
+    """دمج القطع الواقعة على خط واحد والمتداخلة أو المتقاربة في قطعة واحدة
+
+    HoughLinesP يقسم الجدار الطويل إلى قطع كثيرة متجاورة أو متداخلة. تُجمع القطع حسب
+    اتجاهها (بدقة angle_tolerance درجة) ثم بعدها العمودي عن الأصل (تتابع الفروق لا يتجاوز
+    distance_tolerance)، ثم تُدمج الفترات المتداخلة على كل خط إذا لم تتجاوز الفجوة بينها gap.
+    كل ذلك بعمليات فرز وتجميع على المصفوفات دون حلقات Python. القطعة المدموجة تمر بمركز
+    القطع الموزون بأطوالها في اتجاهها المتوسط، والقطعة التي لا تُدمج تبقى كما هي.
+    """
+    segments = np.asarray(segments, np.float64).reshape(-1, 4)
+    count = len(segments)
+    if count < 2:
+        return segments.astype(np.float32)
+
+    x1, y1, x2, y2 = segments.T
+    dx, dy = x2 - x1, y2 - y1
+    lengths = np.hypot(dx, dy)
+
+    # اتجاه القطعة في [0, π) وفئته؛ نصف فئة إزاحة حتى يقع الأفقي (0 و π) في فئة واحدة
+    bins = max(int(round(180.0 / angle_tolerance)), 1)
+    step = np.pi / bins
+    direction = np.mod(np.arctan2(dy, dx), np.pi)
+    angle_bin = np.floor(direction / step + 0.5).astype(np.int64) % bins
+
+    # البعد العمودي والمسقط على الاتجاه بمرجع الفئة (ثابت لجميع قطعها)
+    reference = angle_bin * step
+    cos, sin = np.cos(reference), np.sin(reference)
+    rho = ((x1 + x2) * -sin + (y1 + y2) * cos) / 2
+    t1, t2 = x1 * cos + y1 * sin, x2 * cos + y2 * sin
+    t_start, t_end = np.minimum(t1, t2), np.maximum(t1, t2)
+
+    # الخطوط: فرز حسب (الفئة، البعد العمودي) وبداية خط جديد عند تغير الفئة أو قفزة في البعد
+    order = np.lexsort((rho, angle_bin))
+    sorted_bin, sorted_rho = angle_bin[order], rho[order]
+    new_line = np.ones(count, bool)
+    new_line[1:] = (sorted_bin[1:] != sorted_bin[:-1]) | (np.diff(sorted_rho) > distance_tolerance)
+    line_id = np.empty(count, np.int64)
+    line_id[order] = np.cumsum(new_line) - 1
+
+    # الفترات على كل خط: فرز حسب (الخط، البداية) وأقصى نهاية متراكمة داخل كل خط
+    # (إزاحة كل خط بأكبر من مدى النهايات تمنع تراكم نهايات خط سابق)
+    order = np.lexsort((t_start, line_id))
+    sorted_line, sorted_start, sorted_end = line_id[order], t_start[order], t_end[order]
+    span = sorted_end.max() - sorted_end.min() + 1
+    running_end = np.maximum.accumulate(sorted_end + sorted_line * span) - sorted_line * span
+    new_run = np.ones(count, bool)
+    new_run[1:] = (sorted_line[1:] != sorted_line[:-1]) | (sorted_start[1:] > running_end[:-1] + gap)
+    starts = np.flatnonzero(new_run)
+    if len(starts) == count:
+        return segments.astype(np.float32)
+
+    # الاتجاه المتوسط بمضاعفة الزاوية (0 و π اتجاه واحد) والمركز الموزون بالأطوال
+    weights = np.maximum(lengths[order], 1e-6)
+    doubled = 2 * direction[order]
+    mean_direction = np.arctan2(np.add.reduceat(weights * np.sin(doubled), starts),
+                                np.add.reduceat(weights * np.cos(doubled), starts)) / 2
+    total_weight = np.add.reduceat(weights, starts)
+    mid_x = (x1 + x2)[order] / 2
+    mid_y = (y1 + y2)[order] / 2
+    center_x = np.add.reduceat(weights * mid_x, starts) / total_weight
+    center_y = np.add.reduceat(weights * mid_y, starts) / total_weight
+
+    # مسقط نهايات كل قطعة على اتجاه مجموعتها وأبعد مسقطين هما نهايتا القطعة المدموجة
+    run_id = np.cumsum(new_run) - 1
+    ux, uy = np.cos(mean_direction), np.sin(mean_direction)
+    s1 = (x1[order] - center_x[run_id]) * ux[run_id] + (y1[order] - center_y[run_id]) * uy[run_id]
+    s2 = (x2[order] - center_x[run_id]) * ux[run_id] + (y2[order] - center_y[run_id]) * uy[run_id]
+    s_min = np.minimum.reduceat(np.minimum(s1, s2), starts)
+    s_max = np.maximum.reduceat(np.maximum(s1, s2), starts)
+
+    return np.stack([
+        center_x + s_min * ux, center_y + s_min * uy,
+        center_x + s_max * ux, center_y + s_max * uy
+    ], axis=1).astype(np.float32)
@@ -0,0 +1,183 @@
+# استخراج الجدران والغرف من خطوط الرسم
+# Wall Graph and Room Polygon Extraction
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+try:
+    import shapely
+except ImportError:
+    shapely = None
+
+from config import GEOMETRY_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# إزاحات الخلايا المجاورة في شبكة التجزئة المكانية (نصف الجوار يكفي لأن الأزواج متماثلة)
+_NEIGHBOR_OFFSETS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+@dataclass
+class FloorPlan:
+    """مضلعات الغرف المستخرجة من الجدران بإحداثيات الصورة الكاملة (بكسل)"""
+    rooms: List[Any] = field(default_factory=list)  # shapely.Polygon
+    wall_count: int = 0
+    node_count: int = 0
+
+    @property
+    def room_areas(self) -> np.ndarray:
+        """مساحة كل غرفة بالبكسل المربع (بعد طرح الفتحات الداخلية)"""
+        if not self.rooms:
+            return np.zeros(0)
+        return shapely.area(np.asarray(self.rooms, dtype=object))
+
+    @property
+    def total_area(self) -> float:
+        """مجموع مساحات الغرف دون تداخل (وجوه الرسم المستوي لا تتداخل)"""
+        return float(self.room_areas.sum())
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """الغرف كقواميس (رؤوس المحيط الخارجي والمساحة)"""
+        return [
+            {"exterior": np.round(np.asarray(room.exterior.coords)).astype(int).tolist(), "area": float(area)}
+            for room, area in zip(self.rooms, self.room_areas)
+        ]
+
+
+def _endpoint_clusters(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """تجميع النقاط المتقاربة (أقل من tolerance) بتجزئة مكانية على شبكة خلاياها بحجم tolerance
+
+    تُقارن كل نقطة بنقاط خليتها والخلايا المجاورة فقط، ثم تُوحد الأزواج المتقاربة بانتشار
+    أصغر رقم عبر الأزواج مع قفز المؤشرات حتى الاستقرار. تعيد رقم مجموعة كل نقطة.
+    """
+    count = len(points)
+    cells = np.floor(points / tolerance).astype(np.int64)
+    cells -= cells.min(axis=0)
+    stride = int(cells[:, 1].max()) + 3
+    keys = (cells[:, 0] + 1) * stride + cells[:, 1] + 1
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    indices = np.arange(count)
+
+    sources, targets = [], []
+    for dx, dy in _NEIGHBOR_OFFSETS:
+        neighbor_keys = keys + dx * stride + dy
+        left = np.searchsorted(sorted_keys, neighbor_keys, "left")
+        counts = np.searchsorted(sorted_keys, neighbor_keys, "right") - left
+        total = int(counts.sum())
+        if total == 0:
+            continue
+        source = np.repeat(indices, counts)
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        target = order[np.repeat(left, counts) + within]
+        close = np.hypot(*(points[source] - points[target]).T) <= tolerance
+        close &= (source < target) if (dx, dy) == (0, 0) else (source != target)
+        sources.append(source[close])
+        targets.append(target[close])
+
+    labels = indices.copy()
+    if not sources:
+        return labels
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+    while True:
+        smallest = np.minimum(labels[sources], labels[targets])
+        updated = labels.copy()
+        np.minimum.at(updated, sources, smallest)
+        np.minimum.at(updated, targets, smallest)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+class GeometryEngine:
+    """تحويل قطع الجدران إلى رسم مستوٍ ثم إلى مضلعات غرف
+
+    1. النهايات المتقاربة تُدمج في عقدة واحدة بالتجزئة المكانية، فتصبح القطع أضلاعاً بين عقد.
+    2. النهايات المعلقة (عقدة بضلع واحد) تُمدد بمقدار مسافة الالتقاط لتقطع الجدار المقابل
+       عند الوصلات على شكل T التي لم يصلها HoughLinesP تماماً.
+    3. shapely يقسم الأضلاع عند تقاطعاتها ويستخرج الوجوه المغلقة (polygonize).
+    4. تُستبعد الوجوه الصغيرة، والشرائط الضيقة بين خطي الجدار المزدوج، والوجوه المحيطة
+       بغيرها من الخارج (إطار اللوحة والمساحات حول المبنى): وجه على الحد الخارجي للرسم
+       تحتوي فتحاته أكثر من وجه. الغرفة التي بداخلها منور أو عمود (وجه واحد لكل فتحة) تبقى.
+    """
+
+    def __init__(self):
+        self.snap_tolerance = GEOMETRY_CONFIG["snap_tolerance"]
+        self.min_wall_length = GEOMETRY_CONFIG["min_wall_length"]
+        self.min_room_area = GEOMETRY_CONFIG["min_room_area"]
+        self.min_room_width = GEOMETRY_CONFIG["min_room_width"]
+
+    def build_wall_graph(self, segments: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """عقد الرسم (V, 2) وأضلاعه (E, 2) من قطع الجدران (N, 4)"""
+        segments = np.asarray(segments, np.float64).reshape(-1, 4)
+        lengths = np.hypot(segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1])
+        segments = segments[lengths >= self.min_wall_length]
+        if len(segments) == 0:
+            return np.zeros((0, 2)), np.zeros((0, 2), np.int64)
+
+        # النقطتان (2i, 2i + 1) هما نهايتا القطعة i
+        points = segments.reshape(-1, 2)
+        _, node_of_point = np.unique(_endpoint_clusters(points, self.snap_tolerance), return_inverse=True)
+        node_count = int(node_of_point.max()) + 1
+        weights = np.bincount(node_of_point, minlength=node_count)
+        nodes = np.stack([
+            np.bincount(node_of_point, points[:, 0], node_count),
+            np.bincount(node_of_point, points[:, 1], node_count)
+        ], axis=1) / weights[:, None]
+
+        # الأضلاع دون الحلقات (قطعة أقصر من مسافة الالتقاط) والتكرار
+        edges = np.sort(node_of_point.reshape(-1, 2), axis=1)
+        edges = np.unique(edges[edges[:, 0] != edges[:, 1]], axis=0)
+        return nodes, edges
+
+    def extract(self, segments: np.ndarray) -> FloorPlan:
+        """استخراج الغرف من قطع الجدران"""
+        if shapely is None:
+            logger.warning("مكتبة shapely غير متوفرة، لن تُستخرج مضلعات الغرف")
+            return FloorPlan()
+
+        nodes, edges = self.build_wall_graph(segments)
+        if len(edges) < 3:
+            return FloorPlan(wall_count=len(edges), node_count=len(nodes))
+
+        starts, ends = nodes[edges[:, 0]], nodes[edges[:, 1]]
+
+        # تمديد النهايات المعلقة في اتجاه ضلعها
+        degree = np.bincount(edges.ravel(), minlength=len(nodes))
+        direction = ends - starts
+        direction /= np.maximum(np.hypot(*direction.T), 1e-9)[:, None]
+        extension = direction * self.snap_tolerance
+        starts = np.where((degree[edges[:, 0]] == 1)[:, None], starts - extension, starts)
+        ends = np.where((degree[edges[:, 1]] == 1)[:, None], ends + extension, ends)
+
+        lines = shapely.linestrings(np.stack([starts, ends], axis=1))
+        noded = shapely.union_all(lines)
+        faces = shapely.get_parts(shapely.polygonize(shapely.get_parts(noded)))
+        if len(faces) == 0:
+            return FloorPlan(wall_count=len(edges), node_count=len(nodes))
+
+        areas = shapely.area(faces)
+        # 2 × المساحة / المحيط ≈ عرض الشريط الطويل الضيق
+        widths = 2 * areas / np.maximum(shapely.length(faces), 1e-9)
+        keep = (areas >= self.min_room_area) & (widths >= self.min_room_width)
+
+        candidates = np.flatnonzero(keep & (shapely.get_num_interior_rings(faces) > 0))
+        if len(candidates):
+            shells = shapely.get_exterior_ring(faces)
+            outline = shapely.boundary(shapely.union_all(shapely.polygons(shells)))
+            candidates = candidates[shapely.intersects(shells[candidates], outline)]
+            inner_points = shapely.point_on_surface(faces)
+            for index in candidates:
+                hole_count = shapely.get_num_interior_rings(faces[index])
+                holes = shapely.polygons(shapely.get_interior_ring(faces[index], np.arange(hole_count)))
+                # المنور أو العمود وجه واحد داخل فتحته، والمبنى داخل الإطار عدة غرف
+                if shapely.contains(shapely.union_all(holes), inner_points).sum() > hole_count:
+                    keep[index] = False
+
+        rooms = list(faces[keep])
+        logger.info(f"تم استخراج {len(rooms)} غرفة من {len(edges)} جدار")
+        return FloorPlan(rooms=rooms, wall_count=len(edges), node_count=len(nodes))
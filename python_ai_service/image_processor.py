@@ -2,45 +2,379 @@
 # Image Processor and Visual Analysis
 
 import cv2
+import re
 import numpy as np
-from PIL import Image, ImageEnhance
+from PIL import Image
 import imageio
-from typing import List, Tuple, Dict, Any, Optional
+from typing import List, Tuple, Dict, Any, Optional, Iterator, Union
 from pathlib import Path
 import logging
+import os
+import threading
 from dataclasses import dataclass
 
 from models import DetectedElement, BoundingBox, ElementType
 from config import IMAGE_PROCESSING
+from tiled_processing import map_tiles, process_tiled, split_tiles
+from shared_frames import share_array
+from geometric_shapes import GeometricShapes, merge_collinear_segments
 
 logger = logging.getLogger(__name__)
 
+# أوزان الإضاءة بترتيب RGB (تحويل PIL إلى L)
+LUMINANCE_WEIGHTS = (0.299, 0.587, 0.114)
+
+# نواة التنعيم التي يستخدمها ImageEnhance.Sharpness (ImageFilter.SMOOTH)
+SMOOTH_KERNEL = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float32) / 13
+
+# أقل ميل (بالدرجات) يستدعي تدوير الصورة
+SKEW_CORRECTION_THRESHOLD = 0.5
+
+# حد PIL لقنابل فك الضغط يتبع حد الخدمة الذي يفحصه inspect_image (الافتراضي نحو 89 ميجابكسل فقط)
+Image.MAX_IMAGE_PIXELS = IMAGE_PROCESSING["max_pixels"]
+
+# أعلام فك الترميز المصغر في OpenCV حسب عامل التصغير (JPEG يُفك مباشرة بالمقياس المصغر)
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+def estimate_skew_angle(gray: Optional[np.ndarray], max_angle: float = 45.0,
+                        edges: Optional[np.ndarray] = None) -> float:
+    """تقدير ميل الرسم بالدرجات من خطوط Hough (موجب = مائل عكس اتجاه عقارب الساعة)
+    
+    تُمرر صورة رمادية مصغرة أو خريطة حوافها: العتبة الثابتة على خريطة الحواف المصغرة تقصر
+    التصويت على الخطوط الطويلة، وهي الأنسب لتقدير الميل. يُعاد 0.0 إذا لم توجد خطوط مناسبة.
+    """
+    if edges is None:
+        edges = cv2.Canny(gray, 50, 150, apertureSize=3)
+    lines = cv2.HoughLines(edges, 1, np.pi/180, threshold=100)
+    if lines is None:
+        return 0.0
+    
+    # زاوية العمودي على الخط في المدى (-90, 90] حتى يُقاس الميل في الاتجاهين
+    angles = np.degrees(lines.reshape(-1, 2)[:, 1])
+    angles = np.where(angles > 90, angles - 180, angles)
+    angles = angles[np.abs(angles) < max_angle]
+    if len(angles) == 0:
+        return 0.0
+    return float(-np.median(angles))
+
 @dataclass
 class ImageInfo:
     """معلومات الصورة"""
     width: int
     height: int
     channels: int
-    dpi: Tuple[int, int]
+    dpi: Tuple[int, int]  # الدقة الفعلية للصورة المحملة (بعد التحويل أو تصغير فك الترميز)
     format: str
     size_bytes: int
+    decode_scale: int = 1  # عامل تصغير فك الترميز عن دقة الملف الأصلية
+
+@dataclass
+class ImageHeader:
+    """معلومات ملف الصورة من رأسه قبل فك الترميز"""
+    width: int
+    height: int
+    format: str
+    dpi: int  # دقة الملف (أو الدقة الافتراضية إذا لم يحددها)
+    decode_scale: int = 1  # عامل تصغير فك الترميز
+    
+    @property
+    def decoded_size(self) -> Tuple[int, int]:
+        """أبعاد الصورة بعد فك الترميز المصغر (تقريب للأعلى كما في OpenCV)"""
+        return -(-self.width // self.decode_scale), -(-self.height // self.decode_scale)
+    
+    @property
+    def decoded_dpi(self) -> int:
+        return max(1, self.dpi // self.decode_scale)
+
+class ImagePyramid:
+    """هرم صور متعدد الدقة لتحليل واحد
+    
+    المستوى 0 هو الصورة نفسها وكل مستوى نصف أبعاد السابق. لا يُحسب المستوى إلا عند
+    أول طلب له ثم يُخزن، فتطلب كل مرحلة الدقة التي تحتاجها دون إعادة التصغير.
+    لا يُصغَّر أي مستوى تحت min_dimension (البعد الأطول)، ويُعاد أدق مستوى متاح بدلاً منه.
+    الخرائط المشتقة (الرمادية والحواف) لكل مستوى تُحسب وتُخزن بالطريقة نفسها.
+    """
+    
+    def __init__(self, base: np.ndarray, min_dimension: int = 512):
+        self.min_dimension = min_dimension
+        self._levels: Dict[int, np.ndarray] = {0: base}
+        self._maps: Dict[Tuple[str, int], np.ndarray] = {}
+        self._lock = threading.Lock()
+        
+        shortest, longest = sorted(base.shape[:2])
+        self.max_level = 0
+        while longest // 2 >= min_dimension and shortest // 2 >= 1:
+            shortest, longest = shortest // 2, longest // 2
+            self.max_level += 1
+    
+    def __getstate__(self):
+        # القفل لا يُنقل بين العمليات
+        with self._lock:
+            state = self.__dict__.copy()
+            state["_levels"] = dict(self._levels)
+            state["_maps"] = dict(self._maps)
+        del state["_lock"]
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+    
+    @property
+    def base(self) -> np.ndarray:
+        """الصورة بالدقة الكاملة"""
+        return self._levels[0]
+    
+    @property
+    def nbytes(self) -> int:
+        """حجم المستويات والخرائط المحسوبة حتى الآن"""
+        return (sum(level.nbytes for level in self._levels.values()) +
+                sum(derived.nbytes for derived in self._maps.values()))
+    
+    def level(self, index: int) -> np.ndarray:
+        """صورة المستوى المطلوب (تُحسب من المستوى الأدق السابق عند أول طلب)"""
+        index = min(max(index, 0), self.max_level)
+        with self._lock:
+            return self._level(index)
+    
+    def _level(self, index: int) -> np.ndarray:
+        for current in range(1, index + 1):
+            if current not in self._levels:
+                previous = self._levels[current - 1]
+                height, width = previous.shape[:2]
+                self._levels[current] = cv2.resize(previous, (width // 2, height // 2),
+                                                   interpolation=cv2.INTER_AREA)
+        return self._levels[index]
+    
+    def gray(self, index: int) -> np.ndarray:
+        """الصورة الرمادية للمستوى (الهرم بترتيب RGB)"""
+        index = min(max(index, 0), self.max_level)
+        with self._lock:
+            return self._gray(index)
+    
+    def _gray(self, index: int) -> np.ndarray:
+        image = self._level(index)
+        if len(image.shape) == 2:
+            return image
+        key = ("gray", index)
+        if key not in self._maps:
+            self._maps[key] = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        return self._maps[key]
+    
+    def edges(self, index: int) -> np.ndarray:
+        """خريطة حواف Canny للمستوى"""
+        index = min(max(index, 0), self.max_level)
+        with self._lock:
+            key = ("edges", index)
+            if key not in self._maps:
+                self._maps[key] = cv2.Canny(self._gray(index), 50, 150, apertureSize=3)
+            return self._maps[key]
+    
+    def share(self, directory: str):
+        """نقل المستويات والخرائط المحسوبة إلى ملفات مشتركة في المجلد
+        
+        بعد ذلك يُرسل الهرم إلى عمليات العمال بأسماء ملفاته فيفتحها كل عامل دون نسخ.
+        """
+        with self._lock:
+            for index, level in self._levels.items():
+                self._levels[index] = share_array(level, os.path.join(directory, f"level{index}.dat"))
+            for (kind, index), derived in self._maps.items():
+                self._maps[(kind, index)] = share_array(derived, os.path.join(directory, f"{kind}{index}.dat"))
+    
+    def scale(self, index: int) -> float:
+        """معامل تحويل إحداثيات المستوى إلى إحداثيات الصورة الكاملة"""
+        index = min(max(index, 0), self.max_level)
+        return self.base.shape[1] / (self.base.shape[1] // 2 ** index)
+    
+    def level_for_size(self, width: int, height: int) -> int:
+        """أخشن مستوى لا تقل أبعاده عن الأبعاد المطلوبة"""
+        base_height, base_width = self.base.shape[:2]
+        index = 0
+        while (index < self.max_level and
+               base_width // 2 ** (index + 1) >= width and base_height // 2 ** (index + 1) >= height):
+            index += 1
+        return index
+    
+    def level_for_max_dimension(self, max_dimension: int) -> int:
+        """أخشن مستوى لا يقل بعده الأطول عن البعد المطلوب"""
+        height, width = self.base.shape[:2]
+        ratio = min(max_dimension / max(height, width), 1.0)
+        return self.level_for_size(int(width * ratio), int(height * ratio))
 
 class ImageProcessor:
     """معالج الصور الرئيسي"""
     
     def __init__(self):
         self.max_dimensions = IMAGE_PROCESSING["max_dimensions"]
+        self.max_file_size = IMAGE_PROCESSING["max_file_size"]
+        self.max_pixels = IMAGE_PROCESSING["max_pixels"]
         self.target_dpi = IMAGE_PROCESSING["dpi"]
+        self.min_dpi = IMAGE_PROCESSING["min_dpi"]
+        self.stage_min_dpi = IMAGE_PROCESSING["stage_min_dpi"]
+        self.pyramid_config = IMAGE_PROCESSING["pyramid"]
+        self.tiling_config = IMAGE_PROCESSING["tiling"]
+        self.shapes_config = IMAGE_PROCESSING["shapes"]
+        self.color_prefilter_config = IMAGE_PROCESSING["color_prefilter"]
+        
+    def build_pyramid(self, image: np.ndarray) -> ImagePyramid:
+        """إنشاء هرم صور كسول للصورة (لا يُحسب أي مستوى قبل طلبه)"""
+        return ImagePyramid(image, self.pyramid_config["min_dimension"])
+    
+    def _resolve_pyramid_level(self, image: Union[np.ndarray, ImagePyramid],
+                               consumer: str) -> Tuple[np.ndarray, float]:
+        """صورة المستوى المخصص للمستهلك ومعامل تحويل إحداثياتها إلى الصورة الكاملة"""
+        if not isinstance(image, ImagePyramid):
+            return image, 1.0
+        level = self.pyramid_config["levels"].get(consumer, 0)
+        return image.level(level), image.scale(level)
+    
+    def get_page_count(self, image_path: str) -> int:
+        """عدد صفحات الملف (1 للصور العادية)"""
+        if not image_path.lower().endswith('.pdf'):
+            return 1
+        
+        try:
+            import fitz  # PyMuPDF
+            with fitz.open(image_path) as doc:
+                return doc.page_count
+        except ImportError:
+            from pdf2image import pdfinfo_from_path
+            return int(pdfinfo_from_path(image_path)["Pages"])
+    
+    def resolve_render_dpi(self, page_size: Tuple[float, float],
+                           consumers: Optional[List[str]] = None) -> int:
+        """اختيار دقة تحويل صفحة PDF من مقاسها الفعلي (بالنقاط) وحد الأبعاد واحتياجات المراحل
+        
+        تُحوَّل الصفحة بأعلى دقة تتسع في max_dimensions (بحد أقصى target_dpi)، إلا إذا احتاجت
+        إحدى المراحل المستهلكة (consumers، وافتراضياً جميع مراحل stage_min_dpi) دقة أعلى.
+        """
+        # مطابقة الاتجاه: البعد الأطول للصفحة مقابل البعد الأطول في الحد
+        long_in, short_in = sorted((max(side, 1.0) / 72 for side in page_size), reverse=True)
+        long_px, short_px = max(self.max_dimensions), min(self.max_dimensions)
+        budget_dpi = min(long_px / long_in, short_px / short_in)
+        
+        if consumers is None:
+            consumers = list(self.stage_min_dpi)
+        required_dpi = max((self.stage_min_dpi.get(name, self.min_dpi) for name in consumers),
+                           default=self.min_dpi)
+        
+        dpi = max(budget_dpi, required_dpi, self.min_dpi)
+        return int(min(dpi, self.target_dpi))
+    
+    def resolve_decode_scale(self, width: int, height: int, dpi: int,
+                             consumers: Optional[List[str]] = None) -> int:
+        """عامل تصغير فك ترميز الصورة (1 أو 2 أو 4 أو 8)
+        
+        يُضاعف العامل ما دامت الصورة أكبر من max_dimensions وبقيت الدقة بعد التصغير كافية
+        لأعلى دقة تحتاجها المراحل المستهلكة، كما في resolve_render_dpi لصفحات PDF.
+        """
+        long_side, short_side = max(width, height), min(width, height)
+        long_px, short_px = max(self.max_dimensions), min(self.max_dimensions)
+        
+        if consumers is None:
+            consumers = list(self.stage_min_dpi)
+        required_dpi = max((self.stage_min_dpi.get(name, self.min_dpi) for name in consumers),
+                           default=self.min_dpi)
+        
+        scale = 1
+        while (scale < max(REDUCED_DECODE_FLAGS)
+               and (long_side / scale > long_px or short_side / scale > short_px)
+               and dpi / (scale * 2) >= required_dpi):
+            scale *= 2
+        return scale
+    
+    def inspect_image(self, image_path: str, consumers: Optional[List[str]] = None,
+                      verify: bool = True) -> ImageHeader:
+        """فحص الصورة من رأس الملف فقط قبل فك ترميزها
+        
+        يُرفض (ValueError) الملف الأكبر من max_file_size أو الصورة التي تتجاوز max_pixels
+        أو التي لا يُقرأ رأسها أو يفشل تحققها (verify يتحقق من سلامة بنية الملف دون فك
+        ترميز البكسلات)، ويُحدد عامل تصغير فك الترميز للصور الأكبر من max_dimensions.
+        """
+        file_size = os.path.getsize(image_path)
+        if file_size > self.max_file_size:
+            raise ValueError(f"حجم الملف ({file_size / 2**20:.1f}MB) يتجاوز الحد المسموح "
+                             f"({self.max_file_size / 2**20:.0f}MB)")
         
-    def load_image(self, image_path: str) -> np.ndarray:
-        """تحميل الصورة"""
+        try:
+            with Image.open(image_path) as img:
+                width, height = img.size
+                image_format = img.format
+                file_dpi = img.info.get("dpi")
+                if verify:
+                    img.verify()
+        except Image.DecompressionBombError as e:
+            raise ValueError(f"أبعاد الصورة تتجاوز الحد المسموح: {str(e)}")
+        except Exception as e:
+            raise ValueError(f"ملف الصورة تالف أو غير مدعوم: {str(e)}")
+        
+        if width * height > self.max_pixels:
+            raise ValueError(f"أبعاد الصورة ({width}x{height}) تتجاوز الحد المسموح "
+                             f"({self.max_pixels / 1e6:.0f} ميجابكسل)")
+        
+        dpi = int(round(file_dpi[0])) if file_dpi and file_dpi[0] > 1 else self.target_dpi
+        return ImageHeader(
+            width=width,
+            height=height,
+            format=image_format,
+            dpi=dpi,
+            decode_scale=self.resolve_decode_scale(width, height, dpi, consumers)
+        )
+    
+    def get_render_dpi(self, image_path: str, page_number: int = 0,
+                       consumers: Optional[List[str]] = None) -> int:
+        """دقة تحويل صفحة PDF أو دقة الصورة العادية بعد فك ترميزها"""
+        return self.get_effective_resolution(image_path, page_number, consumers)[0]
+    
+    def get_effective_resolution(self, image_path: str, page_number: int = 0,
+                                 consumers: Optional[List[str]] = None) -> Tuple[int, int]:
+        """دقة الصورة المحملة وعامل تصغير فك ترميزها (صفحات PDF تُحوَّل بدقتها مباشرة)"""
+        if not image_path.lower().endswith('.pdf'):
+            try:
+                header = self.inspect_image(image_path, consumers, verify=False)
+                return header.decoded_dpi, header.decode_scale
+            except Exception as e:
+                logger.warning(f"تعذر قراءة رأس الصورة {image_path}: {str(e)}")
+                return self.target_dpi, 1
+        
+        try:
+            return self.resolve_render_dpi(self._get_pdf_page_size(image_path, page_number), consumers), 1
+        except Exception as e:
+            logger.warning(f"تعذر قراءة مقاس الصفحة {page_number + 1} من {image_path}: {str(e)}")
+            return self.target_dpi, 1
+    
+    def _get_pdf_page_size(self, pdf_path: str, page_number: int = 0) -> Tuple[float, float]:
+        """مقاس صفحة PDF بالنقاط (1/72 بوصة)"""
+        try:
+            import fitz  # PyMuPDF
+            with fitz.open(pdf_path) as doc:
+                rect = doc[page_number].rect
+            return rect.width, rect.height
+        except ImportError:
+            from pdf2image import pdfinfo_from_path
+            # pdfinfo يعطي مقاس الصفحة الأولى فقط، وهو تقريب مقبول لمستندات الرسومات
+            match = re.match(r"([\d.]+) x ([\d.]+)", pdfinfo_from_path(pdf_path)["Page size"])
+            return float(match.group(1)), float(match.group(2))
+    
+    def load_image(self, image_path: str, page_number: int = 0,
+                   consumers: Optional[List[str]] = None) -> np.ndarray:
+        """تحميل الصورة (أو صفحة محددة من ملف PDF)"""
         try:
             if image_path.lower().endswith('.pdf'):
                 # معالجة ملفات PDF
-                return self._load_pdf_as_image(image_path)
+                return self._load_pdf_as_image(image_path, page_number, consumers)
             else:
-                # تحميل الصور العادية
-                image = cv2.imread(image_path)
+                # تحميل الصور العادية بعد فحص رأسها، مصغرة مباشرة عند تجاوز max_dimensions
+                header = self.inspect_image(image_path, consumers)
+                if header.decode_scale > 1:
+                    logger.info(f"فك ترميز {image_path} ({header.width}x{header.height}) "
+                                f"بمقياس 1/{header.decode_scale}")
+                image = cv2.imread(image_path, REDUCED_DECODE_FLAGS[header.decode_scale])
                 if image is None:
                     raise ValueError(f"لا يمكن تحميل الصورة: {image_path}")
                 return image
@@ -48,38 +382,108 @@ class ImageProcessor:
             logger.error(f"خطأ في تحميل الصورة {image_path}: {str(e)}")
             raise
     
-    def _load_pdf_as_image(self, pdf_path: str) -> np.ndarray:
-        """تحويل PDF إلى صورة"""
+    def _load_pdf_as_image(self, pdf_path: str, page_number: int = 0,
+                           consumers: Optional[List[str]] = None) -> np.ndarray:
+        """تحويل صفحة من PDF إلى صورة"""
+        pages = self.iter_pdf_pages(pdf_path, page_number, page_number + 1, consumers)
+        try:
+            for _, image in pages:
+                return image
+        finally:
+            pages.close()
+        raise ValueError(f"الصفحة {page_number + 1} غير موجودة في ملف PDF")
+    
+    def iter_pdf_pages(self, pdf_path: str, first_page: int = 0, last_page: Optional[int] = None,
+                       consumers: Optional[List[str]] = None) -> Iterator[Tuple[int, np.ndarray]]:
+        """تحويل صفحات PDF إلى صور صفحةً بصفحة (رقم الصفحة، الصورة)
+        
+        لا تُحوَّل الصفحة التالية إلا عند طلبها، فتبقى الذاكرة في حدود صفحة واحدة
+        مهما بلغ طول المستند إذا حرر المستهلك كل صفحة قبل طلب التالية.
+        دقة كل صفحة تُختار حسب مقاسها (انظر resolve_render_dpi).
+        """
         try:
             import fitz  # PyMuPDF
-            doc = fitz.open(pdf_path)
-            page = doc[0]  # الصفحة الأولى
-            mat = fitz.Matrix(self.target_dpi/72, self.target_dpi/72)  # تحسين الدقة
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            doc.close()
-            
-            # تحويل إلى numpy array
-            pil_image = Image.open(io.BytesIO(img_data))
-            return np.array(pil_image)
         except ImportError:
             logger.warning("PyMuPDF غير متوفر، استخدام PIL بدلاً منه")
-            return self._load_pdf_with_pil(pdf_path)
+            yield from self._iter_pdf_pages_with_pil(pdf_path, first_page, last_page, consumers)
+            return
+        
+        with fitz.open(pdf_path) as doc:
+            last_page = doc.page_count if last_page is None else min(last_page, doc.page_count)
+            for page_number in range(first_page, last_page):
+                page = doc[page_number]
+                dpi = self.resolve_render_dpi((page.rect.width, page.rect.height), consumers)
+                logger.debug(f"تحويل الصفحة {page_number + 1} من {pdf_path} بدقة {dpi} DPI")
+                pix = page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), alpha=False)
+                image = self._pixmap_to_array(pix)
+                del pix
+                yield page_number, image
     
-    def _load_pdf_with_pil(self, pdf_path: str) -> np.ndarray:
-        """تحويل PDF باستخدام PIL"""
+    def _pixmap_to_array(self, pix) -> np.ndarray:
+        """تحويل صورة PyMuPDF إلى مصفوفة BGR (بترتيب cv2.imread نفسه) دون ترميز وسيط
+        
+        تُقرأ عينات الصورة مباشرة كمصفوفة عرض على ذاكرة MuPDF (مع مراعاة طول السطر)،
+        ثم ينسخها تحويل الألوان مرة واحدة إلى مصفوفة مستقلة لأن ذاكرة الصورة تُحرر معها.
+        """
+        samples = getattr(pix, "samples_mv", None)
+        if samples is None:
+            samples = pix.samples  # إصدارات PyMuPDF القديمة
+        
+        view = np.lib.stride_tricks.as_strided(
+            np.frombuffer(samples, dtype=np.uint8),
+            shape=(pix.height, pix.width, pix.n),
+            strides=(pix.stride, pix.n, 1),
+            writeable=False
+        )
+        
+        if pix.n == 1:
+            return cv2.cvtColor(view[:, :, 0], cv2.COLOR_GRAY2BGR)
+        if pix.n == 4:
+            return cv2.cvtColor(view, cv2.COLOR_RGBA2BGR)
+        return cv2.cvtColor(view, cv2.COLOR_RGB2BGR)
+    
+    def _iter_pdf_pages_with_pil(self, pdf_path: str, first_page: int = 0, last_page: Optional[int] = None,
+                                 consumers: Optional[List[str]] = None) -> Iterator[Tuple[int, np.ndarray]]:
+        """تحويل صفحات PDF باستخدام pdf2image صفحةً بصفحة"""
         try:
-            from pdf2image import convert_from_path
-            images = convert_from_path(pdf_path, dpi=self.target_dpi)
-            if images:
-                return np.array(images[0])
-            else:
-                raise ValueError("لا توجد صفحات في ملف PDF")
+            from pdf2image import convert_from_path, pdfinfo_from_path
         except ImportError:
             raise ImportError("pdf2image مطلوب لمعالجة ملفات PDF")
+        
+        page_count = int(pdfinfo_from_path(pdf_path)["Pages"])
+        last_page = page_count if last_page is None else min(last_page, page_count)
+        dpi = self.resolve_render_dpi(self._get_pdf_page_size(pdf_path), consumers)
+        
+        for page_number in range(first_page, last_page):
+            # تحويل صفحة واحدة في كل استدعاء (ترقيم pdf2image يبدأ من 1)
+            images = convert_from_path(pdf_path, dpi=dpi,
+                                       first_page=page_number + 1, last_page=page_number + 1)
+            if not images:
+                raise ValueError(f"تعذر تحويل الصفحة {page_number + 1} من ملف PDF")
+            yield page_number, cv2.cvtColor(np.asarray(images[0].convert("RGB")), cv2.COLOR_RGB2BGR)
     
-    def get_image_info(self, image: np.ndarray) -> ImageInfo:
-        """الحصول على معلومات الصورة"""
+    def estimate_decoded_size(self, image_path: str, page_number: int = 0) -> int:
+        """تقدير حجم الصورة بعد فك الترميز (بالبايت) من رأس الملف فقط"""
+        try:
+            if image_path.lower().endswith('.pdf'):
+                width, height = self._estimate_pdf_page_pixels(image_path, page_number)
+            else:
+                # PIL يقرأ الرأس فقط دون فك ترميز البيانات
+                width, height = self.inspect_image(image_path, verify=False).decoded_size
+            return width * height * 3
+        except Exception as e:
+            logger.warning(f"تعذر تقدير حجم الصورة {image_path}: {str(e)}")
+            width, height = self.max_dimensions
+            return width * height * 3
+    
+    def _estimate_pdf_page_pixels(self, pdf_path: str, page_number: int = 0) -> Tuple[int, int]:
+        """أبعاد الصفحة بالبكسل عند دقة التحويل"""
+        width, height = self._get_pdf_page_size(pdf_path, page_number)
+        scale = self.resolve_render_dpi((width, height)) / 72
+        return round(width * scale), round(height * scale)
+    
+    def get_image_info(self, image: np.ndarray, dpi: Optional[int] = None, decode_scale: int = 1) -> ImageInfo:
+        """الحصول على معلومات الصورة (dpi: الدقة الفعلية للصورة المحملة كما في get_effective_resolution)"""
         height, width = image.shape[:2]
         channels = image.shape[2] if len(image.shape) == 3 else 1
         
@@ -87,51 +491,119 @@ class ImageProcessor:
             width=width,
             height=height,
             channels=channels,
-            dpi=(self.target_dpi, self.target_dpi),
+            dpi=(dpi or self.target_dpi, dpi or self.target_dpi),
             format="RGB" if channels == 3 else "GRAYSCALE",
-            size_bytes=image.nbytes
+            size_bytes=image.nbytes,
+            decode_scale=decode_scale
         )
     
     def preprocess_image(self, image: np.ndarray) -> np.ndarray:
         """معالجة أولية للصورة"""
+        return self.preprocess_image_with_skew(image)[0]
+    
+    def preprocess_image_with_skew(self, image: np.ndarray) -> Tuple[np.ndarray, float]:
+        """معالجة أولية للصورة مع الميل المتبقي فيها
+        
+        يُقدر الميل مرة واحدة لكل تحليل؛ الميل المتبقي (0.0 بعد التصحيح، أو الميل الطفيف
+        الذي لم يستدع تصحيحاً) يُمرر إلى OCR بدلاً من تقديره مرة أخرى.
+        """
+        pyramid, skew_angle = self.preprocess_image_pyramid(image)
+        return pyramid.base, skew_angle
+    
+    def preprocess_image_pyramid(self, image: np.ndarray) -> Tuple[ImagePyramid, float]:
+        """معالجة أولية للصورة مع هرم الصورة المعالجة والميل المتبقي فيها
+        
+        يُبنى الهرم مرة واحدة ويُقدر الميل على مستواه المصغر، فتستخدم المراحل التالية
+        المستويات والخرائط التي حسبها تقدير الميل. إذا صُحح الميل يُبنى هرم الصورة المدورة.
+        """
+        skew_angle = 0.0
         try:
-            # تحويل إلى RGB إذا كان BGR
-            if len(image.shape) == 3 and image.shape[2] == 3:
-                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            
-            # تصحيح الإضاءة والتباين
-            image = self._enhance_image(image)
-            
-            # إزالة الضوضاء
-            image = self._denoise_image(image)
+            height, width = image.shape[:2]
+            if height * width >= self.tiling_config["min_pixels"]:
+                # اللوحات الكبيرة: بلاطات متوازية بناتج مطابق للمعالجة دفعة واحدة
+                image = self._enhance_and_denoise_tiled(image)
+            else:
+                image = self._enhance_and_denoise(image)
             
             # تصحيح الميل
-            image = self._correct_skew(image)
-            
-            return image
+            return self._correct_skew(self.build_pyramid(image))
             
         except Exception as e:
             logger.error(f"خطأ في المعالجة الأولية: {str(e)}")
-            return image
+            return self.build_pyramid(image), skew_angle
+    
+    def _enhance_and_denoise(self, image: np.ndarray, luminance_mean: Optional[int] = None) -> np.ndarray:
+        """المراحل المحلية من المعالجة الأولية (تُطبق على الصورة كاملة أو على بلاطة منها)"""
+        # تحويل إلى RGB إذا كان BGR
+        if len(image.shape) == 3 and image.shape[2] == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        
+        # تصحيح الإضاءة والتباين
+        image = self._enhance_image(image, luminance_mean)
+        
+        # إزالة الضوضاء
+        return self._denoise_image(image)
+    
+    def _enhance_and_denoise_tiled(self, image: np.ndarray) -> np.ndarray:
+        """المعالجة المحلية على بلاطات متوازية مع هامش تداخل
+        
+        التباين هو الخطوة الوحيدة غير المحلية (يعتمد على متوسط الإضاءة للصورة كلها)،
+        فيُحسب المتوسط مرة واحدة من مجاميع البلاطات ثم يُمرر لكل بلاطة.
+        """
+        height, width = image.shape[:2]
+        tile_size = self.tiling_config["tile_size"]
+        
+        # مجاميع القنوات لكل بلاطة (الصورة هنا بترتيب BGR قبل التحويل)
+        tile_sums = map_tiles(lambda tile: cv2.sumElems(image[tile.inner_region]),
+                              split_tiles(height, width, tile_size, 0))
+        channels = image.shape[2] if len(image.shape) == 3 else 1
+        luminance_mean = self._luminance_mean([sum(sums) for sums in zip(*tile_sums)], channels,
+                                              height * width, bgr=True)
+        
+        return process_tiled(
+            image, lambda region: self._enhance_and_denoise(region, luminance_mean),
+            tile_size, self.tiling_config["halo"]
+        )
     
-    def _enhance_image(self, image: np.ndarray) -> np.ndarray:
-        """تحسين جودة الصورة"""
-        # تحويل إلى PIL للتحسين
-        pil_image = Image.fromarray(image)
+    def _enhance_image(self, image: np.ndarray, luminance_mean: Optional[int] = None) -> np.ndarray:
+        """تحسين جودة الصورة (التباين والحدة والإضاءة بمعاملات ImageEnhance نفسها)
+        
+        التباين والإضاءة دالة نقطية واحدة تُطبق بجدول بحث في تمريرة واحدة، ثم تُطبق الحدة
+        بمرشح 3×3 واحد (الإضاءة خطية فلا يغير تقديمها على الحدة الناتج إلا بفروق الاقتطاع).
+        luminance_mean: متوسط الإضاءة الذي يُحسب حوله التباين (يُحسب من الصورة إذا لم يُمرر)
+        """
+        contrast, sharpness, brightness = 1.2, 1.1, 1.05
         
-        # تحسين التباين
-        enhancer = ImageEnhance.Contrast(pil_image)
-        pil_image = enhancer.enhance(1.2)
+        if luminance_mean is None:
+            height, width = image.shape[:2]
+            channels = image.shape[2] if len(image.shape) == 3 else 1
+            luminance_mean = self._luminance_mean(cv2.sumElems(image), channels, height * width)
         
-        # تحسين الحدة
-        enhancer = ImageEnhance.Sharpness(pil_image)
-        pil_image = enhancer.enhance(1.1)
+        # التباين ثم الإضاءة: b * (mean + c * (v - mean)) مع اقتطاع ناتج كل منهما كما في مزج PIL
+        contrasted = np.clip(np.floor(luminance_mean + contrast * (np.arange(256) - luminance_mean)), 0, 255)
+        values = np.clip(np.floor(brightness * contrasted), 0, 255)
+        adjusted = cv2.LUT(image, values.astype(np.uint8))
         
-        # تحسين الإضاءة
-        enhancer = ImageEnhance.Brightness(pil_image)
-        pil_image = enhancer.enhance(1.05)
+        # الحدة: s * الصورة + (1 - s) * تنعيم PIL (SMOOTH) في نواة واحدة
+        kernel = (1 - sharpness) * SMOOTH_KERNEL
+        kernel[1, 1] += sharpness
+        # إزاحة -0.49 تجعل التقريب اقتطاعاً كما في PIL دون خفض القيم الصحيحة (مثل الأبيض المشبع)
+        sharpened = cv2.filter2D(adjusted, -1, kernel, delta=-0.49)
         
-        return np.array(pil_image)
+        # PIL لا يرشّح الإطار الخارجي للصورة
+        sharpened[[0, -1], :] = adjusted[[0, -1], :]
+        sharpened[:, [0, -1]] = adjusted[:, [0, -1]]
+        return sharpened
+    
+    def _luminance_mean(self, channel_sums: Tuple[float, ...], channels: int,
+                        pixel_count: int, bgr: bool = False) -> int:
+        """متوسط الإضاءة (L) من مجاميع القنوات، مقرباً كما في ImageEnhance.Contrast"""
+        if channels == 1:
+            total = channel_sums[0]
+        else:
+            weights = LUMINANCE_WEIGHTS[::-1] if bgr else LUMINANCE_WEIGHTS
+            total = sum(weight * channel_sum for weight, channel_sum in zip(weights, channel_sums))
+        return int(total / pixel_count + 0.5)
     
     def _denoise_image(self, image: np.ndarray) -> np.ndarray:
         """إزالة الضوضاء"""
@@ -142,35 +614,31 @@ class ImageProcessor:
             # صورة رمادية
             return cv2.bilateralFilter(image, 9, 75, 75)
     
-    def _correct_skew(self, image: np.ndarray) -> np.ndarray:
-        """تصحيح ميل الصورة"""
+    def estimate_skew(self, image: Union[np.ndarray, ImagePyramid]) -> float:
+        """تقدير ميل الصورة على المستوى المصغر من هرمها (انظر estimate_skew_angle)"""
+        if not isinstance(image, ImagePyramid):
+            image = self.build_pyramid(image)
+        return estimate_skew_angle(None, edges=image.edges(self.pyramid_config["levels"]["skew"]))
+    
+    def _correct_skew(self, image: Union[np.ndarray, ImagePyramid],
+                      skew_angle: Optional[float] = None) -> Tuple[Union[np.ndarray, ImagePyramid], float]:
+        """تصحيح ميل الصورة أو هرمها، مع الميل المتبقي فيها بعد التصحيح
+        
+        يُعاد هرم إذا مُرر هرم: الهرم نفسه إذا لم يلزم التصحيح، وإلا هرم الصورة المدورة.
+        """
         try:
-            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if len(image.shape) == 3 else image
-            
-            # اكتشاف الحواف
-            edges = cv2.Canny(gray, 50, 150, apertureSize=3)
-            
-            # خطوط Hough
-            lines = cv2.HoughLines(edges, 1, np.pi/180, threshold=100)
+            if skew_angle is None:
+                skew_angle = self.estimate_skew(image)
             
-            if lines is not None:
-                angles = []
-                for line in lines:
-                    rho, theta = line[0]
-                    angle = theta * 180 / np.pi
-                    if -45 < angle < 45:
-                        angles.append(angle)
-                
-                if angles:
-                    median_angle = np.median(angles)
-                    if abs(median_angle) > 0.5:  # تصحيح فقط إذا كان الميل كبير
-                        return self._rotate_image(image, -median_angle)
-            
-            return image
+            if abs(skew_angle) > SKEW_CORRECTION_THRESHOLD:  # تصحيح فقط إذا كان الميل كبير
+                if isinstance(image, ImagePyramid):
+                    return self.build_pyramid(self._rotate_image(image.base, -skew_angle)), 0.0
+                return self._rotate_image(image, -skew_angle), 0.0
+            return image, skew_angle
             
         except Exception as e:
             logger.warning(f"خطأ في تصحيح الميل: {str(e)}")
-            return image
+            return image, 0.0
     
     def _rotate_image(self, image: np.ndarray, angle: float) -> np.ndarray:
         """دوران الصورة"""
@@ -216,21 +684,70 @@ class ImageProcessor:
         
         return layers
     
-    def detect_geometric_shapes(self, image: np.ndarray) -> List[Dict[str, Any]]:
-        """اكتشاف الأشكال الهندسية"""
+    def propose_color_regions(self, image: np.ndarray) -> np.ndarray:
+        """اقتراح مناطق الرموز الملونة (x, y, w, h) من أقنعة HSV دون حلقات على البكسلات
+        
+        يُجمع قناع كل النطاقات ثم يُوسع بالهامش فتندمج أجزاء الرمز الواحد والرموز المتلاصقة
+        في مكون واحد، وتُستبعد المكونات ذات البكسلات الملونة القليلة (ضوضاء أو خطوط رفيعة).
+        """
+        config = self.color_prefilter_config
+        if len(image.shape) != 3:
+            return np.zeros((0, 4), np.int32)
+        
+        hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
+        mask = np.zeros(image.shape[:2], np.uint8)
+        for ranges in config["hsv_ranges"].values():
+            for lower, upper in ranges:
+                mask |= cv2.inRange(hsv, lower, upper)
+        if not mask.any():
+            return np.zeros((0, 4), np.int32)
+        
+        padding = config["padding"]
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * padding + 1, 2 * padding + 1))
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(cv2.dilate(mask, kernel), connectivity=8)
+        
+        # عدد البكسلات الملونة الفعلية في كل مكون موسع
+        colored = np.bincount(labels[mask > 0], minlength=count)
+        keep = colored >= config["min_pixels"]
+        keep[0] = False  # الخلفية
+        return stats[keep, :4].astype(np.int32)
+    
+    def detect_geometric_shapes(self, image: Union[np.ndarray, ImagePyramid]) -> GeometricShapes:
+        """اكتشاف الأشكال الهندسية كمصفوفات (to_dicts() للصيغة السابقة)
+        
+        عند تمرير هرم صور يُكتشف على المستوى المخصص في الإعدادات، وتُعاد الإحداثيات
+        بمقياس الصورة الكاملة. قطع الخطوط المتجاورة على استقامة واحدة تُدمج في قطعة واحدة.
+        """
         try:
-            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if len(image.shape) == 3 else image
-            
-            # اكتشاف الحواف
-            edges = cv2.Canny(gray, 50, 150)
+            if isinstance(image, ImagePyramid):
+                # الخرائط الرمادية والحواف المشتقة من الهرم (قد تكون محسوبة مسبقاً ومشتركة)
+                level = self.pyramid_config["levels"].get("detect_geometric_shapes", 0)
+                gray, edges, scale = image.gray(level), image.edges(level), image.scale(level)
+            else:
+                gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if len(image.shape) == 3 else image
+                scale = 1.0
+                
+                # اكتشاف الحواف
+                edges = cv2.Canny(gray, 50, 150)
             
-            # اكتشاف الخطوط
-            lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=100, 
-                                  minLineLength=50, maxLineGap=10)
+            # اكتشاف الخطوط (الأطوال بالبكسل تُقاس بمقياس المستوى)
+            lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=max(int(100 / scale), 10),
+                                  minLineLength=50 / scale, maxLineGap=10 / scale)
+            segments = None
+            if lines is not None:
+                segments = merge_collinear_segments(
+                    lines.reshape(-1, 4) * scale,
+                    angle_tolerance=self.shapes_config["merge_angle_tolerance"],
+                    distance_tolerance=self.shapes_config["merge_distance_tolerance"],
+                    gap=self.shapes_config["merge_gap"]
+                )
             
             # اكتشاف الدوائر
-            circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, 1, 20,
-                                     param1=50, param2=30, minRadius=10, maxRadius=200)
+            circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, 1, 20 / scale,
+                                     param1=50, param2=30,
+                                     minRadius=max(int(10 / scale), 1), maxRadius=int(200 / scale))
+            if circles is not None:
+                circles = circles[0, :] * scale
             
             # اكتشاف المستطيلات
             contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -238,52 +755,28 @@ class ImageProcessor:
             for contour in contours:
                 approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
                 if len(approx) == 4:
-                    rectangles.append(approx)
+                    rectangles.append(approx.reshape(-1, 2) * scale)
             
-            shapes = []
-            
-            # إضافة الخطوط
-            if lines is not None:
-                for line in lines:
-                    x1, y1, x2, y2 = line[0]
-                    shapes.append({
-                        "type": "line",
-                        "coordinates": [(x1, y1), (x2, y2)],
-                        "length": np.sqrt((x2-x1)**2 + (y2-y1)**2)
-                    })
-            
-            # إضافة الدوائر
-            if circles is not None:
-                circles = np.round(circles[0, :]).astype("int")
-                for (x, y, r) in circles:
-                    shapes.append({
-                        "type": "circle",
-                        "center": (x, y),
-                        "radius": r
-                    })
-            
-            # إضافة المستطيلات
-            for rect in rectangles:
-                shapes.append({
-                    "type": "rectangle",
-                    "corners": rect.reshape(-1, 2).tolist()
-                })
-            
-            return shapes
+            return GeometricShapes.create(segments, circles, rectangles)
             
         except Exception as e:
             logger.error(f"خطأ في اكتشاف الأشكال: {str(e)}")
-            return []
+            return GeometricShapes.create()
     
-    def create_image_thumbnail(self, image: np.ndarray, max_size: Tuple[int, int] = (300, 300)) -> np.ndarray:
-        """إنشاء صورة مصغرة"""
-        height, width = image.shape[:2]
+    def create_image_thumbnail(self, image: Union[np.ndarray, ImagePyramid],
+                               max_size: Tuple[int, int] = (300, 300)) -> np.ndarray:
+        """إنشاء صورة مصغرة (من أقرب مستوى في هرم الصور إن وُجد)"""
+        base = image.base if isinstance(image, ImagePyramid) else image
+        height, width = base.shape[:2]
         
         # حساب النسب
         ratio = min(max_size[0]/width, max_size[1]/height)
         new_width = int(width * ratio)
         new_height = int(height * ratio)
         
+        if isinstance(image, ImagePyramid):
+            image = image.level(image.level_for_size(new_width, new_height))
+        
         # تغيير الحجم
         thumbnail = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
         
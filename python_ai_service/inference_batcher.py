@@ -0,0 +1,159 @@
+# تجميع طلبات الاستدلال المتزامنة في دفعات صغيرة
+# Dynamic Micro-batching for Model Inference
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from config import BATCH_CONFIG, PERFORMANCE_CONFIG
+from metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# علامة إيقاف خيط الاستدلال
+_STOP = object()
+
+
+def micro_batching_enabled() -> bool:
+    """هل التجميع مفعل في الإعدادات (auto: في وضع الخيوط فقط)
+
+    في وضع العمليات ينفذ كل عامل مهمة واحدة في كل مرة، فلا يجد التجميع طلبات متزامنة
+    داخل العملية الواحدة ويضيف نافذة الانتظار إلى كل استدعاء.
+    """
+    setting = str(BATCH_CONFIG["micro_batching"]["enabled"]).lower()
+    if setting == "auto":
+        return PERFORMANCE_CONFIG["executor_type"] == "thread"
+    return setting == "true"
+
+
+class _Request:
+    __slots__ = ("item", "caller", "future", "submitted")
+
+    def __init__(self, item: Any, caller: object):
+        self.item = item
+        self.caller = caller
+        self.future: Future = Future()
+        self.submitted = time.perf_counter()
+
+
+class MicroBatcher:
+    """طابور استدلال يجمع الصور من التحليلات المتزامنة في دفعة واحدة للنموذج
+
+    خيط واحد يملك النموذج: ينتظر أول طلب، ثم يجمع ما يصل خلال max_wait_ms حتى
+    max_batch_size، ويستدعي infer على الدفعة ويعيد لكل مستدعٍ نتيجته. الطلبات التي تصل
+    أثناء انشغال النموذج تتراكم فتخرج الدفعة التالية ممتلئة دون انتظار إضافي، ولا تُنتظر
+    النافذة إذا كان لكل مستدعٍ نشط طلب في الدفعة (تحليل واحد لا يدفع زمن النافذة).
+    infer تستقبل قائمة عناصر وتعيد قائمة نتائج بالترتيب نفسه، وخطؤها يصل إلى جميع مستدعي الدفعة.
+    """
+
+    def __init__(self, infer: Callable[[List[Any]], List[Any]], max_batch_size: Optional[int] = None,
+                 max_wait_ms: Optional[float] = None, name: str = "inference"):
+        config = BATCH_CONFIG["micro_batching"]
+        self.infer = infer
+        self.max_batch_size = max(1, max_batch_size or config["max_batch_size"])
+        self.max_wait = (config["max_wait_ms"] if max_wait_ms is None else max_wait_ms) / 1000
+        self.name = name
+
+        self.batches = 0
+        self.items = 0
+        self.busy_time = 0.0
+        self.latency = LatencyHistogram()
+        self.batch_sizes: Dict[int, int] = {}
+        self._stats_lock = threading.Lock()
+        self._active_callers = 0
+
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Any:
+        """استدلال عنصر واحد (ينتظر حتى تُعالج دفعته)"""
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items: List[Any]) -> List[Any]:
+        """استدلال عدة عناصر؛ قد تُوزع على أكثر من دفعة أو تشارك دفعة مع مستدعين آخرين"""
+        caller = object()
+        requests = [_Request(item, caller) for item in items]
+        with self._stats_lock:
+            self._active_callers += 1
+        try:
+            for request in requests:
+                self._queue.put(request)
+            return [request.future.result() for request in requests]
+        finally:
+            with self._stats_lock:
+                self._active_callers -= 1
+
+    def _collect(self, first: _Request) -> List[_Request]:
+        """جمع الدفعة: المتراكم في الطابور ثم ما يصل قبل انتهاء النافذة"""
+        batch = [first]
+        callers = {first.caller}
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if self._queue.empty() and len(callers) >= self._active_callers:
+                # كل مستدعٍ نشط ينتظر هذه الدفعة فلا طلبات أخرى متوقعة
+                break
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is _STOP:
+                # تُعالج الدفعة الحالية ثم يتوقف الخيط
+                self._queue.put(_STOP)
+                break
+            batch.append(request)
+            callers.add(request.caller)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+
+            start = time.perf_counter()
+            try:
+                results = self.infer([request.item for request in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"عدد النتائج ({len(results)}) لا يطابق حجم الدفعة ({len(batch)})")
+            except BaseException as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            for request, result in zip(batch, results):
+                request.future.set_result(result)
+
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.busy_time += finished - start
+                self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+                for request in batch:
+                    self.latency.observe(finished - request.submitted)
+
+    def get_status(self) -> Dict[str, Any]:
+        """الإنتاجية وزمن الانتظار حتى النتيجة وتوزيع أحجام الدفعات"""
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "throughput_per_second": round(self.items / self.busy_time, 2) if self.busy_time else 0.0,
+                "latency": self.latency.to_dict(),
+                "queued": self._queue.qsize()
+            }
+
+    def close(self):
+        """إيقاف خيط الاستدلال بعد الطلبات المنتظرة"""
+        self._queue.put(_STOP)
+        self._thread.join()
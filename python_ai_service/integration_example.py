@@ -4,7 +4,7 @@
 import requests
 import json
 import time
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable, Iterator
 
 class SafeEgyptAIClient:
     """عميل للتواصل مع خدمة تحليل الصور"""
@@ -63,9 +63,49 @@ class SafeEgyptAIClient:
         except Exception as e:
             return {"error": str(e)}
     
+    def stream_events(self, request_id: str, timeout: int = 300) -> Iterator[Dict[str, Any]]:
+        """استقبال أحداث التحليل لحظياً عبر Server-Sent Events"""
+        response = self.session.get(
+            f"{self.base_url}/analysis/{request_id}/events",
+            headers={'Accept': 'text/event-stream'},
+            stream=True,
+            timeout=(10, timeout)
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"خطأ في الطلب: {response.status_code}")
+        
+        event_name = "message"
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event_name = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    yield {"event": event_name, "data": json.loads(line[len("data:"):].strip())}
+                    event_name = "message"
+    
     def wait_for_completion(self, request_id: str, timeout: int = 300, 
-                           check_interval: int = 5) -> Dict[str, Any]:
-        """انتظار إكمال التحليل"""
+                           check_interval: int = 5,
+                           on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """انتظار إكمال التحليل
+        
+        يستخدم بث الأحداث إن كان متاحاً (مع تمرير كل حدث إلى on_event)، ويعود
+        إلى الاستعلام الدوري كل check_interval ثانية إذا تعذر الاتصال بالبث.
+        """
+        try:
+            for event in self.stream_events(request_id, timeout):
+                if on_event:
+                    on_event(event)
+                
+                if event["event"] == "completed":
+                    return self.get_analysis_result(request_id)
+                elif event["event"] == "failed":
+                    return {"error": "فشل التحليل", "details": event["data"]}
+                elif event["event"] == "cancelled":
+                    return {"error": "تم إلغاء التحليل", "details": event["data"]}
+        except Exception as e:
+            print(f"⚠️ تعذر استقبال الأحداث، التحول إلى الاستعلام الدوري: {e}")
+        
         start_time = time.time()
         
         while time.time() - start_time < timeout:
@@ -192,7 +232,12 @@ def example_usage():
     
     # انتظار الإكمال
     print("\n⏳ انتظار إكمال التحليل...")
-    result = client.wait_for_completion(request_id, timeout=300)
+    def show_progress(event: Dict[str, Any]):
+        if event["event"] == "stage_completed":
+            data = event["data"]
+            print(f"   ✔ {data['title']} ({data['progress']:.0f}%)")
+    
+    result = client.wait_for_completion(request_id, timeout=300, on_event=show_progress)
     
     if "error" in result:
         print(f"❌ خطأ في النتيجة: {result['error']}")
@@ -2,24 +2,238 @@
 # Main AI Image Analyzer
 
 import asyncio
+import contextlib
+import functools
 import logging
+import os
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
 from pathlib import Path
 import uuid
 
+import numpy as np
+
 from models import (
-    AnalysisResult, AnalysisStatus, AnalysisStep, ProjectInfo, DrawingData,
+    AnalysisResult, AnalysisStatus, ProjectInfo, DrawingData,
     DetectedElement, ExtractedText, ComplianceIssue, Recommendation,
-    BuildingType
+    BuildingType, BoundingBox, PageAnalysis
 )
-from image_processor import ImageProcessor, ImageInfo
+from image_processor import ImageProcessor, ImageInfo, ImagePyramid
 from object_detector import FireSafetyObjectDetector
 from ocr_extractor import OCRExtractor
 from compliance_checker import ComplianceChecker
+from geometry_engine import FloorPlan, GeometryEngine
+from worker_pool import WorkerPool, register_component, use_component
+from metrics import StageMetricsRegistry
+from buffer_manager import MemoryBudget
+from config import AI_MODELS, IMAGE_PROCESSING, PERFORMANCE_CONFIG, TRIAGE_CONFIG, BATCH_CONFIG, GEOMETRY_CONFIG
+from pipeline import PipelineRun, PipelineScheduler, ResourceClass, StageExecutionError, StageSpec
+from stage_cache import MISSING, StageCache, hash_file, hash_parts
+from shared_frames import FrameStore, share_array
+from duplicate_index import DuplicateIndex, perceptual_hash
 
 logger = logging.getLogger(__name__)
 
+# مخرجات المراحل التي تُرسل كنتائج جزئية مع أحداث اكتمال المراحل
+PARTIAL_RESULT_OUTPUTS = (
+    "triage_elements", "preliminary_result", "detected_elements",
+    "extracted_texts", "compliance_issues", "recommendations"
+)
+
+# المخرجات التي تُعاد من رسم سابق شبه مطابق بدلاً من إعادة حسابها
+NEAR_DUPLICATE_OUTPUTS = ("detected_elements", "extracted_texts")
+
+
+@functools.lru_cache(maxsize=256)
+def _hash_file_version(path: str, size: int, mtime_ns: int) -> str:
+    """تجزئة محتوى الملف لنسخة محددة منه (الحجم ووقت التعديل جزء من مفتاح الحفظ)"""
+    return hash_file(path)
+
+def _file_content_key(path: str) -> str:
+    """مفتاح محتوى الملف المرفوع دون إعادة قراءته إذا لم يتغير"""
+    stat = os.stat(path)
+    return _hash_file_version(path, stat.st_size, stat.st_mtime_ns)
+
+def _model_fingerprint(model_name: str) -> Any:
+    """بصمة ملف النموذج، فتنتهي صلاحية المخرجات المخزنة عند استبدال الأوزان"""
+    path = Path(model_name)
+    if path.exists():
+        stat = path.stat()
+        return [path.name, stat.st_size, stat.st_mtime_ns]
+    return model_name
+
+def _load_image_task(image_path: str, page_number: int, frame_dir: Optional[str]) -> Dict[str, Any]:
+    """تحميل الصورة أو صفحة من ملف PDF (تُنفذ داخل مجمع العمال)
+    
+    مع frame_dir تُكتب الصورة المحملة في ملف مشترك تفتحه المراحل التالية بالاسم.
+    """
+    with use_component("image_processor") as image_processor:
+        # التحقق من صحة الملف
+        if not image_processor.validate_image_format(image_path):
+            raise ValueError("تنسيق الملف غير مدعوم")
+        
+        # تحميل الصورة
+        image = image_processor.load_image(image_path, page_number)
+        
+        # الحصول على معلومات الصورة
+        image_info = image_processor.get_image_info(
+            image, *image_processor.get_effective_resolution(image_path, page_number))
+    
+    if frame_dir is not None:
+        image = share_array(image, os.path.join(frame_dir, "original.dat"))
+    
+    return {
+        "original_image": image,
+        "image_info": image_info
+    }
+
+def _scale_bounding_boxes(items: List[Any], scale: float,
+                          offset_x: float = 0.0, offset_y: float = 0.0) -> List[Any]:
+    """إعادة مربعات العناصر أو النصوص من مستوى مصغر أو مقطع إلى إحداثيات الصورة الكاملة"""
+    if scale != 1.0 or offset_x or offset_y:
+        for item in items:
+            box = item.bounding_box
+            item.bounding_box = BoundingBox(
+                x=box.x * scale + offset_x,
+                y=box.y * scale + offset_y,
+                width=box.width * scale,
+                height=box.height * scale
+            )
+    return items
+
+def _preprocess_image_task(original_image, frame_dir: Optional[str]) -> Dict[str, Any]:
+    """المعالجة الأولية للصورة وتجهيز هرمها متعدد الدقة (تُنفذ داخل مجمع العمال)"""
+    with use_component("image_processor") as image_processor:
+        # الهرم الذي قُدر عليه الميل هو نفسه هرم المراحل التالية
+        image_pyramid, skew_angle = image_processor.preprocess_image_pyramid(original_image)
+    if frame_dir is not None:
+        image_pyramid.share(frame_dir)
+    return {
+        "processed_image": image_pyramid.base,
+        "image_pyramid": image_pyramid,
+        "skew_angle": skew_angle
+    }
+
+def _detection_level(image_pyramid: ImagePyramid) -> int:
+    """أخشن مستوى في الهرم يكفي أبعاد إدخال نموذج الاكتشاف"""
+    return image_pyramid.level_for_max_dimension(AI_MODELS["object_detection"]["input_size"])
+
+def _derive_maps_task(image_pyramid: ImagePyramid, frame_dir: Optional[str]) -> ImagePyramid:
+    """حساب مستويات الهرم وخرائطه التي تستهلكها المراحل التالية مرة واحدة (تُنفذ داخل مجمع العمال)
+    
+    مع frame_dir تُنقل إلى ملفات مشتركة، فيفتحها عمال الاكتشاف وOCR بالاسم دون نسخها.
+    """
+    image_pyramid.level(_detection_level(image_pyramid))
+    image_pyramid.gray(IMAGE_PROCESSING["pyramid"]["levels"]["extract_texts"])
+    image_pyramid.edges(IMAGE_PROCESSING["pyramid"]["levels"]["detect_geometric_shapes"])
+    if frame_dir is not None:
+        image_pyramid.share(frame_dir)
+    return image_pyramid
+
+def _detection_inputs(image_pyramid: ImagePyramid) -> List[Tuple[np.ndarray, float, int, int]]:
+    """صور الاكتشاف لهرم واحد مع معامل وإزاحة تحويل كل منها إلى إحداثيات الصورة الكاملة
+    
+    افتراضياً صورة مستوى الاكتشاف كاملة. مع المرشح اللوني تُقترح مناطق الرموز الملونة على
+    هذا المستوى ثم تُقتطع من الدقة الكاملة، ولا يُستدعى النموذج إذا لم توجد أي منطقة.
+    """
+    level = _detection_level(image_pyramid)
+    image, scale = image_pyramid.level(level), image_pyramid.scale(level)
+    config = IMAGE_PROCESSING["color_prefilter"]
+    if not config["enabled"]:
+        return [(image, scale, 0, 0)]
+    
+    with use_component("image_processor") as image_processor:
+        regions = image_processor.propose_color_regions(image)
+    height, width = image.shape[:2]
+    if len(regions) == 0:
+        logger.info("لا توجد مناطق ملونة مرشحة، تم تخطي الاكتشاف")
+        return []
+    if (regions[:, 2] * regions[:, 3]).sum() > config["max_coverage"] * width * height:
+        return [(image, scale, 0, 0)]
+    
+    base = image_pyramid.base
+    logger.info(f"الاكتشاف على {len(regions)} منطقة ملونة مرشحة")
+    return [(base[y:y + h, x:x + w], 1.0, x, y)
+            for x, y, w, h in np.round(regions * scale).astype(int).tolist()]
+
+def _detect_in_pyramids(image_pyramids: List[ImagePyramid]) -> List[List[DetectedElement]]:
+    """اكتشاف العناصر في عدة أهرام بأقل عدد من استدعاءات النموذج، مع تصفيتها حسب الثقة"""
+    jobs = [(index, job) for index, pyramid in enumerate(image_pyramids)
+            for job in _detection_inputs(pyramid)]
+    results: List[List[DetectedElement]] = [[] for _ in image_pyramids]
+    if not jobs:
+        return results
+    
+    batch_size = max(1, BATCH_CONFIG["detection_batch_size"])
+    with use_component("object_detector") as object_detector:
+        for offset in range(0, len(jobs), batch_size):
+            chunk = jobs[offset:offset + batch_size]
+            if len(chunk) == 1:
+                batch_elements = [object_detector.detect_elements(chunk[0][1][0])]
+            else:
+                batch_elements = object_detector.detect_elements_batch([image for _, (image, *_) in chunk])
+            for (index, (_, scale, offset_x, offset_y)), elements in zip(chunk, batch_elements):
+                results[index].extend(_scale_bounding_boxes(
+                    object_detector.filter_elements_by_confidence(elements, 0.5), scale, offset_x, offset_y))
+    return results
+
+def _detect_elements_task(shared_pyramid: ImagePyramid) -> List[DetectedElement]:
+    """اكتشاف العناصر وتصفيتها حسب مستوى الثقة (تُنفذ داخل مجمع العمال)"""
+    filtered_elements = _detect_in_pyramids([shared_pyramid])[0]
+    logger.info(f"تم اكتشاف {len(filtered_elements)} عنصر")
+    return filtered_elements
+
+def _extract_texts_task(shared_pyramid: ImagePyramid, skew_angle: float) -> List[ExtractedText]:
+    """استخراج النصوص من الصورة الرمادية المشتقة (تُنفذ داخل مجمع العمال)
+    
+    الصورة مصححة الميل مسبقاً، فيُمرر ميلها المتبقي بدلاً من تقديره مرة أخرى.
+    """
+    level = IMAGE_PROCESSING["pyramid"]["levels"]["extract_texts"]
+    with use_component("ocr_extractor") as ocr_extractor:
+        extracted_texts = ocr_extractor.extract_text(shared_pyramid.gray(level), skew_angle=skew_angle)
+    
+    logger.info(f"تم استخراج {len(extracted_texts)} نص")
+    return _scale_bounding_boxes(extracted_texts, shared_pyramid.scale(level))
+
+def _extract_floor_plan_task(shared_pyramid: ImagePyramid) -> FloorPlan:
+    """استخراج الجدران ومضلعات الغرف من خطوط الرسم (تُنفذ داخل مجمع العمال)"""
+    with use_component("image_processor") as image_processor:
+        shapes = image_processor.detect_geometric_shapes(shared_pyramid)
+    return GeometryEngine().extract(shapes.segments)
+
+def _detect_elements_batch_task(image_pyramids: List[ImagePyramid]) -> List[List[DetectedElement]]:
+    """اكتشاف العناصر في عدة صور باستدعاء مجمّع للنموذج (تُنفذ داخل مجمع العمال)"""
+    return _detect_in_pyramids(image_pyramids)
+
+def _fingerprint_task(shared_pyramid: ImagePyramid) -> int:
+    """البصمة الإدراكية للصفحة من صورتها المصغرة (تُنفذ داخل مجمع العمال)"""
+    with use_component("image_processor") as image_processor:
+        thumbnail = image_processor.create_image_thumbnail(shared_pyramid)
+    return perceptual_hash(thumbnail)
+
+def _detect_elements_triage_task(original_image) -> List[DetectedElement]:
+    """اكتشاف سريع على صورة مصغرة دون معالجة أولية (تُنفذ داخل مجمع العمال)"""
+    height, width = original_image.shape[:2]
+    max_dimension = TRIAGE_CONFIG["max_dimension"]
+    
+    with use_component("image_processor") as image_processor:
+        if max(height, width) > max_dimension:
+            triage_image = image_processor.create_image_thumbnail(original_image, (max_dimension, max_dimension))
+        else:
+            triage_image = original_image
+    
+    with use_component("object_detector") as object_detector:
+        detected_elements = object_detector.detect_elements(triage_image)
+        filtered_elements = object_detector.filter_elements_by_confidence(
+            detected_elements, TRIAGE_CONFIG["confidence_threshold"]
+        )
+    
+    # إعادة المربعات إلى إحداثيات الصورة الأصلية ليعمل فحص الامتثال بالمقياس الصحيح
+    _scale_bounding_boxes(filtered_elements, width / triage_image.shape[1])
+    
+    logger.info(f"الفرز السريع: تم اكتشاف {len(filtered_elements)} عنصر")
+    return filtered_elements
+
 class MainImageAnalyzer:
     """المحلل الرئيسي للصور بالذكاء الاصطناعي"""
     
@@ -29,208 +243,758 @@ class MainImageAnalyzer:
         self.ocr_extractor = OCRExtractor()
         self.compliance_checker = ComplianceChecker()
         
+        # تسجيل المكونات الثقيلة لمجمع العمال (تُنشأ نسخ مستقلة في عمليات العمال)
+        register_component("image_processor", self.image_processor, factory=ImageProcessor)
+        # مع طابور الاستدلال المجمّع يستدعي خيطه وحده النموذج فلا يُقفل المكون
+        register_component("object_detector", self.object_detector,
+                           factory=FireSafetyObjectDetector,
+                           thread_safe=self.object_detector.batcher is not None)
+        register_component("ocr_extractor", self.ocr_extractor,
+                           factory=OCRExtractor, thread_safe=False)
+        
+        # مجمع العمال لتشغيل OpenCV وYOLO وOCR خارج حلقة الأحداث
+        self.worker_pool = WorkerPool()
+        
+        # ميزانية الذاكرة العامة لقبول التحليلات الجديدة
+        self.memory_budget = MemoryBudget()
+        
+        # الملفات المشتركة لصور كل تحليل بين عمليات العمال
+        self.frame_store = FrameStore()
+        
+        # مجدول المراحل ومخطط التحليل
+        self.stage_metrics = StageMetricsRegistry()
+        self.stage_cache = StageCache() if PERFORMANCE_CONFIG["cache_results"] else None
+        self.scheduler = PipelineScheduler(self.worker_pool, metrics=self.stage_metrics,
+                                           cache=self.stage_cache)
+        # بصمات الصفحات المحللة لإعادة استخدام مخرجات الرسومات شبه المكررة من الذاكرة المؤقتة
+        self.duplicate_index = (DuplicateIndex(ttl=self.stage_cache.ttl)
+                                if self.stage_cache is not None and PERFORMANCE_CONFIG["near_duplicates"]["enabled"]
+                                else None)
+        self.stages = self._create_analysis_stages()
+        
         # إحصائيات التحليل
         self.analysis_stats = {
             "total_analyses": 0,
             "successful_analyses": 0,
             "failed_analyses": 0,
+            "cancelled_analyses": 0,
             "average_processing_time": 0.0
         }
     
     async def analyze_image(self, image_path: str, building_type: BuildingType, 
-                           project_info: Optional[ProjectInfo] = None) -> AnalysisResult:
-        """تحليل الصورة الرئيسي"""
+                           project_info: Optional[ProjectInfo] = None,
+                           analysis_options: Optional[Dict[str, Any]] = None,
+                           on_preliminary: Optional[Callable[[AnalysisResult], Awaitable[None]]] = None,
+                           on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> AnalysisResult:
+        """تحليل الصورة الرئيسي
+        
+        في وضع الفرز السريع (analysis_options["mode"] == "triage") تُنتج أولاً نتيجة
+        أولية من اكتشاف على صورة مصغرة دون استخراج النصوص وتُسلَّم إلى on_preliminary،
+        ثم يكمل التحليل الكامل مستخدماً الصورة المحملة نفسها.
+        
+        ملفات PDF متعددة الصفحات تُحلل جميع صفحاتها بالتوازي عبر مجمع العمال وتُجمع
+        في نتيجة واحدة للمبنى مع ملخص لكل صفحة.
+        
+        on_event تستقبل أحداث بدء المراحل واكتمالها مع النتائج الجزئية بصيغة قابلة للتسلسل.
+        """
         analysis_id = str(uuid.uuid4())
         start_time = datetime.now()
+        analysis_options = analysis_options or {}
         
         logger.info(f"بدء تحليل الصورة: {image_path}")
         
         try:
-            # إنشاء خطوات التحليل
-            steps = self._create_analysis_steps(analysis_id)
-            
-            # الخطوة 1: تحميل ومعالجة الصورة
-            await self._execute_step(steps[0], self._load_and_process_image, image_path)
-            
-            # الخطوة 2: اكتشاف العناصر
-            await self._execute_step(steps[1], self._detect_elements, steps[0].result)
-            
-            # الخطوة 3: استخراج النصوص
-            await self._execute_step(steps[2], self._extract_texts, steps[0].result)
-            
-            # الخطوة 4: فحص الامتثال
-            await self._execute_step(steps[3], self._check_compliance, 
-                                   steps[1].result, steps[2].result, steps[0].result["image_info"])
+            # قراءة الملف تتم خارج حلقة الأحداث حتى لا يحجب ملف PDF كبير بقية الطلبات
+            loop = asyncio.get_running_loop()
+            page_count = await loop.run_in_executor(None, self.image_processor.get_page_count, image_path)
             
-            # الخطوة 5: إنشاء التوصيات
-            await self._execute_step(steps[4], self._generate_recommendations, 
-                                   steps[3].result, steps[1].result)
+            if page_count <= 1:
+                result = await self._analyze_page(image_path, building_type, 0, analysis_id,
+                                                  analysis_options, on_preliminary, on_event, page_count=1)
+            else:
+                logger.info(f"تحليل {page_count} صفحة من الملف: {image_path}")
+                
+                page_runs = await self._analyze_pages(image_path, building_type, page_count, analysis_id,
+                                                      analysis_options, on_preliminary, on_event)
+                
+                pages = []
+                for page_number, page_run in enumerate(page_runs):
+                    if isinstance(page_run, Exception):
+                        logger.error(f"خطأ في تحليل الصفحة {page_number + 1} من {image_path}: {str(page_run)}")
+                        page_result = self._create_error_result(analysis_id, image_path, str(page_run))
+                        if isinstance(page_run, StageExecutionError):
+                            page_result.analysis_steps = page_run.steps
+                        pages.append((page_number, page_result, False))
+                    else:
+                        pages.append((page_number, page_run, True))
+                
+                if not any(succeeded for _, _, succeeded in pages):
+                    raise page_runs[0]
+                
+                result = await self._aggregate_page_results(analysis_id, image_path, building_type, pages)
             
-            # الخطوة 6: إنشاء التقرير النهائي
-            await self._execute_step(steps[5], self._create_final_report, 
-                                   steps[0].result, steps[1].result, steps[2].result, 
-                                   steps[3].result, steps[4].result, analysis_id, image_path, building_type)
+            result.processing_time = (datetime.now() - start_time).total_seconds()
             
             # تحديث الإحصائيات
             self._update_analysis_stats(start_time, True)
             
-            return steps[5].result
+            return result
+            
+        except asyncio.CancelledError:
+            logger.info(f"تم إلغاء تحليل الصورة: {image_path}")
+            self.analysis_stats["cancelled_analyses"] += 1
+            raise
             
         except Exception as e:
             logger.error(f"خطأ في تحليل الصورة {image_path}: {str(e)}")
             self._update_analysis_stats(start_time, False)
             
             # إنشاء نتيجة خطأ
-            return self._create_error_result(analysis_id, image_path, str(e))
-    
-    def _create_analysis_steps(self, analysis_id: str) -> List[AnalysisStep]:
-        """إنشاء خطوات التحليل"""
-        steps = [
-            AnalysisStep(
-                step_id=f"{analysis_id}-step-1",
-                name="تحميل ومعالجة الصورة",
-                description="تحميل الصورة ومعالجتها للتحليل",
-                status=AnalysisStatus.PENDING,
-                progress=0.0
-            ),
-            AnalysisStep(
-                step_id=f"{analysis_id}-step-2", 
-                name="اكتشاف العناصر",
-                description="اكتشاف عناصر السلامة من الحريق في الصورة",
-                status=AnalysisStatus.PENDING,
-                progress=0.0
-            ),
-            AnalysisStep(
-                step_id=f"{analysis_id}-step-3",
-                name="استخراج النصوص",
-                description="استخراج النصوص والمعلومات من الصورة",
-                status=AnalysisStatus.PENDING,
-                progress=0.0
-            ),
-            AnalysisStep(
-                step_id=f"{analysis_id}-step-4",
-                name="فحص الامتثال",
-                description="فحص الامتثال للكود المصري للحريق",
-                status=AnalysisStatus.PENDING,
-                progress=0.0
-            ),
-            AnalysisStep(
-                step_id=f"{analysis_id}-step-5",
-                name="إنشاء التوصيات",
-                description="إنشاء توصيات للتحسين",
-                status=AnalysisStatus.PENDING,
-                progress=0.0
-            ),
-            AnalysisStep(
-                step_id=f"{analysis_id}-step-6",
-                name="إنشاء التقرير النهائي",
-                description="إنشاء التقرير النهائي للتحليل",
-                status=AnalysisStatus.PENDING,
-                progress=0.0
-            )
-        ]
-        
-        return steps
+            result = self._create_error_result(analysis_id, image_path, str(e))
+            result.processing_time = (datetime.now() - start_time).total_seconds()
+            if isinstance(e, StageExecutionError):
+                result.analysis_steps = e.steps
+            return result
     
-    async def _execute_step(self, step: AnalysisStep, func, *args, **kwargs):
-        """تنفيذ خطوة التحليل"""
-        step.status = AnalysisStatus.PROCESSING
-        step.start_time = datetime.now()
-        step.progress = 0.0
+    async def _analyze_pages(self, image_path: str, building_type: BuildingType, page_count: int,
+                             analysis_id: str, analysis_options: Dict[str, Any],
+                             on_preliminary: Optional[Callable[[AnalysisResult], Awaitable[None]]] = None,
+                             on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Any]:
+        """تحويل صفحات PDF تباعاً وتحليل كل صفحة فور وصولها
+        
+        لا تُحوَّل الصفحة التالية إلا بعد حجز ذاكرتها من الميزانية، فيبقى عدد الصفحات
+        المحملة محدوداً بالميزانية لا بطول المستند. تعيد لكل صفحة نتيجتها أو الاستثناء.
+        """
+        loop = asyncio.get_running_loop()
+        page_runs: List[Any] = []
+        pages = self.image_processor.iter_pdf_pages(image_path)
         
         try:
-            # تنفيذ الخطوة
-            result = await func(*args, **kwargs)
-            
-            step.status = AnalysisStatus.COMPLETED
-            step.end_time = datetime.now()
-            step.duration = (step.end_time - step.start_time).total_seconds()
-            step.progress = 100.0
-            step.result = result
-            
-            logger.info(f"تم إكمال الخطوة: {step.name}")
+            for page_number in range(page_count):
+                memory = await loop.run_in_executor(None, self._estimate_analysis_memory, image_path, page_number)
+                dpi = await loop.run_in_executor(None, self.image_processor.get_render_dpi, image_path, page_number)
+                reserved = await self.memory_budget.acquire(memory)
+                try:
+                    page = await loop.run_in_executor(None, next, pages, None)
+                except Exception as e:
+                    await self.memory_budget.release(reserved)
+                    # الصفحة التالفة لا توقف بقية المستند: المتابعة بمولد جديد بعدها
+                    logger.error(f"خطأ في تحويل الصفحة {page_number + 1} من {image_path}: {str(e)}")
+                    page_runs.append(e)
+                    pages = self.image_processor.iter_pdf_pages(image_path, page_number + 1)
+                    continue
+                except BaseException:
+                    await self.memory_budget.release(reserved)
+                    raise
+                
+                if page is None:
+                    await self.memory_budget.release(reserved)
+                    break
+                
+                _, image = page
+                image_info = self.image_processor.get_image_info(image, dpi)
+                
+                # النتيجة الأولية في وضع الفرز السريع تخص الصفحة الأولى
+                task = asyncio.create_task(self._analyze_page(
+                    image_path, building_type, page_number, f"{analysis_id}-p{page_number + 1}",
+                    analysis_options if page_number == 0 else {},
+                    on_preliminary if page_number == 0 else None, on_event, page_count,
+                    inputs={"original_image": image, "image_info": image_info}, memory_reserved=True
+                ))
+                # صورة الصفحة ملك تحليلها وحده فتُحرر بعد آخر مرحلة تستهلكها
+                del page, image
+                self.memory_budget.release_when_done(task, reserved)
+                page_runs.append(task)
+        except BaseException:
+            tasks = [run for run in page_runs if isinstance(run, asyncio.Task)]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            try:
+                pages.close()
+            except ValueError:
+                # التحويل ما زال جارياً في خيط المنفذ بعد الإلغاء، فيُغلق المستند عند انتهائه
+                pass
+        
+        tasks = [run for run in page_runs if isinstance(run, asyncio.Task)]
+        results = iter(await asyncio.gather(*tasks, return_exceptions=True))
+        return [next(results) if isinstance(run, asyncio.Task) else run for run in page_runs]
+    
+    async def _analyze_page(self, image_path: str, building_type: BuildingType, page_number: int,
+                            analysis_id: str, analysis_options: Dict[str, Any],
+                            on_preliminary: Optional[Callable[[AnalysisResult], Awaitable[None]]] = None,
+                            on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+                            page_count: int = 1,
+                            inputs: Optional[Dict[str, Any]] = None,
+                            memory_reserved: bool = False) -> AnalysisResult:
+        """تحليل صفحة واحدة (أو صورة) عبر مخطط المراحل
+        
+        inputs مخرجات جاهزة (مثل صورة الصفحة المحولة مسبقاً) ينقلها التحليل إلى المخطط
+        ويفرغها، وmemory_reserved تعني أن المستدعي حجز ذاكرة الصفحة ويتولى تحريرها.
+        """
+        start_time = datetime.now()
+        
+        if memory_reserved:
+            reservation = contextlib.nullcontext()
+        else:
+            # حجز الذاكرة المتوقعة قبل بدء التحليل (ينتظر إذا تجاوزت الميزانية)
+            loop = asyncio.get_running_loop()
+            memory = await loop.run_in_executor(None, self._estimate_analysis_memory, image_path, page_number)
+            reservation = self.memory_budget.reserve(memory)
+        
+        async with reservation, self.frame_store.scope(analysis_id) as frame_dir:
+            inputs = inputs if inputs is not None else {}
+            inputs.update(page_number=page_number, frame_dir=frame_dir)
+            steps = []
             
-        except Exception as e:
-            step.status = AnalysisStatus.FAILED
-            step.end_time = datetime.now()
-            step.duration = (step.end_time - step.start_time).total_seconds()
-            step.errors.append(str(e))
+            if analysis_options.get("mode") == "triage":
+                triage_run = await self.run_stages(
+                    image_path, building_type,
+                    ["preliminary_result", "original_image", "image_info"], analysis_id, dict(inputs),
+                    on_event=self._partial_results_listener(on_event, "triage", page_number)
+                )
+                preliminary = triage_run.outputs["preliminary_result"]
+                preliminary.analysis_steps = triage_run.steps
+                preliminary.processing_time = (datetime.now() - start_time).total_seconds()
+                if on_preliminary is not None:
+                    await on_preliminary(preliminary)
+                
+                # الصورة المحملة تُنقل للتحليل الكامل فلا تُحمّل مرة ثانية ولا تبقى بعد آخر مستهلك لها
+                inputs.update({name: triage_run.outputs.pop(name) for name in ("original_image", "image_info")})
+                steps = triage_run.steps
+                del triage_run
             
-            logger.error(f"فشل في الخطوة {step.name}: {str(e)}")
-            raise
+            run = await self.run_stages(image_path, building_type, ["analysis_result"],
+                                        analysis_id, inputs,
+                                        on_event=self._partial_results_listener(on_event, "full", page_number, page_count))
+        
+        result = run.outputs["analysis_result"]
+        result.analysis_steps = steps + run.steps
+        result.processing_time = (datetime.now() - start_time).total_seconds()
+        return result
     
-    async def _load_and_process_image(self, image_path: str) -> Dict[str, Any]:
-        """تحميل ومعالجة الصورة"""
-        try:
-            # التحقق من صحة الملف
-            if not self.image_processor.validate_image_format(image_path):
-                raise ValueError("تنسيق الملف غير مدعوم")
+    async def _aggregate_page_results(self, analysis_id: str, image_path: str, building_type: BuildingType,
+                                      pages: List[tuple]) -> AnalysisResult:
+        """تجميع نتائج الصفحات في نتيجة واحدة للمبنى مع ملخص لكل صفحة
+        
+        pages قائمة من (رقم الصفحة، النتيجة، نجاح التحليل) مرتبة حسب رقم الصفحة.
+        """
+        file_path = Path(image_path)
+        detected_elements: List[DetectedElement] = []
+        extracted_texts: List[ExtractedText] = []
+        compliance_issues: List[ComplianceIssue] = []
+        analysis_steps = []
+        page_summaries = []
+        scores = []
+        
+        for page_number, page_result, succeeded in pages:
+            label = page_number + 1
+            analysis_steps.extend(page_result.analysis_steps)
             
-            # تحميل الصورة
-            image = self.image_processor.load_image(image_path)
+            if not succeeded:
+                page_summaries.append(PageAnalysis(
+                    page_number=label,
+                    status=AnalysisStatus.FAILED,
+                    processing_time=page_result.processing_time,
+                    error=page_result.overall_status_message
+                ))
+                continue
             
-            # الحصول على معلومات الصورة
-            image_info = self.image_processor.get_image_info(image)
+            # ربط كل عنصر ومشكلة بالصفحة التي جاء منها
+            for element in page_result.detected_elements:
+                element.properties["page"] = label
+            for issue in page_result.compliance_issues:
+                issue.evidence.append(f"الصفحة {label}")
             
-            # معالجة الصورة
-            processed_image = self.image_processor.preprocess_image(image)
+            detected_elements.extend(page_result.detected_elements)
+            extracted_texts.extend(page_result.extracted_texts)
+            compliance_issues.extend(page_result.compliance_issues)
+            scores.append(page_result.compliance_score)
             
-            return {
-                "original_image": image,
-                "processed_image": processed_image,
-                "image_info": image_info,
-                "file_path": image_path
-            }
+            page_summaries.append(PageAnalysis(
+                page_number=label,
+                status=AnalysisStatus.COMPLETED,
+                compliance_score=page_result.compliance_score,
+                overall_status=page_result.overall_status,
+                total_elements=len(page_result.detected_elements),
+                total_texts=len(page_result.extracted_texts),
+                total_issues=len(page_result.compliance_issues),
+                processing_time=page_result.processing_time
+            ))
+        
+        # كل صفحة لوحة مستقلة، فدرجة المبنى متوسط درجات الصفحات
+        compliance_score = round(sum(scores) / len(scores), 1)
+        overall_status, status_message = self._determine_overall_status(compliance_issues, compliance_score)
+        
+        structured_data = self.ocr_extractor.extract_structured_data(extracted_texts)
+        recommendations = await self._generate_recommendations(compliance_issues, detected_elements)
+        
+        summary = self._create_summary(detected_elements, extracted_texts, compliance_issues)
+        summary.update({
+            "total_pages": len(pages),
+            "analyzed_pages": len(scores),
+            "failed_pages": len(pages) - len(scores)
+        })
+        
+        return AnalysisResult(
+            id=analysis_id,
+            file_name=file_path.name,
+            file_size=file_path.stat().st_size,
+            file_type=file_path.suffix,
+            processing_time=0.0,
+            project_info=self._create_project_info(structured_data, building_type),
+            drawing_data=self._create_drawing_data(structured_data, file_path),
+            detected_elements=detected_elements,
+            extracted_texts=extracted_texts,
+            compliance_issues=compliance_issues,
+            compliance_score=compliance_score,
+            recommendations=recommendations,
+            analysis_steps=analysis_steps,
+            summary=summary,
+            page_count=len(pages),
+            pages=page_summaries,
+            overall_status=overall_status,
+            overall_status_message=status_message
+        )
+    
+    async def analyze_batch(self, image_paths: List[str], building_type: BuildingType,
+                            project_info: Optional[ProjectInfo] = None,
+                            on_result: Optional[Callable[[int, AnalysisResult, bool], Awaitable[None]]] = None) -> List[AnalysisResult]:
+        """تحليل مجموعة صور لمشروع واحد مع اكتشاف مجمّع عبر الصور
+        
+        تُقسم الصفحات (صفحة واحدة لكل صورة وجميع صفحات ملفات PDF) إلى مجموعات بحجم
+        detection_batch_size: تُحمّل صفحات المجموعة وتُعالج بالتوازي، ثم يُشغّل YOLO
+        مرة واحدة على المجموعة كلها، ثم تكمل كل صفحة بقية المراحل. on_result تُستدعى
+        لكل ملف فور اكتمال جميع صفحاته مع ترتيبه ونجاح تحليله.
+        """
+        # تحميل النماذج في جميع العمال مرة واحدة لتبقى جاهزة طوال الدفعة
+        await self.worker_pool.warm_up(["object_detector", "ocr_extractor"])
+        
+        loop = asyncio.get_running_loop()
+        page_counts = []
+        for path in image_paths:
+            try:
+                page_counts.append(max(1, await loop.run_in_executor(None, self.image_processor.get_page_count, path)))
+            except Exception as e:
+                # الملف التالف يُحلل كصفحة واحدة ليظهر خطؤه في نتيجته
+                logger.warning(f"تعذر قراءة عدد صفحات {path}: {str(e)}")
+                page_counts.append(1)
+        
+        items = [(file_index, page_number)
+                 for file_index, page_count in enumerate(page_counts)
+                 for page_number in range(page_count)]
+        
+        batch_size = max(1, BATCH_CONFIG["detection_batch_size"])
+        results: List[Optional[AnalysisResult]] = [None] * len(image_paths)
+        completed_pages: Dict[int, List[tuple]] = {}
+        start_times: Dict[int, datetime] = {}
+        
+        for offset in range(0, len(items), batch_size):
+            chunk = items[offset:offset + batch_size]
+            for file_index, _ in chunk:
+                start_times.setdefault(file_index, datetime.now())
+            chunk_results, failed = await self._analyze_chunk(
+                [(image_paths[file_index], page_number) for file_index, page_number in chunk], building_type
+            )
             
-        except Exception as e:
-            logger.error(f"خطأ في تحميل ومعالجة الصورة: {str(e)}")
-            raise
+            for index, ((file_index, page_number), page_result) in enumerate(zip(chunk, chunk_results)):
+                file_pages = completed_pages.setdefault(file_index, [])
+                file_pages.append((page_number, page_result, index not in failed))
+                if len(file_pages) < page_counts[file_index]:
+                    continue
+                
+                # اكتملت جميع صفحات الملف
+                del completed_pages[file_index]
+                succeeded = any(page_succeeded for _, _, page_succeeded in file_pages)
+                if len(file_pages) == 1 or not succeeded:
+                    result = file_pages[0][1]
+                else:
+                    result = await self._aggregate_page_results(
+                        str(uuid.uuid4()), image_paths[file_index], building_type, file_pages
+                    )
+                
+                start_time = start_times.pop(file_index)
+                result.processing_time = (datetime.now() - start_time).total_seconds()
+                self._update_analysis_stats(start_time, succeeded)
+                results[file_index] = result
+                if on_result is not None:
+                    await on_result(file_index, result, succeeded)
+        
+        return results
     
-    async def _detect_elements(self, image_data: Dict[str, Any]) -> List[DetectedElement]:
-        """اكتشاف العناصر في الصورة"""
-        try:
-            processed_image = image_data["processed_image"]
+    async def _analyze_chunk(self, pages: List[tuple],
+                             building_type: BuildingType) -> tuple[List[AnalysisResult], set]:
+        """تحليل مجموعة صفحات (مسار، رقم صفحة) تشترك في استدعاء اكتشاف واحد، مع مواقع الصفحات التي فشل تحليلها"""
+        start_time = datetime.now()
+        analysis_ids = [str(uuid.uuid4()) for _ in pages]
+        results: List[Optional[AnalysisResult]] = [None] * len(pages)
+        failed = set()
+        
+        def fail(index: int, error: BaseException, steps: List = None):
+            failed.add(index)
+            logger.error(f"خطأ في تحليل الصورة {pages[index][0]}: {str(error)}")
+            result = self._create_error_result(analysis_ids[index], pages[index][0], str(error))
+            if isinstance(error, StageExecutionError):
+                result.analysis_steps = (steps or []) + error.steps
+            results[index] = result
+        
+        loop = asyncio.get_running_loop()
+        memory = sum(await asyncio.gather(*(
+            loop.run_in_executor(None, self._estimate_analysis_memory, path, page_number)
+            for path, page_number in pages
+        )))
+        async with self.memory_budget.reserve(memory), contextlib.AsyncExitStack() as frames:
+            frame_dirs = [await frames.enter_async_context(self.frame_store.scope(analysis_id))
+                          for analysis_id in analysis_ids]
             
-            # اكتشاف العناصر
-            detected_elements = self.object_detector.detect_elements(processed_image)
+            # تحميل ومعالجة جميع صفحات المجموعة بالتوازي
+            prepared = await asyncio.gather(*(
+                self.run_stages(path, building_type, ["shared_pyramid", "skew_angle", "image_info"],
+                                analysis_id, inputs={"page_number": page_number, "frame_dir": frame_dir})
+                for (path, page_number), analysis_id, frame_dir in zip(pages, analysis_ids, frame_dirs)
+            ), return_exceptions=True)
+            ready = []
+            for index, run in enumerate(prepared):
+                if isinstance(run, Exception):
+                    fail(index, run)
+                else:
+                    ready.append(index)
             
-            # تصفية العناصر حسب مستوى الثقة
-            filtered_elements = self.object_detector.filter_elements_by_confidence(
-                detected_elements, 0.5
-            )
+            # استدعاء واحد للنموذج لجميع الصور الجاهزة
+            detections: Dict[int, List[DetectedElement]] = {}
+            detection_steps = []
+            if ready:
+                try:
+                    detection_run = await self.scheduler.run(
+                        [self._create_batch_detection_stage()],
+                        {"image_pyramids": [prepared[i].outputs["shared_pyramid"] for i in ready]},
+                        ["batch_detected_elements"],
+                        run_id=f"batch-{analysis_ids[ready[0]]}"
+                    )
+                    detections = dict(zip(ready, detection_run.outputs["batch_detected_elements"]))
+                    detection_steps = detection_run.steps
+                except StageExecutionError as e:
+                    for index in ready:
+                        fail(index, e, prepared[index].steps)
+                    ready = []
             
-            logger.info(f"تم اكتشاف {len(filtered_elements)} عنصر")
-            return filtered_elements
+            # بقية المراحل لكل صورة باستخدام نتائج الاكتشاف المجمّع؛ مخرجات التحضير تُنقل إلى
+            # مدخلاتها فيُحرر هرم كل صورة بعد آخر مرحلة تستهلكه لا بعد انتهاء المجموعة كلها
+            finals = []
+            for index in ready:
+                prepared[index].outputs.update(page_number=pages[index][1], frame_dir=frame_dirs[index],
+                                               detected_elements=detections.pop(index))
+                finals.append(self.run_stages(pages[index][0], building_type, ["analysis_result"],
+                                              analysis_ids[index], inputs=prepared[index].outputs))
+            finals = await asyncio.gather(*finals, return_exceptions=True)
+        
+        processing_time = (datetime.now() - start_time).total_seconds()
+        for index, run in zip(ready, finals):
+            if isinstance(run, Exception):
+                fail(index, run, prepared[index].steps + detection_steps)
+                continue
+            result = run.outputs["analysis_result"]
+            result.analysis_steps = prepared[index].steps + detection_steps + run.steps
+            result.processing_time = processing_time
+            results[index] = result
+        
+        return results, failed
+    
+    def _create_batch_detection_stage(self) -> StageSpec:
+        """مرحلة الاكتشاف المجمّع لعدة صور"""
+        return StageSpec(
+            name="detect_elements_batch",
+            title="اكتشاف العناصر المجمّع",
+            description="اكتشاف عناصر السلامة في مجموعة صور باستدعاء واحد للنموذج",
+            func=_detect_elements_batch_task,
+            inputs=["image_pyramids"],
+            outputs=["batch_detected_elements"],
+            resource_class=ResourceClass.CPU_HEAVY
+        )
+    
+    async def run_stages(self, image_path: str, building_type: BuildingType,
+                         outputs: Optional[List[str]] = None,
+                         analysis_id: Optional[str] = None,
+                         inputs: Optional[Dict[str, Any]] = None,
+                         on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> PipelineRun:
+        """تشغيل المراحل اللازمة فقط لإنتاج المخرجات المطلوبة
+        
+        المخرجات الوسيطة المتوفرة مسبقاً تُمرر في inputs فتُتخطى المراحل المنتجة لها،
+        ومخرجات المراحل المخزنة لنفس محتوى الملف تُقرأ من الذاكرة المؤقتة بدل إعادة حسابها.
+        يُفرغ المخطط inputs بعد نقل قيمها، فمن يحتاجها بعد التشغيل يمرر نسخة منها.
+        """
+        analysis_id = analysis_id or str(uuid.uuid4())
+        inputs = inputs if inputs is not None else {}
+        inputs.setdefault("page_number", 0)
+        inputs.setdefault("frame_dir", None)
+        inputs.update(analysis_id=analysis_id, image_path=image_path, building_type=building_type)
+        input_keys = await self._get_input_keys(inputs)
+        steps = []
+        if self.duplicate_index is not None and input_keys is not None and outputs and "analysis_result" in outputs:
+            steps = await self._reuse_near_duplicate(inputs, input_keys, on_event)
+        run = await self.scheduler.run(self.stages, inputs, outputs, run_id=analysis_id,
+                                       on_event=on_event, input_keys=input_keys)
+        run.steps = steps + run.steps
+        return run
+    
+    async def _reuse_near_duplicate(self, inputs: Dict[str, Any], input_keys: Dict[str, str],
+                                    on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> tuple:
+        """إضافة مخرجات الاكتشاف وOCR المخزنة لصفحة سابقة شبه مطابقة إلى المدخلات
+        
+        تُحسب بصمة الصفحة مع الهرم المشترك الذي تحتاجه بقية المراحل على أي حال، ثم يُبحث
+        في الفهرس عن صفحات بأبعاد متقاربة وبصمة قريبة ما زالت مخرجاتها في الذاكرة المؤقتة.
+        الملف المخزنة مخرجاته بمحتواه نفسه لا يحتاج البحث. تُضاف المخرجات إلى inputs نفسها
+        وتعيد خطوات التحضير.
+        """
+        reusable = [name for name in NEAR_DUPLICATE_OUTPUTS if name not in inputs]
+        keys = self.scheduler.derive_keys(self.stages, input_keys)
+        if not reusable or all(self.stage_cache.contains(keys[name]) for name in reusable):
+            return []
+        
+        prepare = await self.scheduler.run(
+            self.stages, dict(inputs),
+            ["perceptual_hash"] + [name for name in ("shared_pyramid", "skew_angle", "image_info")
+                                   if name not in inputs],
+            run_id=inputs["analysis_id"], on_event=on_event, input_keys=input_keys
+        )
+        inputs.update(prepare.outputs)
+        fingerprint = inputs["perceptual_hash"]
+        width, height = inputs["image_info"].width, inputs["image_info"].height
+        file_key, page_number = input_keys["image_path"], inputs["page_number"]
+        
+        loop = asyncio.get_running_loop()
+        matches = await loop.run_in_executor(None, self.duplicate_index.find, fingerprint, width, height, file_key)
+        for match in matches:
+            match_keys = self.scheduler.derive_keys(
+                self.stages, {**input_keys, "image_path": match.file_key, "page_number": str(match.page_number)})
+            values = await loop.run_in_executor(
+                None, lambda: [self.stage_cache.get(match_keys[name]) for name in reusable])
+            if any(value is MISSING for value in values):
+                continue
             
-        except Exception as e:
-            logger.error(f"خطأ في اكتشاف العناصر: {str(e)}")
-            raise
+            # المخرجات بإحداثيات الصفحة السابقة، وتُخزن بمفاتيح هذه الصفحة لإعادة رفعها كما هي
+            for name, value in zip(reusable, values):
+                _scale_bounding_boxes(value, width / match.width)
+                await loop.run_in_executor(None, self.stage_cache.put, keys[name], value)
+            inputs.update(zip(reusable, values))
+            logger.info(f"إعادة استخدام {', '.join(reusable)} من رسم سابق شبه مطابق "
+                        f"(مسافة البصمة {match.distance})")
+            break
+        
+        await loop.run_in_executor(None, self.duplicate_index.add, file_key, page_number, fingerprint, width, height)
+        return prepare.steps
     
-    async def _extract_texts(self, image_data: Dict[str, Any]) -> List[ExtractedText]:
-        """استخراج النصوص من الصورة"""
+    async def _get_input_keys(self, inputs: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        """مفاتيح محتوى المدخلات الجذرية للذاكرة المؤقتة للمراحل
+        
+        مفتاح الملف تجزئة محتواه لا مساره، فإعادة رفع الرسم نفسه تستفيد من المخرجات المخزنة.
+        """
+        if self.stage_cache is None:
+            return None
+        loop = asyncio.get_running_loop()
         try:
-            processed_image = image_data["processed_image"]
-            
-            # استخراج النصوص
-            extracted_texts = self.ocr_extractor.extract_text(processed_image)
-            
-            logger.info(f"تم استخراج {len(extracted_texts)} نص")
-            return extracted_texts
-            
-        except Exception as e:
-            logger.error(f"خطأ في استخراج النصوص: {str(e)}")
-            raise
+            file_key = await loop.run_in_executor(None, _file_content_key, inputs["image_path"])
+        except OSError as e:
+            logger.warning(f"تعذر حساب مفتاح محتوى الملف: {str(e)}")
+            return None
+        building_type = inputs["building_type"]
+        return {
+            "image_path": file_key,
+            "page_number": str(inputs["page_number"]),
+            # مجلد الملفات المشتركة لا يغير المخرجات
+            "frame_dir": "",
+            "building_type": str(getattr(building_type, "value", building_type))
+        }
+    
+    def get_cache_status(self) -> Optional[Dict[str, Any]]:
+        """حالة الذاكرة المؤقتة للمراحل"""
+        return self.stage_cache.get_status() if self.stage_cache is not None else None
+    
+    def get_batching_status(self) -> Optional[Dict[str, Any]]:
+        """إنتاجية طابور الاستدلال المجمّع وأزمنة انتظاره"""
+        return self.object_detector.get_batching_status()
+    
+    def get_duplicate_index_status(self) -> Optional[Dict[str, Any]]:
+        """حالة فهرس الرسومات شبه المكررة"""
+        return self.duplicate_index.get_status() if self.duplicate_index is not None else None
+    
+    def _partial_results_listener(self, on_event: Optional[Callable[[Dict[str, Any]], None]],
+                                  phase: str, page_number: int = 0,
+                                  page_count: int = 1) -> Optional[Callable[[Dict[str, Any]], None]]:
+        """تحويل أحداث المجدول إلى أحداث تحمل النتائج الجزئية فقط بصيغة قابلة للتسلسل"""
+        if on_event is None:
+            return None
+        
+        def listener(event: Dict[str, Any]):
+            outputs = {
+                name: self._to_payload(value)
+                for name, value in event["outputs"].items()
+                if name in PARTIAL_RESULT_OUTPUTS
+            }
+            on_event({**event, "phase": phase, "page": page_number + 1, "page_count": page_count,
+                      "outputs": outputs})
+        
+        return listener
+    
+    def _to_payload(self, value: Any) -> Any:
+        """تحويل نماذج النتائج إلى قواميس"""
+        if isinstance(value, list):
+            return [self._to_payload(item) for item in value]
+        if hasattr(value, "dict"):
+            return value.dict()
+        return value
+    
+    def _estimate_analysis_memory(self, image_path: str, page_number: int = 0) -> int:
+        """تقدير ذروة ذاكرة التحليل من رأس الملف دون فك ترميزه"""
+        frame_bytes = self.image_processor.estimate_decoded_size(image_path, page_number)
+        return frame_bytes * PERFORMANCE_CONFIG["frame_copies_estimate"]
+    
+    def _create_analysis_stages(self) -> List[StageSpec]:
+        """تعريف مراحل التحليل واعتمادياتها
+        
+        إصدار المرحلة المخزنة يشمل الإعدادات والنموذج المؤثرين في مخرجاتها، فتُرفع
+        القيمة الحرفية الأولى عند تغيير منطق المرحلة نفسه.
+        """
+        detection_model = [AI_MODELS["object_detection"],
+                           _model_fingerprint(AI_MODELS["object_detection"]["model_name"])]
+        return [
+            StageSpec(
+                name="load_image",
+                title="تحميل الصورة",
+                description="تحميل الصورة وقراءة معلوماتها",
+                func=_load_image_task,
+                inputs=["image_path", "page_number", "frame_dir"],
+                outputs=["original_image", "image_info"],
+                resource_class=ResourceClass.CPU_HEAVY,
+                version=hash_parts("3", IMAGE_PROCESSING),
+                cached_outputs=["image_info"]
+            ),
+            StageSpec(
+                name="preprocess_image",
+                title="معالجة الصورة",
+                description="تحسين الصورة وإزالة الضوضاء وتصحيح الميل",
+                func=_preprocess_image_task,
+                inputs=["original_image", "frame_dir"],
+                outputs=["processed_image", "image_pyramid", "skew_angle"],
+                resource_class=ResourceClass.CPU_HEAVY,
+                version=hash_parts("4", IMAGE_PROCESSING),
+                # الهرم بدقته الكاملة يملأ الذاكرة المؤقتة ويطرد المخرجات الصغيرة المكلفة،
+                # فيُعاد بناؤه عند الحاجة ولا يُخزن إلا الميل
+                cached_outputs=["skew_angle"]
+            ),
+            StageSpec(
+                name="derive_maps",
+                title="تجهيز الخرائط المشتقة",
+                description="حساب مستويات الهرم والخرائط الرمادية التي تحتاجها المراحل التالية ومشاركتها بين العمال",
+                func=_derive_maps_task,
+                inputs=["image_pyramid", "frame_dir"],
+                outputs=["shared_pyramid"],
+                resource_class=ResourceClass.CPU_HEAVY
+            ),
+            StageSpec(
+                name="detect_elements",
+                title="اكتشاف العناصر",
+                description="اكتشاف عناصر السلامة من الحريق في الصورة",
+                func=_detect_elements_task,
+                inputs=["shared_pyramid"],
+                outputs=["detected_elements"],
+                resource_class=ResourceClass.CPU_HEAVY,
+                version=hash_parts("1", detection_model, IMAGE_PROCESSING["color_prefilter"]),
+                cached_outputs=["detected_elements"]
+            ),
+            StageSpec(
+                name="extract_texts",
+                title="استخراج النصوص",
+                description="استخراج النصوص والمعلومات من الصورة",
+                func=_extract_texts_task,
+                inputs=["shared_pyramid", "skew_angle"],
+                outputs=["extracted_texts"],
+                resource_class=ResourceClass.CPU_HEAVY,
+                version=hash_parts("1", AI_MODELS["ocr"], IMAGE_PROCESSING["pyramid"]),
+                cached_outputs=["extracted_texts"]
+            ),
+            StageSpec(
+                name="extract_floor_plan",
+                title="استخراج الغرف",
+                description="استخراج الجدران ومضلعات الغرف ومساحاتها الفعلية من خطوط الرسم",
+                func=_extract_floor_plan_task,
+                inputs=["shared_pyramid"],
+                outputs=["floor_plan"],
+                resource_class=ResourceClass.CPU_HEAVY,
+                version=hash_parts("1", IMAGE_PROCESSING["shapes"], IMAGE_PROCESSING["pyramid"], GEOMETRY_CONFIG),
+                cached_outputs=["floor_plan"]
+            ),
+            StageSpec(
+                name="fingerprint_image",
+                title="بصمة الرسم",
+                description="بصمة إدراكية للصورة المصغرة للبحث عن الرسومات شبه المكررة",
+                func=_fingerprint_task,
+                inputs=["shared_pyramid"],
+                outputs=["perceptual_hash"],
+                resource_class=ResourceClass.CPU_HEAVY,
+                version=hash_parts("1", IMAGE_PROCESSING["pyramid"]),
+                cached_outputs=["perceptual_hash"]
+            ),
+            StageSpec(
+                name="triage_detect",
+                title="الاكتشاف السريع",
+                description="اكتشاف العناصر على صورة مصغرة للحصول على نتيجة أولية",
+                func=_detect_elements_triage_task,
+                inputs=["original_image"],
+                outputs=["triage_elements"],
+                resource_class=ResourceClass.CPU_HEAVY,
+                version=hash_parts("1", detection_model, TRIAGE_CONFIG),
+                cached_outputs=["triage_elements"]
+            ),
+            StageSpec(
+                name="triage_report",
+                title="النتيجة الأولية",
+                description="فحص امتثال أولي دون استخراج النصوص",
+                func=self._create_preliminary_report,
+                inputs=["triage_elements", "image_info", "analysis_id", "image_path", "building_type"],
+                outputs=["preliminary_result"]
+            ),
+            StageSpec(
+                name="check_compliance",
+                title="فحص الامتثال",
+                description="فحص الامتثال للكود المصري للحريق",
+                func=self._check_compliance,
+                inputs=["detected_elements", "extracted_texts", "image_info", "floor_plan"],
+                outputs=["compliance_issues"]
+            ),
+            StageSpec(
+                name="generate_recommendations",
+                title="إنشاء التوصيات",
+                description="إنشاء توصيات للتحسين",
+                func=self._generate_recommendations,
+                inputs=["compliance_issues", "detected_elements"],
+                outputs=["recommendations"]
+            ),
+            StageSpec(
+                name="create_report",
+                title="إنشاء التقرير النهائي",
+                description="إنشاء التقرير النهائي للتحليل",
+                func=self._create_final_report,
+                inputs=["image_info", "detected_elements", "extracted_texts", "compliance_issues",
+                        "recommendations", "analysis_id", "image_path", "building_type"],
+                outputs=["analysis_result"]
+            )
+        ]
     
     async def _check_compliance(self, detected_elements: List[DetectedElement], 
                               extracted_texts: List[ExtractedText], 
-                              image_info: ImageInfo) -> List[ComplianceIssue]:
+                              image_info: ImageInfo,
+                              floor_plan: Optional[FloorPlan] = None) -> List[ComplianceIssue]:
         """فحص الامتثال للكود المصري"""
         try:
             image_dimensions = (image_info.width, image_info.height)
             
             # فحص الامتثال
             compliance_issues = self.compliance_checker.check_compliance(
-                detected_elements, extracted_texts, image_dimensions
+                detected_elements, extracted_texts, image_dimensions, floor_plan=floor_plan,
+                dpi=image_info.dpi[0]
             )
             
             logger.info(f"تم اكتشاف {len(compliance_issues)} مشكلة امتثال")
@@ -289,7 +1053,7 @@ class MainImageAnalyzer:
             logger.error(f"خطأ في إنشاء التوصيات: {str(e)}")
             raise
     
-    async def _create_final_report(self, image_data: Dict[str, Any], 
+    async def _create_final_report(self, image_info: ImageInfo, 
                                   detected_elements: List[DetectedElement],
                                   extracted_texts: List[ExtractedText],
                                   compliance_issues: List[ComplianceIssue],
@@ -297,7 +1061,6 @@ class MainImageAnalyzer:
                                   analysis_id: str, image_path: str, building_type: BuildingType) -> AnalysisResult:
         """إنشاء التقرير النهائي"""
         try:
-            image_info = image_data["image_info"]
             file_path = Path(image_path)
             
             # استخراج البيانات المنظمة
@@ -318,15 +1081,12 @@ class MainImageAnalyzer:
             # إنشاء الملخص
             summary = self._create_summary(detected_elements, extracted_texts, compliance_issues)
             
-            # إنشاء خطوات التحليل
-            analysis_steps = self._create_analysis_steps(analysis_id)
-            
             result = AnalysisResult(
                 id=analysis_id,
                 file_name=file_path.name,
                 file_size=file_path.stat().st_size,
                 file_type=file_path.suffix,
-                processing_time=(datetime.now() - datetime.now()).total_seconds(),  # سيتم تحديثه
+                processing_time=0.0,  # يُحدَّث بعد اكتمال جميع المراحل
                 project_info=project_info,
                 drawing_data=drawing_data,
                 detected_elements=detected_elements,
@@ -334,7 +1094,6 @@ class MainImageAnalyzer:
                 compliance_issues=compliance_issues,
                 compliance_score=compliance_score,
                 recommendations=recommendations,
-                analysis_steps=analysis_steps,
                 summary=summary,
                 overall_status=overall_status,
                 overall_status_message=status_message
@@ -347,6 +1106,42 @@ class MainImageAnalyzer:
             logger.error(f"خطأ في إنشاء التقرير النهائي: {str(e)}")
             raise
     
+    def _create_preliminary_report(self, triage_elements: List[DetectedElement], image_info: ImageInfo,
+                                   analysis_id: str, image_path: str,
+                                   building_type: BuildingType) -> AnalysisResult:
+        """إنشاء النتيجة الأولية لوضع الفرز السريع"""
+        file_path = Path(image_path)
+        
+        # لا تتوفر نصوص في الفرز السريع، فيُستخدم مقياس الرسم الافتراضي
+        compliance_issues = self.compliance_checker.check_compliance(
+            triage_elements, [], (image_info.width, image_info.height), dpi=image_info.dpi[0]
+        )
+        compliance_score = self.compliance_checker.calculate_compliance_score(compliance_issues)
+        overall_status, status_message = self._determine_overall_status(compliance_issues, compliance_score)
+        
+        summary = self._create_summary(triage_elements, [], compliance_issues)
+        summary["element_counts"] = {
+            element_type.value: len(elements)
+            for element_type, elements in self.object_detector.group_elements_by_type(triage_elements).items()
+        }
+        
+        return AnalysisResult(
+            id=analysis_id,
+            file_name=file_path.name,
+            file_size=file_path.stat().st_size,
+            file_type=file_path.suffix,
+            processing_time=0.0,
+            project_info=self._create_project_info({}, building_type),
+            drawing_data=self._create_drawing_data({}, file_path),
+            detected_elements=triage_elements,
+            compliance_issues=compliance_issues,
+            compliance_score=compliance_score,
+            summary=summary,
+            overall_status=overall_status,
+            overall_status_message=f"نتيجة أولية: {status_message}",
+            is_preliminary=True
+        )
+    
     def _create_project_info(self, structured_data: Dict[str, Any], building_type: BuildingType) -> ProjectInfo:
         """إنشاء معلومات المشروع"""
         return ProjectInfo(
@@ -527,3 +1322,14 @@ class MainImageAnalyzer:
     def get_analysis_statistics(self) -> Dict[str, Any]:
         """الحصول على إحصائيات التحليل"""
         return self.analysis_stats.copy()
+    
+    def get_stage_metrics(self) -> Dict[str, Any]:
+        """مدرجات زمن التنفيذ وزمن المعالج والذاكرة لكل مرحلة"""
+        return self.stage_metrics.snapshot()
+    
+    def shutdown(self):
+        """إيقاف المحلل وتحرير العمال"""
+        self.worker_pool.shutdown()
+        self.object_detector.close()
+        if self.duplicate_index is not None:
+            self.duplicate_index.close()
@@ -0,0 +1,123 @@
+# قياس أداء مراحل التحليل
+# Stage Performance Metrics
+
+import bisect
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# حدود فئات مدرج زمن التنفيذ (بالثواني)
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0]
+
+@dataclass
+class StageMetrics:
+    """مقاييس تنفيذ مرحلة واحدة"""
+    wall_time: float
+    cpu_time: float
+    memory_delta: Optional[int] = None  # بايت
+
+def _current_rss_bytes() -> Optional[int]:
+    """الذاكرة المقيمة الحالية للعملية (Linux فقط؛ None على غيره)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def measure_call(func: Callable[..., Any], kwargs: Dict[str, Any],
+                 exclusive: bool = False) -> Tuple[Any, StageMetrics]:
+    """تنفيذ دالة وقياس الزمن الفعلي وزمن المعالج والتغير في الذاكرة المقيمة
+
+    exclusive: العملية الحالية لا تنفذ غير هذه المرحلة (عامل في وضع العمليات)، فيُقاس
+    process_time ويشمل خيوط البلاطات التي تطلقها المرحلة. وإلا يُقاس thread_time للخيط
+    المنفذ فقط، فلا تُحتسب خيوط البلاطات ولا المراحل المتزامنة.
+    memory_delta هو فرق الذاكرة المقيمة للعملية بين بداية المرحلة ونهايتها، لا ذروتها:
+    الذاكرة المؤقتة المحررة قبل النهاية لا تظهر فيه، وفي وضع الخيوط يشمل المراحل المتزامنة.
+    """
+    cpu_clock = time.process_time if exclusive else time.thread_time
+    rss_before = _current_rss_bytes()
+    wall_start = time.perf_counter()
+    cpu_start = cpu_clock()
+
+    result = func(**kwargs)
+
+    metrics = StageMetrics(
+        wall_time=time.perf_counter() - wall_start,
+        cpu_time=cpu_clock() - cpu_start
+    )
+    rss_after = _current_rss_bytes()
+    if rss_before is not None and rss_after is not None:
+        metrics.memory_delta = rss_after - rss_before
+
+    return result, metrics
+
+class LatencyHistogram:
+    """مدرج تكراري لأزمنة التنفيذ"""
+
+    def __init__(self, buckets: List[float] = None):
+        self.buckets = buckets or LATENCY_BUCKETS
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """تسجيل قيمة جديدة"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """تقدير الشريحة المئوية من حدود الفئات"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        """تمثيل المدرج للعرض في الإحصائيات"""
+        labels = [f"le_{b}" for b in self.buckets] + ["le_inf"]
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+class StageMetricsRegistry:
+    """تجميع مقاييس المراحل عبر جميع التحليلات"""
+
+    def __init__(self):
+        self._wall: Dict[str, LatencyHistogram] = {}
+        self._cpu: Dict[str, LatencyHistogram] = {}
+        self._memory: Dict[str, int] = {}
+
+    def observe(self, stage_name: str, wall_time: float, cpu_time: Optional[float],
+                memory_delta: Optional[int]):
+        """تسجيل مقاييس تنفيذ مرحلة"""
+        self._wall.setdefault(stage_name, LatencyHistogram()).observe(wall_time)
+        if cpu_time is not None:
+            self._cpu.setdefault(stage_name, LatencyHistogram()).observe(cpu_time)
+        if memory_delta is not None:
+            self._memory[stage_name] = max(self._memory.get(stage_name, 0), memory_delta)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """لقطة من المقاييس لكل مرحلة"""
+        return {
+            stage_name: {
+                "wall_time": histogram.to_dict(),
+                "cpu_time": self._cpu[stage_name].to_dict() if stage_name in self._cpu else None,
+                "max_memory_delta": self._memory.get(stage_name)
+            }
+            for stage_name, histogram in self._wall.items()
+        }
@@ -14,6 +14,7 @@ class AnalysisStatus(str, Enum):
     COMPLETED = "completed"
     FAILED = "failed"
     CANCELLED = "cancelled"
+    NEEDS_REVISION = "needs_revision"
 
 class SeverityLevel(str, Enum):
     """مستويات الخطورة"""
@@ -130,6 +131,8 @@ class AnalysisStep(BaseModel):
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
     duration: Optional[float] = None
+    cpu_time: Optional[float] = Field(None, description="زمن المعالج بالثواني")
+    memory_delta: Optional[int] = Field(None, description="تغير الذاكرة المقيمة للعملية المنفذة بين بداية المرحلة ونهايتها بالبايت")
     progress: float = Field(0.0, ge=0.0, le=100.0)
     details: Dict[str, Any] = Field(default_factory=dict)
     errors: List[str] = Field(default_factory=list)
@@ -155,6 +158,18 @@ class DrawingData(BaseModel):
     author: Optional[str] = None
     checker: Optional[str] = None
 
+class PageAnalysis(BaseModel):
+    """ملخص تحليل صفحة واحدة من ملف متعدد الصفحات"""
+    page_number: int = Field(..., ge=1)
+    status: AnalysisStatus
+    compliance_score: float = Field(0.0, ge=0.0, le=100.0)
+    overall_status: Optional[AnalysisStatus] = None
+    total_elements: int = 0
+    total_texts: int = 0
+    total_issues: int = 0
+    processing_time: float = 0.0
+    error: Optional[str] = None
+
 class AnalysisResult(BaseModel):
     """نتيجة التحليل الكاملة"""
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -186,9 +201,14 @@ class AnalysisResult(BaseModel):
     # ملخص النتائج
     summary: Dict[str, Any] = Field(default_factory=dict)
     
+    # صفحات الملف (لملفات PDF متعددة الصفحات)
+    page_count: int = 1
+    pages: List[PageAnalysis] = Field(default_factory=list)
+    
     # الحالة العامة
     overall_status: AnalysisStatus
     overall_status_message: str
+    is_preliminary: bool = Field(False, description="نتيجة أولية من وضع الفرز السريع")
 
 class AnalysisRequest(BaseModel):
     """طلب تحليل جديد"""
@@ -208,6 +228,17 @@ class AnalysisResponse(BaseModel):
     progress: float = Field(0.0, ge=0.0, le=100.0)
     estimated_completion: Optional[datetime] = None
 
+class BatchAnalysisResponse(BaseModel):
+    """استجابة التحليل الدفعي"""
+    batch_id: str
+    status: AnalysisStatus
+    message: str
+    total_files: int
+    completed_files: int = 0
+    failed_files: int = 0
+    progress: float = Field(0.0, ge=0.0, le=100.0)
+    request_ids: List[str] = Field(default_factory=list)
+
 class ErrorResponse(BaseModel):
     """استجابة خطأ"""
     error_code: str
@@ -11,6 +11,7 @@ from pathlib import Path
 
 from models import DetectedElement, BoundingBox, ElementType
 from config import AI_MODELS, IMAGE_PROCESSING
+from inference_batcher import MicroBatcher, micro_batching_enabled
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +22,7 @@ class FireSafetyObjectDetector:
         self.model = None
         self.confidence_threshold = AI_MODELS["object_detection"]["confidence_threshold"]
         self.iou_threshold = AI_MODELS["object_detection"]["iou_threshold"]
+        self.input_size = AI_MODELS["object_detection"]["input_size"]
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         
         # فئات العناصر المطلوبة
@@ -58,6 +60,9 @@ class FireSafetyObjectDetector:
         }
         
         self._load_model()
+        
+        # طابور الاستدلال المجمّع: خيطه وحده يستدعي النموذج ويجمع صور التحليلات المتزامنة
+        self.batcher = MicroBatcher(self._predict, name="object_detector") if micro_batching_enabled() else None
     
     def _load_model(self):
         """تحميل نموذج YOLO"""
@@ -81,46 +86,13 @@ class FireSafetyObjectDetector:
     def detect_elements(self, image: np.ndarray) -> List[DetectedElement]:
         """اكتشاف العناصر في الصورة"""
         try:
-            # تشغيل النموذج
-            results = self.model(image, conf=self.confidence_threshold, iou=self.iou_threshold)
-            
-            detected_elements = []
-            
-            for result in results:
-                if result.boxes is not None:
-                    boxes = result.boxes.xyxy.cpu().numpy()  # إحداثيات الصناديق
-                    confidences = result.boxes.conf.cpu().numpy()  # مستويات الثقة
-                    class_ids = result.boxes.cls.cpu().numpy().astype(int)  # فئات العناصر
-                    
-                    for box, confidence, class_id in zip(boxes, confidences, class_ids):
-                        # تحويل الإحداثيات
-                        x1, y1, x2, y2 = box
-                        width = x2 - x1
-                        height = y2 - y1
-                        
-                        # الحصول على نوع العنصر
-                        element_type_str = self.class_names.get(class_id, "unknown")
-                        element_type = ElementType(element_type_str) if element_type_str != "unknown" else None
-                        
-                        if element_type:
-                            # إنشاء مربع الإحاطة
-                            bounding_box = BoundingBox(
-                                x=float(x1),
-                                y=float(y1), 
-                                width=float(width),
-                                height=float(height)
-                            )
-                            
-                            # إنشاء العنصر المكتشف
-                            element = DetectedElement(
-                                type=element_type,
-                                name=self.arabic_names.get(element_type_str, element_type_str),
-                                confidence=float(confidence),
-                                bounding_box=bounding_box,
-                                properties=self._extract_element_properties(element_type, bounding_box, image)
-                            )
-                            
-                            detected_elements.append(element)
+            if self.batcher is not None:
+                detected_elements = self.batcher.submit(image)
+            else:
+                # تشغيل النموذج
+                results = self.model(image, conf=self.confidence_threshold, iou=self.iou_threshold,
+                                     imgsz=self.input_size)
+                detected_elements = self._parse_results(results, image)
             
             logger.info(f"تم اكتشاف {len(detected_elements)} عنصر")
             return detected_elements
@@ -129,6 +101,86 @@ class FireSafetyObjectDetector:
             logger.error(f"خطأ في اكتشاف العناصر: {str(e)}")
             return []
     
+    def detect_elements_batch(self, images: List[np.ndarray]) -> List[List[DetectedElement]]:
+        """اكتشاف العناصر في عدة صور باستدعاء واحد للنموذج"""
+        if not images:
+            return []
+        
+        try:
+            if self.batcher is not None:
+                # قد تشارك الصور دفعات مع تحليلات أخرى أو تُقسم حسب الحجم الأقصى للدفعة
+                batch_elements = self.batcher.submit_many(images)
+            else:
+                batch_elements = self._predict(images)
+            
+            logger.info(f"تم اكتشاف {sum(len(e) for e in batch_elements)} عنصر في {len(images)} صورة")
+            return batch_elements
+            
+        except Exception as e:
+            logger.error(f"خطأ في اكتشاف العناصر للدفعة: {str(e)}")
+            return [[] for _ in images]
+    
+    def _predict(self, images: List[np.ndarray]) -> List[List[DetectedElement]]:
+        """تشغيل النموذج على دفعة صور وتحويل مخرجات كل صورة"""
+        # النموذج يعالج القائمة كدفعة واحدة ويعيد نتيجة لكل صورة بالترتيب نفسه
+        results = self.model(images, conf=self.confidence_threshold, iou=self.iou_threshold,
+                             imgsz=self.input_size)
+        return [
+            self._parse_results([result], image)
+            for result, image in zip(results, images)
+        ]
+    
+    def get_batching_status(self) -> Optional[Dict[str, Any]]:
+        """إحصائيات طابور الاستدلال المجمّع (None إذا كان معطلاً)"""
+        return self.batcher.get_status() if self.batcher is not None else None
+    
+    def close(self):
+        """إيقاف طابور الاستدلال"""
+        if self.batcher is not None:
+            self.batcher.close()
+    
+    def _parse_results(self, results, image: np.ndarray) -> List[DetectedElement]:
+        """تحويل مخرجات النموذج لصورة واحدة إلى عناصر مكتشفة"""
+        detected_elements = []
+        
+        for result in results:
+            if result.boxes is not None:
+                boxes = result.boxes.xyxy.cpu().numpy()  # إحداثيات الصناديق
+                confidences = result.boxes.conf.cpu().numpy()  # مستويات الثقة
+                class_ids = result.boxes.cls.cpu().numpy().astype(int)  # فئات العناصر
+                
+                for box, confidence, class_id in zip(boxes, confidences, class_ids):
+                    # تحويل الإحداثيات
+                    x1, y1, x2, y2 = box
+                    width = x2 - x1
+                    height = y2 - y1
+                    
+                    # الحصول على نوع العنصر
+                    element_type_str = self.class_names.get(class_id, "unknown")
+                    element_type = ElementType(element_type_str) if element_type_str != "unknown" else None
+                    
+                    if element_type:
+                        # إنشاء مربع الإحاطة
+                        bounding_box = BoundingBox(
+                            x=float(x1),
+                            y=float(y1), 
+                            width=float(width),
+                            height=float(height)
+                        )
+                        
+                        # إنشاء العنصر المكتشف
+                        element = DetectedElement(
+                            type=element_type,
+                            name=self.arabic_names.get(element_type_str, element_type_str),
+                            confidence=float(confidence),
+                            bounding_box=bounding_box,
+                            properties=self._extract_element_properties(element_type, bounding_box, image)
+                        )
+                        
+                        detected_elements.append(element)
+        
+        return detected_elements
+    
     def _extract_element_properties(self, element_type: ElementType, bounding_box: BoundingBox, image: np.ndarray) -> Dict[str, Any]:
         """استخراج خصائص العنصر"""
         properties = {}
@@ -13,7 +13,8 @@ import re
 from dataclasses import dataclass
 
 from models import ExtractedText, BoundingBox
-from config import AI_MODELS, DRAWING_SYMBOLS
+from config import AI_MODELS, DRAWING_SYMBOLS, IMAGE_PROCESSING
+from image_processor import ImagePyramid, SKEW_CORRECTION_THRESHOLD, estimate_skew_angle
 
 logger = logging.getLogger(__name__)
 
@@ -93,11 +94,14 @@ class OCRExtractor:
         except Exception as e:
             logger.error(f"خطأ في تهيئة محركات OCR: {str(e)}")
     
-    def extract_text(self, image: np.ndarray) -> List[ExtractedText]:
-        """استخراج النصوص من الصورة"""
+    def extract_text(self, image: np.ndarray, skew_angle: Optional[float] = None) -> List[ExtractedText]:
+        """استخراج النصوص من الصورة
+        
+        skew_angle: ميل الصورة إذا كان معروفاً من المعالجة الأولية (يتخطى إعادة تقديره)
+        """
         try:
             # معالجة الصورة لتحسين OCR
-            processed_image = self._preprocess_for_ocr(image)
+            processed_image = self._preprocess_for_ocr(image, skew_angle)
             
             # استخراج النصوص باستخدام المحرك الأساسي
             if self.primary_ocr == "paddleocr":
@@ -137,7 +141,7 @@ class OCRExtractor:
             logger.error(f"خطأ في استخراج النصوص: {str(e)}")
             return []
     
-    def _preprocess_for_ocr(self, image: np.ndarray) -> np.ndarray:
+    def _preprocess_for_ocr(self, image: np.ndarray, skew_angle: Optional[float] = None) -> np.ndarray:
         """معالجة الصورة لتحسين OCR"""
         try:
             # تحويل إلى رمادي
@@ -158,7 +162,7 @@ class OCRExtractor:
             sharpened = cv2.filter2D(denoised, -1, kernel)
             
             # تصحيح الميل الطفيف
-            corrected = self._correct_text_skew(sharpened)
+            corrected = self._correct_text_skew(sharpened, skew_angle)
             
             return corrected
             
@@ -166,32 +170,23 @@ class OCRExtractor:
             logger.warning(f"خطأ في معالجة الصورة: {str(e)}")
             return image
     
-    def _correct_text_skew(self, image: np.ndarray) -> np.ndarray:
-        """تصحيح ميل النصوص"""
+    def _correct_text_skew(self, image: np.ndarray, skew_angle: Optional[float] = None) -> np.ndarray:
+        """تصحيح ميل النصوص (يُقدر الميل على خريطة حواف مصغرة إذا لم يُمرر)"""
         try:
-            # اكتشاف الخطوط
-            edges = cv2.Canny(image, 50, 150, apertureSize=3)
-            lines = cv2.HoughLines(edges, 1, np.pi/180, threshold=100)
-            
-            if lines is not None:
-                angles = []
-                for line in lines:
-                    rho, theta = line[0]
-                    angle = theta * 180 / np.pi
-                    # تصحيح الميل البسيط فقط
-                    if -5 < angle < 5:
-                        angles.append(angle)
-                
-                if angles:
-                    median_angle = np.median(angles)
-                    if abs(median_angle) > 0.5:
-                        # دوران الصورة
-                        height, width = image.shape
-                        center = (width // 2, height // 2)
-                        rotation_matrix = cv2.getRotationMatrix2D(center, -median_angle, 1.0)
-                        rotated = cv2.warpAffine(image, rotation_matrix, (width, height), 
-                                               borderValue=(255, 255, 255))
-                        return rotated
+            if skew_angle is None:
+                pyramid = ImagePyramid(image, IMAGE_PROCESSING["pyramid"]["min_dimension"])
+                # تصحيح الميل البسيط فقط
+                skew_angle = estimate_skew_angle(
+                    None, max_angle=5, edges=pyramid.edges(IMAGE_PROCESSING["pyramid"]["levels"]["skew"]))
+            
+            if SKEW_CORRECTION_THRESHOLD < abs(skew_angle) < 5:
+                # دوران الصورة
+                height, width = image.shape
+                center = (width // 2, height // 2)
+                rotation_matrix = cv2.getRotationMatrix2D(center, -skew_angle, 1.0)
+                rotated = cv2.warpAffine(image, rotation_matrix, (width, height), 
+                                       borderValue=(255, 255, 255))
+                return rotated
             
             return image
             
@@ -0,0 +1,411 @@
+# مجدول مراحل التحليل على شكل رسم بياني موجه غير دوري (DAG)
+# Declarative Stage DAG Scheduler for the Analysis Pipeline
+
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from models import AnalysisStatus, AnalysisStep
+from config import PERFORMANCE_CONFIG
+from worker_pool import WorkerPool
+from buffer_manager import BufferManager
+from metrics import StageMetrics, StageMetricsRegistry, measure_call
+from stage_cache import MISSING, StageCache, hash_parts
+
+logger = logging.getLogger(__name__)
+
+class ResourceClass(str, Enum):
+    """فئات الموارد للمراحل"""
+    CPU_HEAVY = "cpu_heavy"  # تُنفذ في مجمع العمال
+    IO = "io"                # تُنفذ في منفذ الخيوط الافتراضي
+    LIGHT = "light"          # تُنفذ مباشرة على حلقة الأحداث
+
+@dataclass
+class StageSpec:
+    """تعريف مرحلة: مدخلاتها ومخرجاتها ومهلتها وفئة مواردها
+
+    تستقبل الدالة مدخلاتها كوسائط مسماة بأسماء المدخلات، وتعيد قيمة واحدة
+    إذا كان للمرحلة مخرج واحد أو قاموساً بأسماء المخرجات. مراحل CPU_HEAVY
+    يجب أن تكون دوال على مستوى الوحدة لتعمل داخل عمليات العمال.
+    المخرجات المذكورة في cached_outputs تُخزن على القرص بمفتاح من مدخلاتها وversion،
+    فيجب تغيير version عند أي تغيير في سلوك المرحلة أو نموذجها أو إعداداتها.
+    """
+    name: str
+    title: str
+    description: str
+    func: Callable[..., Any]
+    inputs: List[str]
+    outputs: List[str]
+    resource_class: ResourceClass = ResourceClass.LIGHT
+    timeout: Optional[float] = None
+    version: str = "1"
+    cached_outputs: List[str] = field(default_factory=list)
+
+# نوع دالة الاستماع لأحداث المراحل: تستقبل قاموس الحدث
+StageEventListener = Callable[[Dict[str, Any]], None]
+
+@dataclass
+class PipelineRun:
+    """نتيجة تشغيل المخطط"""
+    outputs: Dict[str, Any]
+    steps: List[AnalysisStep] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+
+class StageExecutionError(Exception):
+    """فشل مرحلة أثناء تشغيل المخطط"""
+
+    def __init__(self, stage: str, message: str, steps: List[AnalysisStep]):
+        super().__init__(message)
+        self.stage = stage
+        self.steps = steps
+
+class PipelineScheduler:
+    """مجدول يشغل المراحل المستقلة بالتوازي حسب اعتمادياتها"""
+
+    def __init__(self, worker_pool: WorkerPool, default_timeout: Optional[float] = None,
+                 metrics: Optional[StageMetricsRegistry] = None,
+                 cache: Optional[StageCache] = None):
+        self.worker_pool = worker_pool
+        self.metrics = metrics
+        self.cache = cache
+        self.default_timeout = default_timeout or PERFORMANCE_CONFIG["analysis_timeout"]
+        self.stage_timeouts = PERFORMANCE_CONFIG.get("stage_timeouts", {})
+
+    def plan(self, stages: List[StageSpec], available: Iterable[str],
+             requested_outputs: Optional[Iterable[str]] = None) -> List[StageSpec]:
+        """تحديد المراحل اللازمة للمخرجات المطلوبة بترتيب طوبولوجي"""
+        producers: Dict[str, StageSpec] = {}
+        for stage in stages:
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"المخرج {output} تنتجه أكثر من مرحلة")
+                producers[output] = stage
+
+        available = set(available)
+        if requested_outputs is None:
+            requested = {output for stage in stages for output in stage.outputs}
+        else:
+            requested = set(requested_outputs)
+
+        # السير عكسياً من المخرجات المطلوبة لتحديد المراحل اللازمة فقط
+        needed: Dict[str, StageSpec] = {}
+        pending = [output for output in requested if output not in available]
+        while pending:
+            output = pending.pop()
+            stage = producers.get(output)
+            if stage is None:
+                raise ValueError(f"لا توجد مرحلة تنتج المخرج المطلوب: {output}")
+            if stage.name in needed:
+                continue
+            needed[stage.name] = stage
+            pending.extend(i for i in stage.inputs if i not in available)
+
+        # ترتيب طوبولوجي مع اكتشاف الدورات
+        ordered: List[StageSpec] = []
+        produced = set(available)
+        remaining = [stage for stage in stages if stage.name in needed]
+        while remaining:
+            ready = [stage for stage in remaining if all(i in produced for i in stage.inputs)]
+            if not ready:
+                names = ", ".join(stage.name for stage in remaining)
+                raise ValueError(f"اعتماديات دائرية أو مدخلات مفقودة في المراحل: {names}")
+            for stage in ready:
+                ordered.append(stage)
+                produced.update(stage.outputs)
+                remaining.remove(stage)
+
+        return ordered
+
+    def derive_keys(self, stages: List[StageSpec], input_keys: Dict[str, str]) -> Dict[str, str]:
+        """اشتقاق مفتاح محتوى لكل مخرج من مفاتيح المدخلات الجذرية (شجرة Merkle)
+        
+        مفتاح المخرج تجزئة لاسم مرحلته وإصدارها ومفاتيح مدخلاتها، فيُشتق دون تشغيل أي مرحلة.
+        المخرجات المعتمدة على مدخل بلا مفتاح (مثل معرف التحليل) تبقى بلا مفتاح ولا تُخزن.
+        """
+        keys = dict(input_keys)
+        remaining = list(stages)
+        progress = True
+        while progress:
+            progress = False
+            for stage in list(remaining):
+                if all(name in keys for name in stage.inputs):
+                    stage_key = hash_parts(stage.name, stage.version,
+                                           [(name, keys[name]) for name in stage.inputs])
+                    for output in stage.outputs:
+                        keys.setdefault(output, hash_parts(stage_key, output))
+                    remaining.remove(stage)
+                    progress = True
+        return keys
+
+    def _load_cached_outputs(self, stages: List[StageSpec], available: Iterable[str],
+                             requested_outputs: Optional[Iterable[str]],
+                             keys: Dict[str, str]) -> Dict[str, Any]:
+        """تحميل المخرجات المخزنة اللازمة فقط
+        
+        السير عكسياً من المخرجات المطلوبة: المخرج الموجود في الذاكرة المؤقتة لا تُطلب
+        مدخلات مرحلته، فلا تُشغل المراحل السابقة التي لا يحتاجها غيره.
+        """
+        producers = {output: stage for stage in stages for output in stage.outputs}
+        available = set(available)
+        if requested_outputs is None:
+            pending = list(producers)
+        else:
+            pending = list(requested_outputs)
+
+        loaded: Dict[str, Any] = {}
+        visited: Set[str] = set()
+        while pending:
+            output = pending.pop()
+            if output in available or output in visited:
+                continue
+            visited.add(output)
+            stage = producers.get(output)
+            if stage is None:
+                continue
+            if output in stage.cached_outputs and output in keys:
+                value = self.cache.get(keys[output])
+                if value is not MISSING:
+                    loaded[output] = value
+                    continue
+            pending.extend(stage.inputs)
+        return loaded
+
+    async def run(self, stages: List[StageSpec], inputs: Dict[str, Any],
+                  requested_outputs: Optional[Iterable[str]] = None,
+                  run_id: str = "",
+                  on_event: Optional[StageEventListener] = None,
+                  input_keys: Optional[Dict[str, str]] = None) -> PipelineRun:
+        """تشغيل المراحل اللازمة، مع تشغيل المراحل المستقلة بالتوازي
+        
+        on_event تُستدعى على حلقة الأحداث عند بدء كل مرحلة وانتهائها، ويحمل حدث
+        الاكتمال مخرجات المرحلة لعرض النتائج الجزئية.
+        input_keys: مفاتيح محتوى المدخلات الجذرية؛ تُفعّل الذاكرة المؤقتة للمراحل عند توفرها.
+        يأخذ التشغيل ملكية inputs: تُنقل قيمه إلى مدير الذاكرة ويُفرغ القاموس، فتُحرر الصور
+        الممررة بعد آخر مرحلة تستهلكها ما لم يحتفظ المستدعي بمرجع آخر لها.
+        """
+        keys: Dict[str, str] = {}
+        cached: Dict[str, Any] = {}
+        if self.cache is not None and input_keys:
+            keys = self.derive_keys(stages, input_keys)
+            loop = asyncio.get_running_loop()
+            cached = await loop.run_in_executor(
+                None, self._load_cached_outputs, stages, inputs.keys(), requested_outputs, keys
+            )
+            # المدخلات الممررة صراحة تتقدم على المخرجات المخزنة
+            for name in cached:
+                inputs.setdefault(name, cached[name])
+
+        planned = self.plan(stages, inputs.keys(), requested_outputs)
+        planned_names = {stage.name for stage in planned}
+        cached_stages = [stage for stage in stages
+                         if stage.name not in planned_names and any(o in cached for o in stage.outputs)]
+        skipped = [stage.name for stage in stages
+                   if stage.name not in planned_names and stage not in cached_stages]
+
+        # عدد المراحل المستهلكة لكل مدخل لتحرير الصور الوسيطة بعد آخر مستهلك
+        consumers: Dict[str, int] = {}
+        for stage in planned:
+            for name in stage.inputs:
+                consumers[name] = consumers.get(name, 0) + 1
+
+        retained = set(requested_outputs) if requested_outputs is not None else None
+        context = BufferManager(consumers, retained)
+        for name in list(inputs):
+            context.put(name, inputs.pop(name))
+
+        steps = {stage.name: self._create_step(stage, run_id) for stage in cached_stages + planned}
+        pending: Dict[str, StageSpec] = {stage.name: stage for stage in planned}
+        running: Dict[asyncio.Task, StageSpec] = {}
+        completed = 0
+        total_stages = len(steps)
+
+        def emit(event_type: str, stage: StageSpec, outputs: Optional[Dict[str, Any]] = None):
+            if on_event is None:
+                return
+            event = {
+                "type": event_type,
+                "stage": stage.name,
+                "title": stage.title,
+                "status": steps[stage.name].status.value,
+                "completed_stages": completed,
+                "total_stages": total_stages,
+                "outputs": outputs or {}
+            }
+            try:
+                on_event(event)
+            except Exception as e:
+                # أخطاء المستمع لا توقف التحليل
+                logger.warning(f"خطأ في مستمع أحداث المراحل: {str(e)}")
+
+        # المراحل المستغنى عنها بمخرجات مخزنة تُسجل مكتملة
+        for stage in cached_stages:
+            step = steps[stage.name]
+            step.status = AnalysisStatus.COMPLETED
+            step.progress = 100.0
+            step.details["cached"] = True
+            completed += 1
+            emit("stage_completed", stage, {o: cached[o] for o in stage.outputs if o in cached})
+        if cached_stages:
+            logger.info(f"مراحل من الذاكرة المؤقتة في {run_id}: {', '.join(s.name for s in cached_stages)}")
+        # القيم المحملة صارت في مدير الذاكرة؛ تكفي أسماؤها بعد الآن
+        loaded = set(cached)
+        cached.clear()
+
+        try:
+            while pending or running:
+                # إطلاق جميع المراحل الجاهزة
+                for name, stage in list(pending.items()):
+                    if all(i in context for i in stage.inputs):
+                        del pending[name]
+                        store_keys = {o: keys[o] for o in stage.cached_outputs
+                                      if o in keys and o not in loaded}
+                        steps[name].status = AnalysisStatus.PROCESSING
+                        task = asyncio.create_task(self._run_stage(
+                            stage, steps[name], {i: context[i] for i in stage.inputs}, store_keys))
+                        running[task] = stage
+                        emit("stage_started", stage)
+
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    stage = running.pop(task)
+                    if task.exception() is not None:
+                        emit("stage_failed", stage)
+                    outputs = task.result()
+                    completed += 1
+                    emit("stage_completed", stage, outputs)
+                    for name, value in outputs.items():
+                        context.put(name, value)
+                    context.release(stage.inputs)
+                # المهام المنتهية ومتغيرات الحلقة تحمل المخرجات، فتُترك قبل الانتظار التالي
+                # حتى لا تبقى الصور حية بعد آخر مستهلك لها
+                done = task = outputs = value = None
+
+        except asyncio.CancelledError:
+            # إلغاء التحليل: إيقاف المراحل الجارية (وإنهاء عملياتها) وعدم إطلاق أي مرحلة جديدة
+            await self._cancel_running(running)
+            for step in steps.values():
+                if step.status == AnalysisStatus.PENDING:
+                    step.status = AnalysisStatus.CANCELLED
+            logger.info(f"تم إلغاء التشغيل: {run_id}")
+            raise
+
+        except Exception as e:
+            await self._cancel_running(running)
+
+            stage_name = next((name for name, step in steps.items()
+                               if step.status == AnalysisStatus.FAILED), "")
+            raise StageExecutionError(stage_name, str(e), list(steps.values())) from e
+
+        logger.debug(f"ذروة الذاكرة الوسيطة للتشغيل {run_id}: {context.peak_bytes // 2**20} ميجابايت")
+        return PipelineRun(outputs=context.outputs(), steps=list(steps.values()), skipped=skipped)
+
+    async def _cancel_running(self, running: Dict[asyncio.Task, StageSpec]):
+        """إلغاء المراحل الجارية وانتظار انتهائها"""
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running.keys(), return_exceptions=True)
+
+    def _create_step(self, stage: StageSpec, run_id: str) -> AnalysisStep:
+        """إنشاء سجل الخطوة الخاص بالمرحلة"""
+        return AnalysisStep(
+            step_id=f"{run_id}-{stage.name}",
+            name=stage.title,
+            description=stage.description,
+            status=AnalysisStatus.PENDING,
+            progress=0.0
+        )
+
+    def _get_timeout(self, stage: StageSpec) -> float:
+        """مهلة المرحلة"""
+        return stage.timeout or self.stage_timeouts.get(stage.name) or self.default_timeout
+
+    async def _run_stage(self, stage: StageSpec, step: AnalysisStep, kwargs: Dict[str, Any],
+                         store_keys: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """تنفيذ مرحلة واحدة مع المهلة وتسجيل حالتها، وتخزين مخرجاتها القابلة للتخزين"""
+        step.status = AnalysisStatus.PROCESSING
+        step.start_time = datetime.now()
+        timeout = self._get_timeout(stage)
+
+        try:
+            try:
+                result, stage_metrics = await asyncio.wait_for(self._invoke(stage, kwargs), timeout=timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"تجاوزت المرحلة {stage.title} المهلة المحددة ({timeout} ثانية)")
+
+            outputs = self._normalize_outputs(stage, result)
+            if store_keys:
+                # التخزين قبل تسليم المخرجات للمراحل التالية حتى لا تُخزن بعد تعديلها
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self._store_outputs, outputs, store_keys)
+
+            step.status = AnalysisStatus.COMPLETED
+            step.progress = 100.0
+            step.cpu_time = round(stage_metrics.cpu_time, 4)
+            step.memory_delta = stage_metrics.memory_delta
+            if self.metrics is not None:
+                self.metrics.observe(stage.name, stage_metrics.wall_time,
+                                     stage_metrics.cpu_time, stage_metrics.memory_delta)
+            logger.info(f"تم إكمال الخطوة: {stage.title}")
+            return outputs
+
+        except asyncio.CancelledError:
+            step.status = AnalysisStatus.CANCELLED
+            raise
+
+        except Exception as e:
+            step.status = AnalysisStatus.FAILED
+            step.errors.append(str(e))
+            logger.error(f"فشل في الخطوة {stage.title}: {str(e)}")
+            raise
+
+        finally:
+            step.end_time = datetime.now()
+            step.duration = (step.end_time - step.start_time).total_seconds()
+
+    async def _invoke(self, stage: StageSpec, kwargs: Dict[str, Any]) -> Tuple[Any, StageMetrics]:
+        """تشغيل دالة المرحلة حسب فئة مواردها مع قياس أدائها حيث تُنفذ"""
+        if stage.resource_class == ResourceClass.CPU_HEAVY:
+            # عامل العملية لا ينفذ غير هذه المرحلة، فيُحتسب زمن معالج العملية كاملة
+            exclusive = self.worker_pool.executor_type == "process"
+            return await self.worker_pool.run(measure_call, stage.func, kwargs, exclusive)
+
+        if stage.resource_class == ResourceClass.IO:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, functools.partial(measure_call, stage.func, kwargs))
+
+        if not inspect.iscoroutinefunction(stage.func):
+            return measure_call(stage.func, kwargs)
+
+        # المراحل الخفيفة غير المتزامنة تُقاس حول انتظارها على حلقة الأحداث
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        result = await stage.func(**kwargs)
+        return result, StageMetrics(
+            wall_time=time.perf_counter() - wall_start,
+            cpu_time=time.thread_time() - cpu_start
+        )
+
+    def _store_outputs(self, outputs: Dict[str, Any], store_keys: Dict[str, str]):
+        """تخزين مخرجات المرحلة في الذاكرة المؤقتة"""
+        for output, key in store_keys.items():
+            self.cache.put(key, outputs[output])
+
+    def _normalize_outputs(self, stage: StageSpec, result: Any) -> Dict[str, Any]:
+        """تحويل نتيجة المرحلة إلى قاموس بأسماء مخرجاتها المعلنة"""
+        if len(stage.outputs) == 1:
+            return {stage.outputs[0]: result}
+
+        if not isinstance(result, dict):
+            raise TypeError(f"المرحلة {stage.name} يجب أن تعيد قاموساً بمخرجاتها")
+
+        missing = [output for output in stage.outputs if output not in result]
+        if missing:
+            raise KeyError(f"المرحلة {stage.name} لم تنتج المخرجات: {missing}")
+
+        return {output: result[output] for output in stage.outputs}
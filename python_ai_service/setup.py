@@ -147,9 +147,20 @@ ACCESS_TOKEN_EXPIRE_MINUTES=30
 MAX_CONCURRENT_ANALYSES=5
 ANALYSIS_TIMEOUT=300
 CACHE_DURATION=3600
+CACHE_MAX_SIZE_MB=2048
+EXECUTOR_TYPE=thread
+SHARED_FRAMES=auto
+COLOR_PREFILTER=false
+NEAR_DUPLICATE_REUSE=false
+MICRO_BATCHING=auto
+MICRO_BATCH_SIZE=8
+MICRO_BATCH_WAIT_MS=10
+MEMORY_BUDGET_MB=4096
+TILE_WORKERS=0  # 0: تلقائي حسب عدد المعالجات وعمال المجمع
 
 # إعدادات الملفات
 MAX_FILE_SIZE=52428800  # 50MB
+MAX_IMAGE_PIXELS=300000000
 ALLOWED_EXTENSIONS=.jpg,.jpeg,.png,.bmp,.tiff,.pdf
 
 # إعدادات السجلات
@@ -0,0 +1,108 @@
+# صور التحليل الوسيطة في ملفات مشتركة بين عمليات العمال
+# Memory-mapped Intermediate Frames Shared across Worker Processes
+
+import asyncio
+import logging
+import mmap
+import shutil
+from contextlib import asynccontextmanager
+from multiprocessing.reduction import ForkingPickler
+from pathlib import Path
+from typing import AsyncIterator, Optional, Tuple
+
+import numpy as np
+
+from config import PERFORMANCE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def is_shared(array: np.ndarray) -> bool:
+    """هل المصفوفة ملف مشترك كامل (لا جزء منه ولا نسخة فُك تسلسلها)"""
+    return isinstance(array, np.memmap) and isinstance(array.base, mmap.mmap)
+
+
+def share_array(array: np.ndarray, path: str, min_bytes: Optional[int] = None) -> np.ndarray:
+    """كتابة المصفوفة مرة واحدة في ملف مشترك وإعادتها مفتوحة للقراءة فقط
+
+    المصفوفات الصغيرة أو المشتركة مسبقاً تُعاد كما هي.
+    """
+    if min_bytes is None:
+        min_bytes = PERFORMANCE_CONFIG["shared_frames"]["min_bytes"]
+    if is_shared(array) or array.nbytes < min_bytes:
+        return array
+
+    frame = np.memmap(path, dtype=array.dtype, mode="w+", shape=array.shape)
+    frame[...] = array
+    frame.flush()
+    del frame
+    return attach_frame(path, array.dtype.str, array.shape)
+
+
+def attach_frame(path: str, dtype: str, shape: Tuple[int, ...], offset: int = 0) -> np.ndarray:
+    """فتح ملف مشترك بالاسم دون نسخ بياناته"""
+    return np.memmap(path, dtype=np.dtype(dtype), mode="r", shape=shape, offset=offset)
+
+
+def _reduce_memmap(array: np.memmap):
+    """إرسال الملف المشترك إلى العامل باسمه بدلاً من بياناته"""
+    if is_shared(array):
+        return attach_frame, (array.filename, array.dtype.str, array.shape, array.offset)
+    # جزء من ملف أو نسخة لا يقابلها ملف: تُرسل البيانات كالمصفوفة العادية
+    return np.array(array).__reduce__()
+
+
+# يُستخدم ForkingPickler لمهام مجمع العمال ونتائجها، بينما يحفظ pickle العادي (الذاكرة
+# المؤقتة للمراحل) البيانات نفسها فلا تشير المخرجات المخزنة إلى ملفات تُحذف بانتهاء التحليل
+ForkingPickler.register(np.memmap, _reduce_memmap)
+
+
+class FrameStore:
+    """مجلدات الملفات المشتركة لكل تحليل
+
+    يُنشأ مجلد لكل تحليل ويُحذف بانتهائه، فلا تبقى الملفات بعد تحرير حجز ذاكرته.
+    تكون المشاركة مفيدة في وضع العمليات فقط، فهي معطلة افتراضياً في وضع الخيوط.
+    """
+
+    def __init__(self, directory: str = None, enabled: Optional[bool] = None):
+        config = PERFORMANCE_CONFIG["shared_frames"]
+        self.directory = Path(directory or config["directory"])
+        if enabled is None:
+            setting = str(config["enabled"]).lower()
+            if setting == "auto":
+                enabled = PERFORMANCE_CONFIG["executor_type"] == "process"
+            else:
+                enabled = setting == "true"
+        self.enabled = enabled
+        self.active = 0
+
+        if self.enabled:
+            # ملفات تحليلات لم تكتمل قبل إعادة تشغيل الخدمة
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    @asynccontextmanager
+    async def scope(self, analysis_id: str) -> AsyncIterator[Optional[str]]:
+        """مجلد الملفات المشتركة للتحليل طوال مدته (None إذا كانت المشاركة معطلة)"""
+        if not self.enabled:
+            yield None
+            return
+
+        path = self.directory / analysis_id
+        path.mkdir(parents=True, exist_ok=True)
+        self.active += 1
+        try:
+            yield str(path)
+        finally:
+            self.active -= 1
+            # الملفات المفتوحة لدى العمال تبقى صالحة حتى إغلاقها بعد حذف أسمائها
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, shutil.rmtree, path, True)
+
+    def get_status(self):
+        """حالة الملفات المشتركة"""
+        return {
+            "enabled": self.enabled,
+            "directory": str(self.directory),
+            "active_analyses": self.active
+        }
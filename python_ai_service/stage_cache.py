@@ -0,0 +1,167 @@
+# تخزين مؤقت لمخرجات مراحل التحليل على القرص بمفاتيح المحتوى
+# Content-addressed On-disk Cache for Stage Outputs
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+from config import PERFORMANCE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# قيمة تميز غياب المدخل عن مخرج قيمته None
+MISSING = object()
+
+
+def hash_parts(*parts: Any) -> str:
+    """مفتاح محتوى من أجزاء قابلة للتحويل إلى JSON"""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """تجزئة محتوى الملف (لا اسمه)، فيُتعرف على الرسم نفسه عند إعادة رفعه"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StageCache:
+    """تخزين مخرجات المراحل على القرص
+
+    المفتاح يشتقه المجدول من مفاتيح مدخلات المرحلة واسمها وإصدارها (شجرة Merkle جذرها
+    تجزئة الملف المرفوع)، فأي تغيير في الملف أو الإعدادات أو النموذج ينتج مفتاحاً جديداً.
+    يُعتبر المدخل منتهياً بعد cache_duration من إنشائه، وتُحذف المدخلات الأقدم استخداماً
+    (LRU) عند تجاوز الحجم الأقصى. وقت تعديل الملف هو وقت الإنشاء ووقت الوصول هو آخر استخدام.
+    """
+
+    def __init__(self, directory: str = None, max_size_bytes: int = None, ttl: float = None):
+        self.directory = Path(directory or PERFORMANCE_CONFIG["cache_dir"])
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_bytes or PERFORMANCE_CONFIG["cache_max_size_mb"] * 1024 * 1024
+        self.ttl = ttl or PERFORMANCE_CONFIG["cache_duration"]
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Tuple[int, float]] = {}  # المفتاح -> (الحجم، آخر استخدام)
+        self._lock = threading.Lock()
+        self._scan()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pkl"
+
+    def _scan(self):
+        """بناء الفهرس من الملفات الموجودة (تبقى الذاكرة المؤقتة بعد إعادة تشغيل الخدمة)"""
+        for path in self.directory.glob("*.pkl"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            self._entries[path.stem] = (stat.st_size, stat.st_atime)
+            self.total_bytes += stat.st_size
+        self._evict()
+
+    def contains(self, key: str) -> bool:
+        """هل المفتاح مخزن (دون قراءة قيمته أو التحقق من صلاحيتها)"""
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        """قراءة مخرج مخزن، أو default إذا لم يوجد أو انتهت صلاحيته"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+        path = self._path(key)
+        try:
+            stat = path.stat()
+            if time.time() - stat.st_mtime > self.ttl:
+                self._remove(key, miss=True)
+                return default
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            now = time.time()
+            os.utime(path, (now, stat.st_mtime))
+        except Exception as e:
+            logger.warning(f"تعذر قراءة المخرج المخزن {key}: {str(e)}")
+            self._remove(key, miss=True)
+            return default
+
+        # العدادات تُحدث تحت القفل لأن get تُستدعى من عدة خيوط
+        with self._lock:
+            if key in self._entries:
+                self._entries[key] = (entry[0], now)
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any):
+        """تخزين مخرج (الكتابة إلى ملف مؤقت ثم استبداله حتى لا يُقرأ ملف ناقص)"""
+        path = self._path(key)
+        temp_path = path.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(temp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+            size = path.stat().st_size
+        except Exception as e:
+            logger.warning(f"تعذر تخزين المخرج {key}: {str(e)}")
+            temp_path.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None:
+                self.total_bytes -= previous[0]
+            self._entries[key] = (size, time.time())
+            self.total_bytes += size
+        self._evict()
+
+    def _remove(self, key: str, miss: bool = False):
+        """حذف مدخل من الفهرس والقرص (مع احتساب الحذف فشلاً في القراءة إذا طُلب)"""
+        with self._lock:
+            if miss:
+                self.misses += 1
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.total_bytes -= entry[0]
+        self._path(key).unlink(missing_ok=True)
+
+    def _evict(self):
+        """حذف الأقدم استخداماً حتى يعود الحجم تحت الحد الأقصى"""
+        with self._lock:
+            if self.total_bytes <= self.max_size_bytes:
+                return
+            by_last_use = sorted(self._entries.items(), key=lambda item: item[1][1])
+            evicted = []
+            for key, (size, _) in by_last_use:
+                if self.total_bytes <= self.max_size_bytes:
+                    break
+                del self._entries[key]
+                self.total_bytes -= size
+                evicted.append(key)
+
+        for key in evicted:
+            self._path(key).unlink(missing_ok=True)
+        logger.info(f"تم حذف {len(evicted)} مخرج من الذاكرة المؤقتة للمراحل")
+
+    def get_status(self) -> Dict[str, Any]:
+        """حالة الذاكرة المؤقتة للمراقبة"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_mb": round(self.total_bytes / 2**20, 1),
+                "max_size_mb": round(self.max_size_bytes / 2**20, 1),
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses
+            }
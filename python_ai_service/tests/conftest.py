@@ -0,0 +1,6 @@
+# إعدادات اختبارات خدمة التحليل
+import sys
+from pathlib import Path
+
+# وحدات الخدمة مسطحة في مجلدها فيُضاف إلى المسار كما تفعل أدوات القياس
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
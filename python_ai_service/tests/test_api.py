@@ -0,0 +1,160 @@
+# اختبارات واجهة برمجة التطبيقات
+import asyncio
+
+import pytest
+
+# الواجهة تحمّل المحلل الرئيسي بنماذجه، فتُتخطى الاختبارات إذا لم تكن مكتباته مثبتة
+for module in ("httpx", "imageio", "torch", "ultralytics", "pytesseract", "easyocr", "paddleocr"):
+    pytest.importorskip(module)
+
+import io
+import os
+import tempfile
+import zipfile
+
+import cv2
+import httpx
+import numpy as np
+
+import config
+
+# الذاكرة المؤقتة للمراحل وفهرس البصمات خارج مجلد مخرجات الخدمة
+_state_dir = tempfile.mkdtemp(prefix="safe-egypt-tests-")
+config.PERFORMANCE_CONFIG["cache_dir"] = f"{_state_dir}/stage_cache"
+config.PERFORMANCE_CONFIG["near_duplicates"]["index_path"] = f"{_state_dir}/fingerprints.db"
+
+import api
+from models import AnalysisStatus
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(api, "OUTPUT_DIR", tmp_path)
+    yield api
+    for registry in (api.active_analyses, api.analysis_tasks, api.event_streams, api.batch_analyses):
+        registry.clear()
+
+
+def _png() -> bytes:
+    _, encoded = cv2.imencode(".png", np.full((200, 300, 3), 255, np.uint8))
+    return encoded.tobytes()
+
+
+def test_cancel_running_batch(service, monkeypatch):
+    """إلغاء دفعة جارية يلغي مهمتها ويُنهي جميع ملفاتها غير المكتملة بحدث نهائي"""
+    started = asyncio.Event()
+    cancelled = []
+
+    async def analyze_batch(file_paths, building_type, project_info, on_result=None):
+        # الملف الأول يكتمل ثم تبقى الدفعة جارية حتى تُلغى
+        await on_result(0, service.analyzer._create_error_result("done", file_paths[0], ""), True)
+        started.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    monkeypatch.setattr(service.analyzer, "analyze_batch", analyze_batch)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            files = [("files", (f"plan{i}.png", _png(), "image/png")) for i in range(3)]
+            batch = (await client.post("/analyze/batch", files=files)).json()
+            await asyncio.wait_for(started.wait(), 5)
+
+            response = await client.post(f"/analysis/{batch['batch_id']}/cancel")
+            await asyncio.sleep(0.1)
+            status = (await client.get(f"/analyze/batch/{batch['batch_id']}")).json()
+            members = [(await client.get(f"/analysis/{request_id}")).json()["status"]
+                       for request_id in batch["request_ids"]]
+            terminal = [service.event_streams[request_id].history[-1]["event"]
+                        for request_id in batch["request_ids"]]
+            return response, status, members, terminal
+
+    response, status, members, terminal = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert cancelled == [True]
+    assert status["status"] == AnalysisStatus.CANCELLED
+    assert members == [AnalysisStatus.COMPLETED, AnalysisStatus.CANCELLED, AnalysisStatus.CANCELLED]
+    assert terminal == ["completed", "cancelled", "cancelled"]
+
+
+def test_cancel_batch_member_cancels_batch(service, monkeypatch):
+    """إلغاء ملف من دفعة جارية يلغي الدفعة التي يُحلل فيها"""
+    started = asyncio.Event()
+
+    async def analyze_batch(file_paths, building_type, project_info, on_result=None):
+        started.set()
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(service.analyzer, "analyze_batch", analyze_batch)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            files = [("files", (f"plan{i}.png", _png(), "image/png")) for i in range(2)]
+            batch = (await client.post("/analyze/batch", files=files)).json()
+            await asyncio.wait_for(started.wait(), 5)
+
+            response = await client.post(f"/analysis/{batch['request_ids'][1]}/cancel")
+            await asyncio.sleep(0.1)
+            return response, batch["batch_id"]
+
+    response, batch_id = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert service.batch_analyses[batch_id]["status"] == AnalysisStatus.CANCELLED
+    assert batch_id not in service.analysis_tasks
+
+
+def _post_batch(service, files):
+    async def scenario():
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/analyze/batch", files=files)
+
+    return asyncio.run(scenario())
+
+
+def test_batch_rejects_corrupt_file(service, tmp_path):
+    """ملف تالف في الدفعة يرفضها باسمه قبل بدء أي تحليل دون ترك ملفات مرفوعة"""
+    files = [("files", ("plan.png", _png(), "image/png")),
+             ("files", ("broken.png", b"not an image", "image/png"))]
+
+    response = _post_batch(service, files)
+
+    assert response.status_code == 400
+    assert "broken.png" in response.json()["detail"]
+    assert not service.batch_analyses
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_batch_archive_members_copied_whole(service, tmp_path, monkeypatch):
+    """أعضاء الأرشيف تُنسخ كاملة، والعضو الذي يتجاوز الحد يرفض الأرشيف دون ترك ملفات"""
+    monkeypatch.setattr(service.analyzer, "analyze_batch", lambda *args, **kwargs: asyncio.sleep(60))
+    plan = _png()
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("plans/first.png", plan)
+        zf.writestr("plans/second.png", plan)
+        zf.writestr("plans/large.png", plan + bytes(16))
+
+    response = _post_batch(service, [("files", ("plans.zip", archive.getvalue(), "application/zip"))])
+
+    assert response.status_code == 200
+    saved = [service.active_analyses[request_id]["file_path"]
+             for request_id in response.json()["request_ids"]]
+    assert [open(path, "rb").read() for path in saved] == [plan, plan, plan + bytes(16)]
+
+    for path in saved:
+        os.unlink(path)
+    monkeypatch.setitem(service.IMAGE_PROCESSING, "max_file_size", len(plan))
+    response = _post_batch(service, [("files", ("plans.zip", archive.getvalue(), "application/zip"))])
+
+    assert response.status_code == 400
+    assert "large.png" in response.json()["detail"]
+    assert list(tmp_path.iterdir()) == []
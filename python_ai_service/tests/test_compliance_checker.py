@@ -0,0 +1,74 @@
+# اختبارات فاحص الامتثال
+import pytest
+
+shapely = pytest.importorskip("shapely")
+
+from compliance_checker import ComplianceChecker
+from geometry_engine import FloorPlan
+from models import BoundingBox, DetectedElement, ElementType, ExtractedText
+
+
+def _element(element_type, x, y, width, height, scale):
+    return DetectedElement(type=element_type, name=element_type.value, confidence=0.9,
+                           bounding_box=BoundingBox(x=x * scale, y=y * scale,
+                                                    width=width * scale, height=height * scale))
+
+
+def _check_plan(dpi, texts=()):
+    """الرسم نفسه محملاً بدقة dpi (إحداثياته بالبكسل تتناسب مع الدقة)"""
+    scale = dpi / 300
+    elements = [
+        _element(ElementType.ROOM, 0, 0, 2000, 1000, scale),
+        _element(ElementType.SMOKE_DETECTOR, 900, 400, 40, 40, scale),
+        _element(ElementType.EMERGENCY_EXIT, 5000, 400, 120, 40, scale),
+    ]
+    floor_plan = FloorPlan(rooms=[shapely.box(0, 0, 2000 * scale, 1000 * scale)])
+    checker = ComplianceChecker()
+    issues = checker.check_compliance(elements, list(texts), (int(6000 * scale), int(3000 * scale)),
+                                      floor_plan=floor_plan, dpi=dpi)
+    return checker._calculate_total_area(elements), issues
+
+
+def _verdict(issues):
+    return sorted((issue.rule_id, issue.description, tuple(issue.evidence)) for issue in issues)
+
+
+def test_areas_and_verdicts_independent_of_dpi():
+    """الرسم نفسه بدقتي تحويل مختلفتين يعطي المساحة والمخالفات نفسها"""
+    area_300, issues_300 = _check_plan(300)
+    area_150, issues_150 = _check_plan(150)
+
+    # 2000×1000 بكسل بدقة 300 ومقياس 1:100 الافتراضي = 16.93 × 8.47 متر
+    assert area_300 == pytest.approx(143.4, abs=0.1)
+    assert area_150 == pytest.approx(area_300)
+    assert _verdict(issues_150) == _verdict(issues_300)
+
+
+def test_drawing_scale_from_texts():
+    """مقياس الرسم المكتوب يحدد طول البكسل بالأمتار"""
+    scale_text = ExtractedText(text="مقياس 1:50", confidence=0.9,
+                               bounding_box=BoundingBox(x=0, y=0, width=10, height=10))
+    area_default, _ = _check_plan(300)
+    area_half, _ = _check_plan(200, [scale_text])
+
+    assert area_half == pytest.approx(area_default / 4)
+
+
+def _texts(*values):
+    return [ExtractedText(text=value, confidence=0.9, bounding_box=BoundingBox(x=0, y=0, width=10, height=10))
+            for value in values]
+
+
+@pytest.mark.parametrize("values, expected", [
+    (("11:30",), 100),
+    (("time 1:30:00",), 100),
+    (("1:3 slope",), 100),
+    (("12.1:50",), 100),
+    (("meeting 11:30", "1:50"), 50),
+    (("1:200", "Scale 1:50"), 50),
+    (("scale 1:30",), 30),
+    (("5:1",), 0.2),
+])
+def test_drawing_scale_ignores_times_and_dimensions(values, expected):
+    """الأوقات والأبعاد والنسب غير الشائعة لا تُقرأ كمقياس، والمسبوق بكلمة المقياس يتقدم"""
+    assert ComplianceChecker()._find_drawing_scale(_texts(*values)) == pytest.approx(expected)
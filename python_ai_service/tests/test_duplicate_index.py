@@ -0,0 +1,53 @@
+# اختبارات فهرس البصمات للرسومات شبه المكررة
+import time
+import types
+
+import pytest
+
+import duplicate_index
+from duplicate_index import DuplicateIndex
+
+FINGERPRINT = 0x0123456789ABCDEF
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """ساعة يتحكم فيها الاختبار لأوقات تسجيل البصمات"""
+    now = [time.time()]
+    monkeypatch.setattr(duplicate_index, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = DuplicateIndex(str(tmp_path / "fingerprints.db"), max_distance=4,
+                           max_size_difference=0.02, ttl=3600)
+    yield index
+    index.close()
+
+
+def test_finds_near_duplicate(index, clock):
+    """بصمة على مسافة Hamming صغيرة وبأبعاد متقاربة تُعاد، والبعيدة أو الأكبر حجماً لا تُعاد"""
+    index.add("plan-a", 0, FINGERPRINT, 3000, 2000)
+    index.add("plan-b", 0, FINGERPRINT ^ 0xFF, 3000, 2000)
+    index.add("plan-c", 0, FINGERPRINT, 4000, 2000)
+
+    matches = index.find(FINGERPRINT ^ 0b101, 3010, 1995)
+
+    assert [(match.file_key, match.distance) for match in matches] == [("plan-a", 2)]
+    assert index.find(FINGERPRINT, 3000, 2000, exclude_key="plan-a") == []
+
+
+def test_expired_fingerprints_are_ignored_and_pruned(index, clock):
+    """البصمة الأقدم من ttl لا تُعاد لأن مخرجاتها انتهت، وتُحذف صفوفها عند الإضافة التالية"""
+    index.add("old-plan", 0, FINGERPRINT, 3000, 2000)
+    clock[0] += 3601
+
+    assert index.find(FINGERPRINT, 3000, 2000) == []
+
+    index.add("new-plan", 0, FINGERPRINT, 3000, 2000)
+
+    assert [match.file_key for match in index.find(FINGERPRINT, 3000, 2000)] == ["new-plan"]
+    assert index.get_status()["entries"] == 1
+    bands = index._connection.execute("SELECT DISTINCT file_key FROM bands").fetchall()
+    assert bands == [("new-plan",)]
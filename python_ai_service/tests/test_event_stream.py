@@ -0,0 +1,34 @@
+# اختبارات قنوات أحداث التحليل
+import asyncio
+
+from event_stream import AnalysisEventStream
+
+
+async def _collect(stream):
+    return [message async for message in stream.subscribe(keepalive=None)]
+
+
+def test_close_keeps_only_terminal_event():
+    """بعد الإغلاق لا يحتفظ السجل بالنتائج الجزئية، والمشترك المتأخر يستلم الحدث النهائي"""
+    stream = AnalysisEventStream()
+    stream.publish("stage_completed", {"outputs": {"detected_elements": [1, 2, 3]}})
+    stream.close("completed", {"status": "completed"})
+
+    assert stream.history == [{"event": "completed", "data": {"status": "completed"}}]
+    assert asyncio.run(_collect(stream)) == ['event: completed\ndata: {"status": "completed"}\n\n']
+
+
+def test_subscriber_receives_full_stream_before_close():
+    """المشترك النشط يستلم جميع الأحداث حتى الحدث النهائي"""
+    async def scenario():
+        stream = AnalysisEventStream()
+        stream.publish("stage_started", {"stage": "load_image"})
+        subscriber = asyncio.create_task(_collect(stream))
+        await asyncio.sleep(0)
+        stream.publish("stage_completed", {"stage": "load_image"})
+        stream.close("completed", {})
+        return await subscriber
+
+    messages = asyncio.run(scenario())
+    assert [message.split("\n")[0] for message in messages] == [
+        "event: stage_started", "event: stage_completed", "event: completed"]
@@ -0,0 +1,55 @@
+# اختبارات الأشكال الهندسية ودمج القطع
+import numpy as np
+
+from geometric_shapes import GeometricShapes, merge_collinear_segments
+
+
+def _sorted(segments):
+    """القطع بنهايات مرتبة ثم مرتبة فيما بينها للمقارنة دون اعتبار الاتجاه"""
+    segments = np.round(np.asarray(segments, np.float64).reshape(-1, 4))
+    swap = (segments[:, 0] > segments[:, 2]) | ((segments[:, 0] == segments[:, 2]) & (segments[:, 1] > segments[:, 3]))
+    segments[swap] = segments[swap][:, [2, 3, 0, 1]]
+    return segments[np.lexsort(segments.T[::-1])]
+
+
+def test_collinear_overlapping_segments_merge():
+    """القطع المتداخلة على خط واحد تُدمج، ومنها المعكوسة الاتجاه والرأسية"""
+    segments = np.array([
+        (0, 0, 100, 0),
+        (180, 0, 80, 0),  # معكوسة الاتجاه (زاوية π)
+        (175, 1, 200, 1),  # فرق عمودي ضمن distance_tolerance وفجوة ضمن gap
+        (300, 0, 300, 120),
+        (300, 110, 300, 250),
+    ], np.float64)
+
+    merged = merge_collinear_segments(segments)
+
+    assert merged.dtype == np.float32
+    np.testing.assert_allclose(_sorted(merged), [(0, 0, 200, 0), (300, 0, 300, 250)], atol=1.0)
+
+
+def test_parallel_offset_segments_stay_separate():
+    """القطع المتوازية البعيدة عمودياً والقطع على خط واحد بفجوة كبيرة لا تُدمج"""
+    segments = np.array([
+        (0, 0, 100, 0),
+        (0, 20, 100, 20),
+        (130, 0, 200, 0),  # فجوة 30 أكبر من gap
+    ], np.float64)
+
+    merged = merge_collinear_segments(segments)
+
+    np.testing.assert_array_equal(_sorted(merged), _sorted(segments))
+
+
+def test_empty_input_returns_empty_columns():
+    """عدم وجود قطع ينتج مصفوفات فارغة بالأشكال الصحيحة"""
+    merged = merge_collinear_segments(np.zeros((0, 4)))
+    shapes = GeometricShapes.create(merged)
+
+    assert merged.shape == (0, 4) and merged.dtype == np.float32
+    assert shapes.segments.shape == (0, 4)
+    assert shapes.lengths.shape == (0,)
+    assert shapes.circle_centers.shape == (0, 2)
+    assert shapes.polygon_offsets.tolist() == [0]
+    assert len(shapes) == 0
+    assert shapes.to_dicts() == []
@@ -0,0 +1,65 @@
+# اختبارات استخراج الجدران والغرف
+import numpy as np
+import pytest
+
+pytest.importorskip("shapely")
+
+from geometry_engine import GeometryEngine, _endpoint_clusters
+
+# مستطيل 400×300 يقسمه جدار عند x = 200 إلى غرفتين 200×300
+OUTLINE = [
+    (0, 0, 400, 0),
+    (400, 0, 400, 300),
+    (400, 300, 0, 300),
+    (0, 300, 0, 0),
+]
+PARTITION = (200, 0, 200, 300)
+
+
+def _areas(plan):
+    return sorted(round(area) for area in plan.room_areas)
+
+
+def test_rectangle_plan_rooms():
+    """الجدار الفاصل يقسم المستطيل إلى غرفتين، ولا يُحتسب الوجه المحيط بهما"""
+    plan = GeometryEngine().extract(np.array(OUTLINE + [PARTITION], np.float64))
+
+    assert len(plan.rooms) == 2
+    assert _areas(plan) == [60000, 60000]
+    assert plan.total_area == pytest.approx(120000)
+    assert (plan.wall_count, plan.node_count) == (5, 6)
+
+
+def test_nearby_endpoints_are_snapped():
+    """النهايات التي لا تلتقي تماماً (ضمن مسافة الالتقاط) تُدمج في عقدة واحدة"""
+    jitter = np.array([
+        (0, 0, 397, 3),
+        (403, -2, 400, 305),
+        (396, 300, -4, 297),
+        (2, 302, 0, 0),
+    ], np.float64)
+
+    plan = GeometryEngine().extract(jitter)
+
+    assert len(plan.rooms) == 1
+    assert plan.node_count == 4
+    assert plan.total_area == pytest.approx(120000, rel=0.02)
+
+
+def test_short_partition_is_extended_to_the_wall():
+    """الجدار الفاصل الذي يتوقف قبل الجدار المقابل (وصلة T ناقصة) يُمدد ليغلق الغرفتين"""
+    plan = GeometryEngine().extract(np.array(OUTLINE + [(200, 5, 200, 294)], np.float64))
+
+    assert len(plan.rooms) == 2
+    assert _areas(plan) == [60000, 60000]
+
+
+def test_endpoint_clusters_chain_within_tolerance():
+    """النقاط المتقاربة تتجمع عبر السلاسل وعبر حدود خلايا الشبكة، والبعيدة تبقى منفصلة"""
+    points = np.array([(0, 0), (7, 0), (14, 0), (100, 100), (107.5, 100), (300, 300)], np.float64)
+
+    labels = _endpoint_clusters(points, 8.0)
+
+    assert labels[0] == labels[1] == labels[2]
+    assert labels[3] == labels[4]
+    assert len({labels[0], labels[3], labels[5]}) == 3
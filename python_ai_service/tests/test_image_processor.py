@@ -0,0 +1,66 @@
+# اختبارات معالج الصور
+import numpy as np
+import pytest
+
+pytest.importorskip("imageio")
+
+import cv2
+from PIL import Image, ImageEnhance
+
+from image_processor import ImageProcessor
+
+# أقصى فرق مسموح به عن مسار PIL (لكل بكسل، ومتوسطاً على الصورة)
+MAX_ABS_DIFFERENCE = 3
+MAX_MEAN_DIFFERENCE = 0.5
+
+
+def enhance_with_pil(image: np.ndarray) -> np.ndarray:
+    """المسار السابق: ثلاث تمريرات ImageEnhance"""
+    pil_image = Image.fromarray(image)
+    pil_image = ImageEnhance.Contrast(pil_image).enhance(1.2)
+    pil_image = ImageEnhance.Sharpness(pil_image).enhance(1.1)
+    pil_image = ImageEnhance.Brightness(pil_image).enhance(1.05)
+    return np.array(pil_image)
+
+
+def _drawing() -> np.ndarray:
+    image = np.full((300, 400, 3), 255, np.uint8)
+    for y in range(20, 300, 30):
+        cv2.line(image, (10, y), (390, y), (0, 0, 0), 2)
+    cv2.rectangle(image, (60, 60), (220, 200), (90, 90, 90), 3)
+    cv2.putText(image, "ROOM 12", (80, 150), cv2.FONT_HERSHEY_SIMPLEX, 1, (40, 40, 200), 2)
+    return image
+
+
+def _gradient() -> np.ndarray:
+    ramp = np.tile(np.linspace(0, 255, 401).astype(np.uint8), (300, 1))
+    return np.dstack([ramp, ramp[:, ::-1], ramp])
+
+
+def _noise(low: int, high: int) -> np.ndarray:
+    return np.random.default_rng(0).integers(low, high, (300, 401, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("image", [
+    _drawing(),
+    _drawing()[:, :, 0].copy(),
+    _gradient(),
+    _noise(0, 256),
+    _noise(100, 140),
+], ids=["drawing", "grayscale", "gradient", "noise", "low-contrast-noise"])
+def test_enhance_image_matches_pil(image):
+    """مسار OpenCV المدمج يبقى ضمن الفروق المسموحة عن تمريرات ImageEnhance الثلاث"""
+    difference = np.abs(enhance_with_pil(image).astype(np.int16) - ImageProcessor()._enhance_image(image))
+
+    assert difference.max() <= MAX_ABS_DIFFERENCE
+    assert difference.mean() <= MAX_MEAN_DIFFERENCE
+
+
+def test_tiled_preprocessing_matches_whole_image():
+    """التحسين وإزالة الضوضاء على بلاطات يطابقان المعالجة الكاملة بما فيها متوسط الإضاءة"""
+    processor = ImageProcessor()
+    processor.tiling_config = dict(processor.tiling_config, tile_size=256)
+    image = np.vstack([_noise(0, 256), _noise(100, 140)])
+    image = np.ascontiguousarray(np.hstack([image, image[:, :299]]))
+
+    assert np.array_equal(processor._enhance_and_denoise_tiled(image), processor._enhance_and_denoise(image))
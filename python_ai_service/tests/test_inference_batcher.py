@@ -0,0 +1,118 @@
+# اختبارات تجميع طلبات الاستدلال
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from inference_batcher import MicroBatcher
+
+
+class _GatedModel:
+    """نموذج بديل: الدفعة الأولى تنتظر حتى تُفتح البوابة، فتتراكم الطلبات التالية في الطابور"""
+
+    def __init__(self, error=None):
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.batches = []
+        self.error = error
+
+    def __call__(self, items):
+        if not self.batches:
+            self.started.set()
+            self.gate.wait(5)
+        self.batches.append(list(items))
+        if self.error is not None and len(self.batches) > 1:
+            raise self.error
+        return [item * 10 for item in items]
+
+
+def _submit_behind_first(batcher, model, items):
+    """طلب أول يشغل النموذج ثم طلبات متزامنة من مستدعين مختلفين تنتظر خلفه"""
+    executor = ThreadPoolExecutor(len(items) + 1)
+    first = executor.submit(batcher.submit, 0)
+    assert model.started.wait(5)
+    futures = [executor.submit(batcher.submit, item) for item in items]
+    deadline = time.time() + 5
+    while batcher._queue.qsize() < len(items) and time.time() < deadline:
+        time.sleep(0.001)
+    model.gate.set()
+    return executor, first, futures
+
+
+def test_concurrent_requests_share_a_batch():
+    """الطلبات المتزامنة من مستدعين مختلفين تخرج في دفعة واحدة وكل مستدعٍ يأخذ نتيجته"""
+    model = _GatedModel()
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=200)
+    try:
+        executor, first, futures = _submit_behind_first(batcher, model, [1, 2, 3])
+        results = [future.result(5) for future in futures]
+        executor.shutdown()
+    finally:
+        batcher.close()
+
+    assert first.result() == 0
+    assert results == [10, 20, 30]
+    assert [sorted(batch) for batch in model.batches] == [[0], [1, 2, 3]]
+    assert batcher.get_status()["batch_sizes"] == {1: 1, 3: 1}
+
+
+def test_batch_flushes_after_max_wait():
+    """الدفعة تُرسل بعد max_wait_ms إذا كان مستدعٍ آخر نشطاً لم يرسل طلبه بعد"""
+    model = _GatedModel()
+    model.gate.set()
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=50)
+    try:
+        # تحليل آخر نشط بين طلباته: الدفعة تنتظر طلبه حتى نهاية النافذة فقط
+        with batcher._stats_lock:
+            batcher._active_callers += 1
+        start = time.perf_counter()
+        result = batcher.submit(4)
+        waited = time.perf_counter() - start
+    finally:
+        batcher.close()
+
+    assert result == 40
+    assert 0.04 <= waited < 1.0
+    assert model.batches == [[4]]
+
+
+def test_single_caller_does_not_wait_for_window():
+    """المستدعي الوحيد لا يدفع زمن النافذة"""
+    model = _GatedModel()
+    model.gate.set()
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=2000)
+    try:
+        start = time.perf_counter()
+        assert batcher.submit(4) == 40
+        assert time.perf_counter() - start < 1.0
+    finally:
+        batcher.close()
+
+
+def test_inference_error_reaches_every_waiter():
+    """خطأ النموذج يصل إلى جميع مستدعي الدفعة ولا يوقف خيط الاستدلال"""
+    model = _GatedModel(error=ValueError("model failed"))
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=200)
+    try:
+        executor, first, futures = _submit_behind_first(batcher, model, [1, 2, 3])
+        errors = [future.exception(5) for future in futures]
+        executor.shutdown()
+        model.error = None
+        assert batcher.submit(5) == 50
+    finally:
+        batcher.close()
+
+    assert first.result() == 0
+    assert [sorted(batch) for batch in model.batches[:2]] == [[0], [1, 2, 3]]
+    assert all(isinstance(error, ValueError) for error in errors)
+
+
+def test_result_count_mismatch_is_an_error():
+    """نموذج يعيد عدداً خاطئاً من النتائج يفشل الدفعة بدلاً من خلط النتائج"""
+    batcher = MicroBatcher(lambda items: [], max_batch_size=8, max_wait_ms=0)
+    try:
+        with pytest.raises(RuntimeError):
+            batcher.submit(1)
+    finally:
+        batcher.close()
@@ -0,0 +1,42 @@
+# اختبارات قياس أداء المراحل
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from metrics import measure_call
+
+
+def _busy_helper_thread(seconds):
+    """مرحلة تنفذ عملها في خيط مساعد كما تفعل البلاطات"""
+    def spin():
+        end = time.thread_time() + seconds
+        while time.thread_time() < end:
+            pass
+
+    helper = threading.Thread(target=spin)
+    helper.start()
+    helper.join()
+
+
+def test_exclusive_cpu_time_includes_helper_threads():
+    """في العامل الحصري يُحتسب زمن معالج الخيوط المساعدة، وفي الخيط المشترك لا يُحتسب"""
+    _, exclusive = measure_call(_busy_helper_thread, {"seconds": 0.2}, exclusive=True)
+    _, shared = measure_call(_busy_helper_thread, {"seconds": 0.2})
+
+    assert exclusive.cpu_time >= 0.15
+    assert shared.cpu_time < 0.1
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="الذاكرة المقيمة تُقرأ من /proc")
+def test_memory_delta_tracks_retained_allocation():
+    """تغير الذاكرة المقيمة يعكس ما تحتفظ به المرحلة لا ذروة العملية السابقة"""
+    # ذروة سابقة كبيرة لا تُخفي ذاكرة المرحلة التالية
+    np.ones(64 * 2**20, np.uint8).sum()
+
+    result, metrics = measure_call(lambda size: np.ones(size, np.uint8), {"size": 32 * 2**20})
+
+    assert metrics.memory_delta >= 24 * 2**20
+    del result
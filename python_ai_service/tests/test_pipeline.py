@@ -0,0 +1,127 @@
+# اختبارات مجدول المراحل
+import asyncio
+import gc
+import weakref
+
+import numpy as np
+import pytest
+
+from models import AnalysisStatus
+from pipeline import PipelineScheduler, ResourceClass, StageExecutionError, StageSpec
+from worker_pool import WorkerPool
+
+
+def _stage(name, func, inputs, outputs, timeout=None):
+    return StageSpec(name=name, title=name, description=name, func=func,
+                     inputs=inputs, outputs=outputs, resource_class=ResourceClass.LIGHT,
+                     timeout=timeout)
+
+
+def _run(stages, inputs, requested_outputs=None):
+    pool = WorkerPool("thread", 1)
+    try:
+        return asyncio.run(PipelineScheduler(pool).run(stages, inputs, requested_outputs))
+    finally:
+        pool.shutdown()
+
+
+def test_independent_stages_overlap():
+    """المراحل المستقلة تعمل معاً، والمرحلة التابعة تنتظر انتهاء كلتيهما"""
+    running = set()
+    concurrent = []
+
+    def track(name):
+        async def stage(image):
+            running.add(name)
+            await asyncio.sleep(0.05)
+            concurrent.append(len(running))
+            running.discard(name)
+            return name
+        return stage
+
+    def combine(left, right):
+        assert not running
+        return f"{left}+{right}"
+
+    stages = [
+        _stage("left", track("left"), ["image"], ["left"]),
+        _stage("right", track("right"), ["image"], ["right"]),
+        _stage("combine", combine, ["left", "right"], ["combined"]),
+    ]
+
+    run = _run(stages, {"image": 1}, ["combined"])
+
+    assert run.outputs == {"combined": "left+right"}
+    assert concurrent[0] == 2
+    assert all(step.status == AnalysisStatus.COMPLETED for step in run.steps)
+
+
+def test_plan_orders_dependencies_and_skips_unneeded():
+    """التخطيط يرتب المراحل حسب اعتمادياتها ويتجاهل ما لا تحتاجه المخرجات المطلوبة"""
+    stages = [
+        _stage("report", str, ["rooms"], ["report"]),
+        _stage("rooms", str, ["edges"], ["rooms"]),
+        _stage("edges", str, ["image"], ["edges"]),
+        _stage("texts", str, ["image"], ["texts"]),
+    ]
+
+    planned = PipelineScheduler(None).plan(stages, ["image"], ["report"])
+
+    assert [stage.name for stage in planned] == ["edges", "rooms", "report"]
+
+
+def test_plan_rejects_cycles():
+    """الاعتماديات الدائرية تُكتشف عند التخطيط قبل تشغيل أي مرحلة"""
+    stages = [
+        _stage("a", str, ["image", "b"], ["a"]),
+        _stage("b", str, ["a"], ["b"]),
+    ]
+
+    with pytest.raises(ValueError):
+        PipelineScheduler(None).plan(stages, ["image"], ["b"])
+
+
+def test_stage_timeout_raises_stage_execution_error():
+    """تجاوز مهلة المرحلة يوقف التشغيل بخطأ يحمل اسمها وحالة خطواتها"""
+    async def slow(image):
+        await asyncio.sleep(5)
+
+    stages = [
+        _stage("slow", slow, ["image"], ["slow"], timeout=0.05),
+        _stage("after", str, ["slow"], ["after"]),
+    ]
+
+    with pytest.raises(StageExecutionError) as error:
+        _run(stages, {"image": 1}, ["after"])
+
+    assert error.value.stage == "slow"
+    statuses = {step.name: step.status for step in error.value.steps}
+    assert statuses == {"slow": AnalysisStatus.FAILED, "after": AnalysisStatus.PENDING}
+
+
+def test_input_buffer_released_after_last_consumer():
+    """الصورة الممررة كمدخل تُحرر بعد آخر مرحلة تستهلكها وقبل انتهاء التشغيل"""
+    image = np.ones((256, 256), np.uint8)
+    image_ref = weakref.ref(image)
+    alive_downstream = []
+
+    def shrink(image):
+        return image[::4, ::4].copy()
+
+    def measure(small):
+        gc.collect()
+        alive_downstream.append(image_ref() is not None)
+        return int(small.sum())
+
+    stages = [
+        _stage("shrink", shrink, ["image"], ["small"]),
+        _stage("measure", measure, ["small"], ["total"]),
+    ]
+    inputs = {"image": image}
+    del image
+
+    run = _run(stages, inputs, ["total"])
+
+    assert run.outputs == {"total": 64 * 64}
+    assert alive_downstream == [False]
+    assert inputs == {}
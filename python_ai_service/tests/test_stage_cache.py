@@ -0,0 +1,58 @@
+# اختبارات الذاكرة المؤقتة لمخرجات المراحل
+import time
+import types
+
+import pytest
+
+import stage_cache
+from stage_cache import MISSING, StageCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """ساعة يتحكم فيها الاختبار لأوقات الإنشاء والاستخدام"""
+    now = [time.time()]
+    monkeypatch.setattr(stage_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_expired_entry_is_a_miss(tmp_path, clock):
+    """المدخل الأقدم من ttl لا يُقرأ ويُحذف من القرص"""
+    cache = StageCache(str(tmp_path), ttl=60)
+    cache.put("fresh", {"rooms": 3})
+    assert cache.get("fresh") == {"rooms": 3}
+
+    clock[0] += 61
+
+    assert cache.get("fresh") is MISSING
+    assert not cache.contains("fresh")
+    assert list(tmp_path.iterdir()) == []
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    """تجاوز الحجم الأقصى يحذف الأقدم استخداماً لا الأقدم إنشاءً"""
+    cache = StageCache(str(tmp_path), max_size_bytes=2500, ttl=3600)
+    for key in ("first", "second"):
+        cache.put(key, bytes(1000))
+        clock[0] += 1
+    cache.get("first")
+    clock[0] += 1
+
+    cache.put("third", bytes(1000))
+
+    assert [cache.contains(key) for key in ("first", "second", "third")] == [True, False, True]
+    assert cache.total_bytes <= 2500
+    assert sorted(path.stem for path in tmp_path.iterdir()) == ["first", "third"]
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    """ملف تالف يُعامل كغياب للمدخل ويُحذف بدلاً من إفشال المرحلة"""
+    cache = StageCache(str(tmp_path), ttl=3600)
+    cache.put("broken", [1, 2, 3])
+    (tmp_path / "broken.pkl").write_bytes(b"not a pickle")
+
+    assert cache.get("broken", None) is None
+    assert not cache.contains("broken")
+    assert not (tmp_path / "broken.pkl").exists()
+    assert cache.get_status()["misses"] == 1
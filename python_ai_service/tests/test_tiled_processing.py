@@ -0,0 +1,45 @@
+# اختبارات المعالجة على بلاطات
+import os
+
+import cv2
+import numpy as np
+
+import tiled_processing
+from config import IMAGE_PROCESSING, PERFORMANCE_CONFIG
+
+
+def test_tile_workers_split_across_worker_processes(monkeypatch):
+    """في وضع العمليات لا يتجاوز مجموع خيوط البلاطات في جميع العمال عدد المعالجات"""
+    monkeypatch.setitem(IMAGE_PROCESSING["tiling"], "workers", 0)
+    monkeypatch.setitem(PERFORMANCE_CONFIG, "max_concurrent_analyses", 4)
+    monkeypatch.setattr(os, "cpu_count", lambda: 16)
+
+    monkeypatch.setitem(PERFORMANCE_CONFIG, "executor_type", "process")
+    assert tiled_processing._tile_workers() == 4
+
+    monkeypatch.setitem(PERFORMANCE_CONFIG, "max_concurrent_analyses", 32)
+    assert tiled_processing._tile_workers() == 1
+
+    monkeypatch.setitem(PERFORMANCE_CONFIG, "executor_type", "thread")
+    assert tiled_processing._tile_workers() == 16
+
+    monkeypatch.setitem(IMAGE_PROCESSING["tiling"], "workers", 3)
+    assert tiled_processing._tile_workers() == 3
+
+
+def test_process_tiled_matches_whole_image():
+    """الناتج على بلاطات يطابق المعالجة على الصورة كاملة بايتاً بايتاً عند حدود البلاطات
+
+    الأبعاد ليست مضاعفاً لحجم البلاطة، ونصف قطر المعالجة (2 + 1) يعبر حدودها ضمن الهامش.
+    """
+    image = np.random.default_rng(0).integers(0, 256, (1000, 1500, 3), dtype=np.uint8)
+    cv2.line(image, (0, 255), (1499, 258), (0, 0, 0), 3)
+    cv2.line(image, (511, 0), (513, 999), (255, 255, 255), 3)
+
+    def local(region):
+        return cv2.medianBlur(cv2.GaussianBlur(region, (5, 5), 0), 3)
+
+    tiled = tiled_processing.process_tiled(image, local, tile_size=256, halo=3)
+
+    assert tiled.dtype == image.dtype
+    assert np.array_equal(tiled, local(image))
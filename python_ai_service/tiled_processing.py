@@ -0,0 +1,125 @@
+# معالجة الصور الكبيرة على بلاطات متوازية
+# Tiled Parallel Processing for Large Drawings
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+
+from config import IMAGE_PROCESSING, PERFORMANCE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# مجمع خيوط البلاطات في العملية الحالية (دوال OpenCV وPIL تحرر GIL أثناء التنفيذ)
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+@dataclass
+class Tile:
+    """بلاطة من الصورة
+
+    المنطقة الداخلية (y0:y1, x0:x1) هي ما يُكتب في الناتج، والمنطقة الموسعة بالهامش
+    (hy0:hy1, hx0:hx1) هي ما يُقرأ من المدخل حتى تُحسب المرشحات المكانية عند حواف
+    البلاطة كما تُحسب على الصورة كاملة.
+    """
+    y0: int
+    y1: int
+    x0: int
+    x1: int
+    hy0: int
+    hy1: int
+    hx0: int
+    hx1: int
+
+    @property
+    def halo_region(self):
+        """مقطع المنطقة الموسعة في الصورة"""
+        return slice(self.hy0, self.hy1), slice(self.hx0, self.hx1)
+
+    @property
+    def inner_region(self):
+        """مقطع المنطقة الداخلية في الصورة"""
+        return slice(self.y0, self.y1), slice(self.x0, self.x1)
+
+    @property
+    def inner_in_halo(self):
+        """مقطع المنطقة الداخلية داخل ناتج المنطقة الموسعة"""
+        return (slice(self.y0 - self.hy0, self.y1 - self.hy0),
+                slice(self.x0 - self.hx0, self.x1 - self.hx0))
+
+
+def split_tiles(height: int, width: int, tile_size: int, halo: int) -> List[Tile]:
+    """تقسيم الصورة إلى بلاطات متجاورة مع هامش تداخل لا يتجاوز حدود الصورة"""
+    tiles = []
+    for y0 in range(0, height, tile_size):
+        y1 = min(y0 + tile_size, height)
+        for x0 in range(0, width, tile_size):
+            x1 = min(x0 + tile_size, width)
+            tiles.append(Tile(
+                y0, y1, x0, x1,
+                max(y0 - halo, 0), min(y1 + halo, height),
+                max(x0 - halo, 0), min(x1 + halo, width)
+            ))
+    return tiles
+
+
+def _tile_workers() -> int:
+    """عدد خيوط البلاطات في العملية الحالية
+
+    في وضع العمليات ينشئ كل عامل مجمع بلاطاته، فتُقسم المعالجات على عدد العمال حتى
+    لا يتجاوز مجموع الخيوط عدد المعالجات. في وضع الخيوط يشترك الجميع في مجمع واحد.
+    """
+    workers = IMAGE_PROCESSING["tiling"]["workers"]
+    if workers > 0:
+        return workers
+    cpus = os.cpu_count() or 1
+    if PERFORMANCE_CONFIG["executor_type"] == "process":
+        return max(1, cpus // PERFORMANCE_CONFIG["max_concurrent_analyses"])
+    return cpus
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """مجمع خيوط البلاطات (يُنشأ عند أول استخدام في كل عملية)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = _tile_workers()
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tile")
+            logger.info(f"تم إنشاء مجمع البلاطات بعدد {workers} خيط")
+    return _executor
+
+
+def map_tiles(func: Callable[[Tile], Any], tiles: List[Tile]) -> List[Any]:
+    """تنفيذ دالة على كل بلاطة بالتوازي مع الحفاظ على الترتيب"""
+    if len(tiles) == 1:
+        return [func(tiles[0])]
+    return list(_get_executor().map(func, tiles))
+
+
+def process_tiled(image: np.ndarray, func: Callable[[np.ndarray], np.ndarray],
+                  tile_size: int, halo: int) -> np.ndarray:
+    """تطبيق معالجة محلية على الصورة بلاطةً بلاطة وتجميع الناتج
+
+    يجب ألا يتجاوز نصف قطر المعالجة (مجموع أنصاف أقطار مرشحاتها) قيمة halo حتى
+    يطابق الناتج تطبيق func على الصورة كاملة، وأن تحافظ func على أبعاد مدخلها.
+    """
+    height, width = image.shape[:2]
+    tiles = split_tiles(height, width, tile_size, halo)
+    output: Optional[np.ndarray] = None
+    output_lock = threading.Lock()
+
+    def run(tile: Tile):
+        nonlocal output
+        result = func(image[tile.halo_region])
+        with output_lock:
+            if output is None:
+                output = np.empty((height, width) + result.shape[2:], dtype=result.dtype)
+        output[tile.inner_region] = result[tile.inner_in_halo]
+
+    map_tiles(run, tiles)
+    return output
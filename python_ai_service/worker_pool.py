@@ -0,0 +1,217 @@
+# مجمع العمال لتنفيذ مراحل التحليل الثقيلة
+# Worker Pool for CPU-heavy Analysis Stages
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import multiprocessing.pool
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from config import PERFORMANCE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# مكونات التحليل المتاحة في العملية الحالية (الرئيسية أو عملية العامل)
+_components: Dict[str, Any] = {}
+_component_factories: Dict[str, Callable[[], Any]] = {}
+_component_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def register_component(name: str, instance: Any = None,
+                       factory: Optional[Callable[[], Any]] = None,
+                       thread_safe: bool = True):
+    """تسجيل مكون تحليل ليستخدمه العمال"""
+    with _registry_lock:
+        if instance is not None:
+            _components[name] = instance
+        if factory is not None:
+            _component_factories[name] = factory
+        if not thread_safe:
+            # النماذج غير الآمنة للخيوط تُستدعى بشكل متسلسل داخل العملية الواحدة
+            _component_locks.setdefault(name, threading.Lock())
+
+
+def _get_component(name: str) -> Any:
+    """الحصول على مكون، مع إنشائه عند أول استخدام داخل عملية العامل"""
+    component = _components.get(name)
+    if component is not None:
+        return component
+
+    with _registry_lock:
+        component = _components.get(name)
+        if component is None:
+            factory = _component_factories.get(name)
+            if factory is None:
+                raise KeyError(f"المكون غير مسجل: {name}")
+            component = factory()
+            _components[name] = component
+            logger.info(f"تم إنشاء المكون {name} في عملية العامل")
+    return component
+
+
+@contextmanager
+def use_component(name: str) -> Iterator[Any]:
+    """استخدام مكون مع احترام قيود الخيوط الخاصة به"""
+    component = _get_component(name)
+    lock = _component_locks.get(name)
+    if lock is None:
+        yield component
+    else:
+        with lock:
+            yield component
+
+
+def warm_up_components(names: List[str]) -> List[str]:
+    """إنشاء المكونات مسبقاً داخل العامل حتى لا يتحمل أول تحليل زمن تحميل النماذج"""
+    for name in names:
+        _get_component(name)
+    return names
+
+
+def _initialize_worker(factories: Dict[str, Callable[[], Any]]):
+    """تهيئة عملية العامل (تُنشأ المكونات عند أول استخدام)"""
+    _component_factories.update(factories)
+
+
+def _resolve_future(future: asyncio.Future, value: Any = None, error: BaseException = None):
+    """تعيين نتيجة المستقبل ما لم يُلغَ"""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(value)
+
+
+class _ProcessSlot:
+    """عامل في عملية مستقلة يمكن إنهاؤها دون التأثير على بقية العمال"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self._pool: Optional[multiprocessing.pool.Pool] = None
+
+    def submit(self, func: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> asyncio.Future:
+        """إرسال مهمة إلى عملية العامل"""
+        if self._pool is None:
+            # spawn بدلاً من fork لتجنب توريث حالة النماذج وخيوطها من العملية الرئيسية
+            self._pool = multiprocessing.get_context("spawn").Pool(
+                processes=1,
+                initializer=_initialize_worker,
+                initargs=(dict(_component_factories),)
+            )
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pool.apply_async(
+            func, args, kwargs,
+            callback=lambda value: loop.call_soon_threadsafe(_resolve_future, future, value),
+            error_callback=lambda error: loop.call_soon_threadsafe(_resolve_future, future, None, error)
+        )
+        return future
+
+    def kill(self):
+        """إنهاء عملية العامل فوراً (تُنشأ عملية جديدة عند المهمة التالية)"""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def close(self):
+        """إغلاق عملية العامل بعد انتهاء مهامها"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+class WorkerPool:
+    """مجمع عمال لتشغيل المراحل الثقيلة خارج حلقة الأحداث
+
+    في وضع العمليات يعمل كل عامل في عملية مستقلة، فإذا أُلغيت المهمة المنتظرة
+    (إلغاء التحليل أو تجاوز المهلة) تُنهى عمليتها فوراً ويعود مكانها للمجمع.
+    في وضع الخيوط لا يمكن إيقاف استدعاء أصلي قيد التنفيذ، لكن المهام التي
+    لم تبدأ بعد تُحذف من الطابور.
+    """
+
+    def __init__(self, executor_type: Optional[str] = None, max_workers: Optional[int] = None):
+        self.executor_type = executor_type or PERFORMANCE_CONFIG["executor_type"]
+        self.max_workers = max_workers or PERFORMANCE_CONFIG["max_concurrent_analyses"]
+
+        if self.executor_type not in ("thread", "process"):
+            raise ValueError(f"نوع المنفذ غير مدعوم: {self.executor_type}")
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: List[_ProcessSlot] = []
+        self._free_slots: Optional[asyncio.Queue] = None
+        self.killed_tasks = 0
+
+        if self.executor_type == "process":
+            self._slots = [_ProcessSlot(i) for i in range(self.max_workers)]
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="analysis-worker"
+            )
+
+        logger.info(f"تم إنشاء مجمع العمال: {self.executor_type} × {self.max_workers}")
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """تشغيل دالة في المجمع وانتظار نتيجتها دون حجب حلقة الأحداث"""
+        if self._executor is not None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+        if self._free_slots is None:
+            self._free_slots = asyncio.Queue()
+            for slot in self._slots:
+                self._free_slots.put_nowait(slot)
+
+        slot = await self._free_slots.get()
+        try:
+            future = slot.submit(func, args, kwargs)
+            return await future
+        except asyncio.CancelledError:
+            # المهمة ما زالت تعمل داخل العملية: إنهاؤها لتحرير المعالج فوراً
+            slot.kill()
+            self.killed_tasks += 1
+            logger.info(f"تم إنهاء عملية العامل {slot.index} بعد إلغاء مهمتها")
+            raise
+        finally:
+            self._free_slots.put_nowait(slot)
+
+    async def warm_up(self, names: List[str]):
+        """تهيئة المكونات في جميع العمال (في وضع الخيوط تكفي النسخة المشتركة)"""
+        if self._executor is not None:
+            await self.run(warm_up_components, names)
+            return
+
+        # المهام المتزامنة تحجز عمالاً مختلفين، فتُهيأ كل عملية مرة واحدة
+        await asyncio.gather(*(self.run(warm_up_components, names) for _ in self._slots))
+
+    def get_status(self) -> Dict[str, Any]:
+        """حالة المجمع"""
+        status = {
+            "executor_type": self.executor_type,
+            "max_workers": self.max_workers
+        }
+        if self._slots:
+            status["available_workers"] = (
+                self._free_slots.qsize() if self._free_slots is not None else len(self._slots)
+            )
+            status["killed_tasks"] = self.killed_tasks
+        return status
+
+    def shutdown(self, wait: bool = True):
+        """إيقاف المجمع"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+        for slot in self._slots:
+            if wait:
+                slot.close()
+            else:
+                slot.kill()
+        logger.info("تم إيقاف مجمع العمال")